@@ -0,0 +1,15 @@
+"""Performance benchmarks for py-nest-thermostat. Not shipped with the package."""
+
+import subprocess
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
@@ -0,0 +1,131 @@
+"""
+In-process fake of the Smart Device Management API and of the Google OAuth token endpoint.
+
+It is served through a `httpx.MockTransport` so that the real client stack (retries, rate limiting,
+pooling) is exercised without any network access:
+
+    fake_api = FakeSdmApi(devices=10, latency=0.05, error_rate=0.01)
+    client = build_client(settings, transport=fake_api.transport)
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from typing import Any, Optional
+
+import httpx
+
+
+class FakeSdmApi:
+    """
+    Serves `devices` thermostats. Every response takes `latency` seconds and `error_rate` of the
+    calls fail with a 503, like the real API does when it is overloaded.
+    """
+
+    TOKEN_PATH = "/oauth2/v4/token"
+
+    def __init__(
+        self,
+        project_id: str = "benchmark-project",
+        devices: int = 1,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = 0,
+    ):
+        self.project_id = project_id
+        self.devices = devices
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests: Counter[str] = Counter()
+        self.setpoints: dict[str, float] = {}
+
+    def device_name(self, index: int) -> str:
+        return f"enterprises/{self.project_id}/devices/device-{index}"
+
+    def device_payload(self, index: int) -> dict[str, Any]:
+        name = self.device_name(index)
+        return {
+            "name": name,
+            "type": "sdm.devices.types.THERMOSTAT",
+            "assignee": f"enterprises/{self.project_id}/structures/structure/rooms/room-{index}",
+            "traits": {
+                "sdm.devices.traits.Info": {"customName": ""},
+                "sdm.devices.traits.Settings": {"temperatureScale": "CELSIUS"},
+                "sdm.devices.traits.Connectivity": {"status": "ONLINE"},
+                "sdm.devices.traits.Humidity": {"ambientHumidityPercent": 40 + index % 20},
+                "sdm.devices.traits.Temperature": {
+                    "ambientTemperatureCelsius": 18.0 + (index % 50) / 10
+                },
+                "sdm.devices.traits.ThermostatMode": {
+                    "mode": "HEAT",
+                    "availableModes": ["HEAT", "OFF"],
+                },
+                "sdm.devices.traits.ThermostatEco": {
+                    "availableModes": ["OFF", "MANUAL_ECO"],
+                    "mode": "OFF",
+                    "heatCelsius": 15.0,
+                    "coolCelsius": 24.0,
+                },
+                "sdm.devices.traits.ThermostatHvac": {"status": "HEATING"},
+                "sdm.devices.traits.ThermostatTemperatureSetpoint": {
+                    "heatCelsius": self.setpoints.get(name, 20.5)
+                },
+            },
+            "parentRelations": [
+                {
+                    "parent": f"enterprises/{self.project_id}/structures/structure/rooms/room-{index}",
+                    "displayName": f"Room {index}",
+                }
+            ],
+        }
+
+    def device_list_payload(self) -> dict[str, Any]:
+        return {"devices": [self.device_payload(index) for index in range(self.devices)]}
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if self.latency:
+            time.sleep(self.latency)
+        if self.should_fail():
+            with self.lock:
+                self.requests["error"] += 1
+            return httpx.Response(503, json={"error": {"code": 503, "status": "UNAVAILABLE"}})
+
+        if path == self.TOKEN_PATH:
+            kind = "token"
+            response = httpx.Response(
+                200, json={"access_token": "fake-access-token", "expires_in": 3599}
+            )
+        elif path.endswith(":executeCommand"):
+            kind = "command"
+            device_name = path.split("/v1/", 1)[1].split(":", 1)[0]
+            self.setpoints[device_name] = json.loads(request.content)["params"]["heatCelsius"]
+            response = httpx.Response(200, json={})
+        elif path.endswith("/devices"):
+            kind = "devices"
+            response = httpx.Response(200, json=self.device_list_payload())
+        elif "/devices/device-" in path:
+            kind = "device"
+            index = int(path.rsplit("device-", 1)[1])
+            if index >= self.devices:
+                response = httpx.Response(404, json={"error": {"code": 404}})
+            else:
+                response = httpx.Response(200, json=self.device_payload(index))
+        else:
+            kind = "unknown"
+            response = httpx.Response(404)
+        with self.lock:
+            self.requests[kind] += 1
+        return response
+
+    @property
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
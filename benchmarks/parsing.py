@@ -0,0 +1,109 @@
+"""
+Compares the throughput of the two ways of turning a `/devices` payload into thermostat stats:
+
+    - validated: `DeviceList` then `build_thermostat_stats` (pydantic models, typed traits)
+    - fast: `extract_thermostat_stats` (plain dict walking into `__slots__` records)
+
+Both start from the JSON bytes, as received from the API. Payloads are synthetic (see
+`benchmarks.fake_sdm`). The median devices per second are stored in
+`benchmarks/results/parsing.jsonl` so that runs can be compared over time.
+
+Usage:
+    python -m benchmarks.parsing [--devices 10 100 1000] [--runs 20] [--no-save]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import timeit
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks import RESULTS_DIR, git_revision
+from benchmarks.fake_sdm import FakeSdmApi
+from py_nest_thermostat.nest_api import BaseNestThermostat, DeviceList, build_thermostat_stats
+from py_nest_thermostat.traits import extract_thermostat_stats
+
+console = Console()
+
+
+def validated_path(payload: bytes) -> list[Any]:
+    device_list = DeviceList(**json.loads(payload))
+    return [
+        build_thermostat_stats(device)
+        for device in device_list.devices
+        if device.type in BaseNestThermostat.SUPPORTED_DEVICE_TYPES
+    ]
+
+
+def fast_path(payload: bytes) -> list[Any]:
+    return extract_thermostat_stats(json.loads(payload), BaseNestThermostat.SUPPORTED_DEVICE_TYPES)
+
+
+PATHS: dict[str, Callable[[bytes], list[Any]]] = {"validated": validated_path, "fast": fast_path}
+
+
+def devices_per_second(path: Callable[[bytes], list[Any]], payload: bytes, runs: int) -> float:
+    devices = len(path(payload))
+    timings = timeit.repeat(lambda: path(payload), number=1, repeat=runs)
+    return devices / statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--devices", type=int, nargs="+", default=[10, 100, 1000], help="Devices per payload."
+    )
+    parser.add_argument("--runs", type=int, default=20, help="Repetitions per payload size.")
+    parser.add_argument("--no-save", action="store_true", help="Do not store the results.")
+    args = parser.parse_args()
+
+    table = Table(title="/devices payload to thermostat stats")
+    table.add_column("devices", justify="right")
+    table.add_column("payload (KiB)", justify="right")
+    for path_name in PATHS:
+        table.add_column(f"{path_name} (devices/s)", justify="right")
+    table.add_column("speedup", justify="right")
+
+    results: dict[str, dict[str, float]] = {}
+    for devices in args.devices:
+        payload = json.dumps(FakeSdmApi(devices=devices).device_list_payload()).encode()
+        throughput = {
+            path_name: devices_per_second(path, payload, args.runs)
+            for path_name, path in PATHS.items()
+        }
+        results[str(devices)] = throughput
+        table.add_row(
+            str(devices),
+            f"{len(payload) / 1024:.0f}",
+            *(f"{throughput[path_name]:,.0f}" for path_name in PATHS),
+            f"{throughput['fast'] / throughput['validated']:.1f}x",
+        )
+    console.print(table)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        with open(Path(RESULTS_DIR, "parsing.jsonl"), "a") as f:
+            f.write(
+                json.dumps(
+                    {
+                        "recorded_at": datetime.utcnow().isoformat(),
+                        "revision": git_revision(),
+                        "python": sys.version.split()[0],
+                        "devices_per_second": results,
+                    }
+                )
+                + "\n"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Replays recorded `/devices` payloads through the collector pipeline, offline:
+
+    parsing (`extract_thermostat_stats`) -> change detection -> buffered database writes
+
+Payloads come from the segments written with `http.record_dir` (see
+`py_nest_thermostat.recording`). Readings keep the time they were recorded at, so change detection
+and heartbeats behave as they did in production. The throughput and the speedup over real-time are
+stored in `benchmarks/results/replay.jsonl` so that runs can be compared over time.
+
+Usage:
+    python -m benchmarks.replay ~/.py-nest-thermostat/recordings [--speed 0]
+        [--database-url sqlite:////tmp/replay.sqlite3] [--batch-size 500] [--no-save]
+
+A speed of 0 replays as fast as the pipeline goes, 10 replays the recorded timeline ten times
+faster. Without --database-url a temporary SQLite database is used.
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks import RESULTS_DIR, git_revision
+from benchmarks.database import connector_for_url
+
+console = Console()
+
+
+def replay_pipeline(
+    directory: Path, database_url: str, speed: float, batch_size: int
+) -> dict[str, float]:
+    from py_nest_thermostat.config import DatabaseAuth, NestAuth, PyNestConfig
+    from py_nest_thermostat.connectors.writer import BufferedStatsWriter
+    from py_nest_thermostat.dedup import ChangeDetector
+    from py_nest_thermostat.nest_api import BaseNestThermostat
+    from py_nest_thermostat.recording import iter_exchanges, paced
+    from py_nest_thermostat.traits import extract_thermostat_stats
+
+    config = PyNestConfig(
+        nest_auth=NestAuth(
+            client_id="replay-client",
+            client_secret="replay-secret",
+            redirect_uri="https://localhost",
+            project_id="replay-project",
+        ),
+        database=DatabaseAuth(type="sqlite"),
+    )
+    writer = BufferedStatsWriter(
+        connector_for_url(config, database_url), max_batch_size=batch_size, max_batch_age=1e9
+    )
+    change_detector = ChangeDetector()
+    device_list_payloads = (
+        exchange
+        for exchange in iter_exchanges(directory)
+        if exchange.status_code == 200 and exchange.key[1].endswith("/devices")
+    )
+    payloads = readings = 0
+    first_started_at = last_started_at = None
+    started = time.perf_counter()
+    for exchange in paced(device_list_payloads, speed):
+        first_started_at = first_started_at or exchange.started_at
+        last_started_at = exchange.started_at
+        recorded_at = datetime.utcfromtimestamp(exchange.started_at)
+        device_stats = extract_thermostat_stats(
+            json.loads(exchange.response_body), BaseNestThermostat.SUPPORTED_DEVICE_TYPES
+        )
+        writer.add(
+            stats.to_device_stats_row(recorded_at)
+            for stats in change_detector.filter(device_stats, recorded_at)
+        )
+        payloads += 1
+        readings += len(device_stats)
+    writer.close()
+    seconds = time.perf_counter() - started
+    recorded_seconds = (last_started_at or 0.0) - (first_started_at or 0.0)
+    return {
+        "payloads": payloads,
+        "readings": readings,
+        "written": change_detector.written,
+        "seconds": seconds,
+        "readings_per_second": readings / seconds if seconds else 0.0,
+        "speedup": recorded_seconds / seconds if seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("directory", type=Path, help="Directory of the recorded segments.")
+    parser.add_argument("--speed", type=float, default=0.0, help="Replay speed, 0 is unpaced.")
+    parser.add_argument("--database-url", help="SQLAlchemy URL of a scratch database.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per bulk insert.")
+    parser.add_argument("--no-save", action="store_true", help="Do not store the results.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = replay_pipeline(
+            args.directory,
+            args.database_url or f"sqlite:///{workdir}/replay.sqlite3",
+            args.speed,
+            args.batch_size,
+        )
+
+    table = Table(title=f"Replay of {args.directory} at speed {args.speed or 'unpaced'}")
+    table.add_column("payloads", justify="right")
+    table.add_column("readings", justify="right")
+    table.add_column("written", justify="right")
+    table.add_column("readings/s", justify="right")
+    table.add_column("x real-time", justify="right")
+    table.add_row(
+        str(results["payloads"]),
+        str(results["readings"]),
+        str(results["written"]),
+        f"{results['readings_per_second']:,.0f}",
+        f"{results['speedup']:,.1f}",
+    )
+    console.print(table)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        with open(Path(RESULTS_DIR, "replay.jsonl"), "a") as f:
+            f.write(
+                json.dumps(
+                    {
+                        "recorded_at": datetime.utcnow().isoformat(),
+                        "revision": git_revision(),
+                        "python": sys.version.split()[0],
+                        "parameters": {"speed": args.speed, "batch_size": args.batch_size},
+                        "results": results,
+                    }
+                )
+                + "\n"
+            )
+
+
+if __name__ == "__main__":
+    main()
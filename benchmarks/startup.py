@@ -0,0 +1,126 @@
+"""
+Tracks the import cost of every `nest` command with `python -X importtime`.
+
+Each command is mapped to the modules it imports before doing any I/O. Those are imported in a fresh
+interpreter a few times and the median total is stored in `benchmarks/results/startup.jsonl` so that
+runs can be compared over time.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--no-save]
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks import RESULTS_DIR, git_revision
+
+console = Console()
+
+BASE_IMPORTS = ["py_nest_thermostat.main"]
+API_IMPORTS = BASE_IMPORTS + ["py_nest_thermostat.nest_api"]
+DB_IMPORTS = API_IMPORTS + ["py_nest_thermostat.connectors.postgres", "py_nest_thermostat.models"]
+
+COMMAND_IMPORTS: dict[str, list[str]] = {
+    "--help": BASE_IMPORTS,
+    "devices": API_IMPORTS,
+    "stats": API_IMPORTS,
+    "temp": API_IMPORTS,
+    "stats --save-to-db": DB_IMPORTS,
+    "collect": DB_IMPORTS + ["py_nest_thermostat.connectors.spool"],
+}
+
+# modules which should never be paid for by commands that do not use them
+HEAVY_MODULES: dict[str, set[str]] = {
+    "sqlalchemy": {"stats --save-to-db", "collect"},
+    "questionary": set(),
+}
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def measure_imports(modules: list[str]) -> tuple[float, dict[str, int]]:
+    """Returns the total import time (ms) and the self time (us) of every imported module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    self_times: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        self_times[module] = int(self_us)
+        # top level imports carry the cumulative time of everything they pulled in
+        if not indent:
+            total_us += int(cumulative_us)
+    return total_us / 1000, self_times
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Number of fresh interpreters per command."
+    )
+    parser.add_argument("--no-save", action="store_true", help="Do not store the results.")
+    args = parser.parse_args()
+
+    table = Table(title="nest startup import time")
+    table.add_column("command")
+    table.add_column("median (ms)", justify="right")
+    table.add_column("slowest modules (self ms)")
+    table.add_column("unexpected heavy modules")
+
+    results: dict[str, float] = {}
+    for command, modules in COMMAND_IMPORTS.items():
+        timings = []
+        for _ in range(args.runs):
+            total_ms, self_times = measure_imports(modules)
+            timings.append(total_ms)
+        results[command] = statistics.median(timings)
+        slowest = sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:3]
+        unexpected = [
+            heavy_module
+            for heavy_module, allowed_commands in HEAVY_MODULES.items()
+            if heavy_module in self_times and command not in allowed_commands
+        ]
+        table.add_row(
+            command,
+            f"{results[command]:.1f}",
+            ", ".join(f"{module} ({us / 1000:.1f})" for module, us in slowest),
+            ", ".join(unexpected),
+        )
+    console.print(table)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        with open(Path(RESULTS_DIR, "startup.jsonl"), "a") as f:
+            f.write(
+                json.dumps(
+                    {
+                        "recorded_at": datetime.utcnow().isoformat(),
+                        "revision": git_revision(),
+                        "python": sys.version.split()[0],
+                        "median_import_ms": results,
+                    }
+                )
+                + "\n"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,25 @@
 import json
 import os
-from datetime import datetime
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Optional
 
 import httpx
-import questionary
 from pydantic import BaseModel
 from rich.console import Console
 
 from py_nest_thermostat.config import PyNestConfig
 from py_nest_thermostat.logger import log
+from py_nest_thermostat.metrics import TOKEN_REFRESHES, time_phase
+from py_nest_thermostat.transport import build_client
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on windows
+    fcntl = None  # type: ignore
 
 console = Console()
 
@@ -35,11 +44,33 @@ class AuthRequestError(Exception):
 
 
 class Authenticator:
+    """
+    Holds the access token in memory and refreshes it when needed.
+
+    Refreshes are single-flight: concurrent callers of the same instance wait for one refresh, and
+    other processes sharing the token file are serialised by a file lock and pick up the token that
+    was refreshed by whoever got there first instead of issuing their own request.
+    """
+
     TOKEN_URL = "https://www.googleapis.com/oauth2/v4/token"
     ACCESS_TOKEN_FILENAME = Path("~/.py-nest-thermostat/access_token.json").expanduser()
+    # the request path refreshes at the last moment, the background refresh well ahead of it
+    MIN_TOKEN_VALIDITY = timedelta(seconds=10)
+    BACKGROUND_REFRESH_AHEAD = timedelta(minutes=5)
+    BACKGROUND_REFRESH_RETRY_DELAY = 30.0
+    REPLAY_TOKEN = "replay"
 
-    def __init__(self, config: PyNestConfig):
+    def __init__(
+        self,
+        config: PyNestConfig,
+        client: Optional[httpx.Client] = None,
+        token_file: Optional[Path] = None,
+    ):
         self.config = config
+        self.client = client or build_client(config.http)
+        if token_file is not None:
+            # every account of a multi account config has a token of its own
+            self.ACCESS_TOKEN_FILENAME = token_file
         self.access_token_json: Optional[AccessToken] = None
 
         self.access_token_obtained_at: datetime = datetime.strptime(
@@ -47,8 +78,36 @@ class Authenticator:
         )
         self.token_response_json: Optional[dict[str, Any]] = None
 
-    def get_token(self):
-        # open the cached creds
+        self.refresh_lock = threading.Lock()
+        self.background_refresh_timer: Optional[threading.Timer] = None
+
+    @property
+    def token_expires_at(self) -> Optional[datetime]:
+        if not self.access_token_json:
+            return None
+        return self.access_token_json.access_token_obtained_at + timedelta(
+            seconds=self.access_token_json.expires_in
+        )
+
+    def has_valid_token(self, min_validity: timedelta = MIN_TOKEN_VALIDITY) -> bool:
+        expires_at = self.token_expires_at
+        return expires_at is not None and expires_at - datetime.utcnow() > min_validity
+
+    @contextmanager
+    def token_file_lock(self) -> Iterator[None]:
+        """Serialises token refreshes across processes sharing the token file."""
+        if fcntl is None:
+            yield
+            return
+        self.ACCESS_TOKEN_FILENAME.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.ACCESS_TOKEN_FILENAME.with_suffix(".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load_token_file(self):
         if os.path.isfile(self.ACCESS_TOKEN_FILENAME):
             with open(self.ACCESS_TOKEN_FILENAME) as f:
                 try:
@@ -59,20 +118,76 @@ class Authenticator:
                         f"There was an issue reading access_token.json so we'll have to re-authenticate. Error: {e}"
                     )
 
-        if self.access_token_json:
-            last_accessed_at = self.access_token_json.access_token_obtained_at
-            assert last_accessed_at, "last_accessed_at cannot be None"
-            expires_delta = self.access_token_json.expires_in
-            last_access_to_now_delta = datetime.utcnow() - last_accessed_at
-
-            if last_access_to_now_delta.seconds > int(expires_delta) - 10:
-                log.debug("We need to refresh the token as it has expired.")
-                self.authenticate()
-            else:
-                log.debug("No need to authenticate, auth code is still valid")
+    def get_token(self, min_validity: timedelta = MIN_TOKEN_VALIDITY):
+        # hot path: the token we hold in memory is still good
+        if self.has_valid_token(min_validity):
+            return
+
+        if self.config.http.replay_dir:
+            # recorded tokens are redacted and replayed requests need none: an in-memory token is
+            # handed out and the token file is neither read nor overwritten
+            self.access_token_json = AccessToken(
+                access_token=self.REPLAY_TOKEN,
+                refresh_token=self.REPLAY_TOKEN,
+                access_token_obtained_at=datetime.utcnow(),
+                expires_in=3600,
+            )
+            return
+
+        with self.refresh_lock:
+            # someone else may have refreshed the token while we were waiting for the lock
+            if self.has_valid_token(min_validity):
+                return
+            with self.token_file_lock():
+                # another process may have refreshed it already, in which case we adopt its token
+                self.load_token_file()
+                if self.has_valid_token(min_validity):
+                    log.debug("No need to authenticate, auth code is still valid")
+                    return
+                elif self.access_token_json:
+                    log.debug("We need to refresh the token as it has expired.")
+                else:
+                    log.info("Authenticating")
+                try:
+                    with time_phase("token_refresh"):
+                        self.authenticate()
+                except Exception:
+                    TOKEN_REFRESHES.inc(result="failure")
+                    raise
+                TOKEN_REFRESHES.inc(result="success")
+
+    def start_background_refresh(self):
+        """Refreshes the token ahead of its expiry so that requests never wait on the OAuth endpoint."""
+        self.get_token()
+        self._schedule_background_refresh()
+
+    def stop_background_refresh(self):
+        if self.background_refresh_timer:
+            self.background_refresh_timer.cancel()
+            self.background_refresh_timer = None
+
+    def _schedule_background_refresh(self, delay: Optional[float] = None):
+        if delay is None:
+            assert self.token_expires_at, "token_expires_at cannot be None"
+            refresh_at = self.token_expires_at - self.BACKGROUND_REFRESH_AHEAD
+            delay = max(0.0, (refresh_at - datetime.utcnow()).total_seconds())
+        self.background_refresh_timer = threading.Timer(delay, self._background_refresh)
+        self.background_refresh_timer.daemon = True
+        self.background_refresh_timer.start()
+
+    def _background_refresh(self):
+        try:
+            self.get_token(min_validity=self.BACKGROUND_REFRESH_AHEAD)
+        except Exception as e:
+            log.error(f"Background token refresh failed, retrying soon. {e}")
+            self._schedule_background_refresh(self.BACKGROUND_REFRESH_RETRY_DELAY)
         else:
-            log.info("Authenticating")
-            self.authenticate()
+            if self.has_valid_token(min_validity=self.BACKGROUND_REFRESH_AHEAD):
+                self._schedule_background_refresh()
+            else:
+                # the refresh left us with a token that is no newer, retrying right away would loop
+                log.error("Background token refresh did not renew the token, retrying soon.")
+                self._schedule_background_refresh(self.BACKGROUND_REFRESH_RETRY_DELAY)
 
     def verify_and_parse_token_response(self, token_response: httpx.Response):
         if token_response.status_code == 200:
@@ -89,6 +204,8 @@ class Authenticator:
                 )
             else:
                 raise AuthRequestError(f"{token_response.status_code=}, {token_response.json()=}")
+        else:
+            raise AuthRequestError(f"{token_response.status_code=}, {token_response.text=}")
 
     def authenticate(self):
         # if we already have a refresh token we don't need to go through auth again.
@@ -105,12 +222,11 @@ class Authenticator:
                 "grant_type": "refresh_token",
             }
             try:
-                token_response = httpx.post(self.TOKEN_URL, params=refresh_token_params)
+                token_response = self.client.post(self.TOKEN_URL, params=refresh_token_params)
                 log.debug("Token refresh request issued")
                 self.verify_and_parse_token_response(token_response)
             except httpx.RequestError as e:
-                # TODO: shouldn't we be raising here?
-                log.error(f"There was an issue while requesting tokens. {e}")
+                raise AuthRequestError(f"There was an issue while requesting tokens. {e}") from e
         else:
             # we first need to obtain an authorization_code via an interactive process
             authorization_code_url = (
@@ -125,6 +241,9 @@ class Authenticator:
                 "Once you have authorised, you will be redirected to your redirect_uri: "
                 f"{self.config.nest_auth.redirect_uri}"
             )
+            # only needed for the interactive flow, and slow to import
+            import questionary
+
             # TODO: Revisit this as it looks like passing the 4/ via the input changes the / and messes up the request.
             auth_code = questionary.password(
                 message=(
@@ -143,18 +262,22 @@ class Authenticator:
                     "redirect_uri": self.config.nest_auth.redirect_uri,
                 }
                 try:
-                    token_response = httpx.post(self.TOKEN_URL, params=token_request_params)
+                    token_response = self.client.post(self.TOKEN_URL, params=token_request_params)
                     self.verify_and_parse_token_response(token_response)
                 except httpx.RequestError as e:
-                    # TODO: shouldn't we be raising here?
-                    log.error(f"There was an issue while requesting tokens. {e}")
+                    raise AuthRequestError(
+                        f"There was an issue while requesting tokens. {e}"
+                    ) from e
             else:
                 raise AuthRequestError("You do not seem to have provided any authorization_code")
 
         if self.token_response_json and self.refresh_token:
-            with open(self.ACCESS_TOKEN_FILENAME, "w") as f:
-                if self.access_token_json:
+            if self.access_token_json:
+                # write then rename so that readers never see a half written token file
+                temporary_path = self.ACCESS_TOKEN_FILENAME.with_suffix(f".{os.getpid()}.tmp")
+                with open(temporary_path, "w") as f:
                     json.dump(self.access_token_json.dict(), f, default=str)
+                os.replace(temporary_path, self.ACCESS_TOKEN_FILENAME)
         else:
             raise AttributeError(
                 "The token request does not seem to have returned a refresh token. "
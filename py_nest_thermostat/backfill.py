@@ -0,0 +1,274 @@
+"""
+Bulk import of historical readings into `device_stats`.
+
+Files are streamed and validated a batch at a time, column by column, and every batch goes through
+the connector's `bulk_insert` (COPY on Postgres, batched UPSERTs on CockroachDB). Readings that
+already exist for a `(device, recorded_at)` pair are skipped so that files can be imported again.
+The number of rows done is checkpointed after every batch so an interrupted import resumes where
+it stopped.
+"""
+
+import csv
+import gzip
+import json
+import os
+import uuid
+from collections.abc import Callable, Iterator, Sequence
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Optional
+
+from pydantic import BaseModel
+
+from py_nest_thermostat.logger import log
+
+if TYPE_CHECKING:
+    from py_nest_thermostat.connectors.base import BaseDbConnector
+
+FORMATS: tuple[str, ...] = ("csv", "jsonl")
+FORMAT_SUFFIXES = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl"}
+
+
+def import_format(path: Path) -> str:
+    # `.csv.gz` is read as `.csv`, like the files written by `nest export`
+    suffixes = [suffix.lower() for suffix in path.suffixes if suffix.lower() != ".gz"]
+    file_format = FORMAT_SUFFIXES.get(suffixes[-1]) if suffixes else None
+    if file_format is None:
+        raise ValueError(f"Cannot import {path.name}, supported formats: {', '.join(FORMATS)}")
+    return file_format
+
+
+def open_text(path: Path) -> IO[str]:
+    if path.suffix.lower() == ".gz":
+        return gzip.open(path, "rt", newline="")
+    return open(path, newline="")
+
+
+class InvalidRecord(dict):
+    """
+    Stands for a JSON line that is not an object, so that it is numbered, reported and counted like
+    any other invalid row instead of aborting the import.
+    """
+
+    def __init__(self, error: str):
+        super().__init__()
+        self.error = error
+
+
+def parse_json_record(line: str) -> dict[str, Any]:
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return InvalidRecord(f"not valid JSON: {e}")
+    if not isinstance(record, dict):
+        return InvalidRecord(f"expected a JSON object, got {type(record).__name__}")
+    return record
+
+
+def iter_records(path: Path) -> Iterator[dict[str, Any]]:
+    """The records of a CSV file with a header row, or of a JSON lines file."""
+    file_format = import_format(path)
+    with open_text(path) as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield parse_json_record(line)
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """ISO 8601 timestamps, stored as naive UTC like the collected readings."""
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    timestamp = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def parse_name(value: Any) -> str:
+    if value is None or not str(value).strip():
+        raise ValueError("missing device name")
+    return str(value).strip()
+
+
+def parse_optional_float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def parse_optional_string(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+# device_stats column -> (names it may have in the files, parser)
+COLUMNS: dict[str, tuple[tuple[str, ...], Callable[[Any], Any]]] = {
+    "name": (("device_name", "name"), parse_name),
+    "recorded_at": (("recorded_at",), parse_timestamp),
+    "humidity": (("humidity",), parse_optional_float),
+    "temperature": (("temperature",), parse_optional_float),
+    "mode": (("mode",), parse_optional_string),
+    "target_temperature": (("target_temperature",), parse_optional_float),
+}
+
+
+def column_values(records: Sequence[dict[str, Any]], aliases: tuple[str, ...]) -> list[Any]:
+    for alias in aliases[:-1]:
+        if alias in records[0]:
+            return [record.get(alias) for record in records]
+    return [record.get(aliases[-1]) for record in records]
+
+
+def validate_record(record: dict[str, Any]) -> dict[str, Any]:
+    if isinstance(record, InvalidRecord):
+        raise ValueError(record.error)
+    return {
+        column: parser(column_values([record], aliases)[0])
+        for column, (aliases, parser) in COLUMNS.items()
+    }
+
+
+def validate_batch(records: Sequence[dict[str, Any]], first_row: int) -> list[dict[str, Any]]:
+    """
+    Converts the records into device_stats rows, one column at a time. When a column does not
+    convert the batch is validated again record by record so that only the faulty ones are skipped.
+    """
+    try:
+        columns = {
+            column: list(map(parser, column_values(records, aliases)))
+            for column, (aliases, parser) in COLUMNS.items()
+        }
+        rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    except (ValueError, TypeError, OverflowError):
+        rows = []
+        for row_number, record in enumerate(records, start=first_row):
+            try:
+                rows.append(validate_record(record))
+            except (ValueError, TypeError, OverflowError) as e:
+                log.warning(f"Skipping invalid row {row_number}: {e}")
+    for row in rows:
+        row["id"] = uuid.uuid4()
+    return rows
+
+
+def deduplicate(rows: Sequence[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Keeps the last reading of every `(name, recorded_at)` pair of the batch."""
+    # a single statement cannot upsert the same row twice (CockroachDB's ON CONFLICT DO UPDATE)
+    return list({(row["name"], row["recorded_at"]): row for row in rows}.values())
+
+
+class ImportCheckpoint(BaseModel):
+    size: int
+    modified_at: float
+    rows_done: int
+    completed: bool = False
+
+
+class ImportCheckpoints:
+    """
+    Progress of the imports, per file. A checkpoint only applies to the exact file it was taken on:
+    a file that changed since (size or modification time) is imported from the start.
+    """
+
+    CHECKPOINTS_FILENAME = Path("~/.py-nest-thermostat/import_checkpoints.json").expanduser()
+
+    def __init__(self, path: Path = CHECKPOINTS_FILENAME):
+        self.path = path
+
+    def load(self) -> dict[str, ImportCheckpoint]:
+        if not self.path.is_file():
+            return {}
+        try:
+            with open(self.path) as f:
+                return {
+                    source: ImportCheckpoint(**checkpoint)
+                    for source, checkpoint in json.load(f).items()
+                }
+        except (json.JSONDecodeError, ValueError) as e:
+            log.debug(f"Ignoring unreadable import checkpoints: {e}")
+            return {}
+
+    def get(self, source: Path) -> Optional[ImportCheckpoint]:
+        checkpoint = self.load().get(str(source.resolve()))
+        stat = source.stat()
+        if checkpoint and (checkpoint.size, checkpoint.modified_at) == (
+            stat.st_size,
+            stat.st_mtime,
+        ):
+            return checkpoint
+        return None
+
+    def set(self, source: Path, rows_done: int, completed: bool = False):
+        stat = source.stat()
+        checkpoints = self.load()
+        checkpoints[str(source.resolve())] = ImportCheckpoint(
+            size=stat.st_size, modified_at=stat.st_mtime, rows_done=rows_done, completed=completed
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "w") as f:
+            json.dump({source: checkpoint.dict() for source, checkpoint in checkpoints.items()}, f)
+        os.replace(temporary_path, self.path)
+
+
+class ImportSummary(BaseModel):
+    path: Path
+    # rows of the file that were skipped because a previous run already imported them
+    resumed_from: int = 0
+    read: int = 0
+    invalid: int = 0
+    # rows sent to the database, readings that already existed are not written again
+    written: int = 0
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+    @property
+    def duration(self) -> timedelta:
+        return (self.finished_at or datetime.utcnow()) - self.started_at
+
+
+def import_device_stats(
+    connector: "BaseDbConnector",
+    path: Path,
+    batch_size: int = 5000,
+    checkpoints: Optional[ImportCheckpoints] = None,
+    restart: bool = False,
+) -> ImportSummary:
+    """Imports the readings of a CSV or JSON lines file, resuming from its last checkpoint."""
+    checkpoints = checkpoints or ImportCheckpoints()
+    summary = ImportSummary(path=path, started_at=datetime.utcnow())
+    checkpoint = None if restart else checkpoints.get(path)
+    if checkpoint and checkpoint.completed:
+        log.info(f"{path} was already imported, pass --restart to import it again.")
+        summary.resumed_from = checkpoint.rows_done
+        summary.finished_at = datetime.utcnow()
+        return summary
+
+    records = iter_records(path)
+    if checkpoint:
+        log.info(f"Resuming the import of {path} after row {checkpoint.rows_done}")
+        summary.resumed_from = checkpoint.rows_done
+        # rows are numbered from the first record, the checkpoint is the number of rows done
+        records = islice(records, checkpoint.rows_done, None)
+    rows_done = summary.resumed_from
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        valid_rows = validate_batch(batch, first_row=rows_done + 1)
+        rows = deduplicate(valid_rows)
+        connector.bulk_insert(rows)
+        rows_done += len(batch)
+        summary.read += len(batch)
+        summary.invalid += len(batch) - len(valid_rows)
+        summary.written += len(rows)
+        checkpoints.set(path, rows_done)
+        log.debug(f"Imported {rows_done} rows of {path}")
+    checkpoints.set(path, rows_done, completed=True)
+    summary.finished_at = datetime.utcnow()
+    return summary
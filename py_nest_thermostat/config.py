@@ -1,10 +1,12 @@
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import yaml
-from pydantic import BaseModel
+from pydantic import BaseModel, root_validator
 
 CONFIG_FILE = Path("~/.py-nest-thermostat/config.yaml").expanduser()
+ACCOUNTS_DIR = Path("~/.py-nest-thermostat/accounts").expanduser()
 
 
 def open_yaml(path: Path) -> dict[str, Any]:
@@ -23,14 +25,89 @@ class NestAuth(BaseModel):
     project_id: str
 
 
+class Account(BaseModel):
+    """
+    One of many Device Access projects collected by the same deployment, e.g. one per tenant.
+    Every account keeps its token and device cache in its own directory.
+    """
+
+    name: str
+    nest_auth: NestAuth
+    # defaults to ~/.py-nest-thermostat/accounts/<name>/
+    data_dir: Optional[Path] = None
+
+    @property
+    def directory(self) -> Path:
+        return (self.data_dir or Path(ACCOUNTS_DIR, self.name)).expanduser()
+
+    @property
+    def token_file(self) -> Path:
+        return Path(self.directory, "access_token.json")
+
+    @property
+    def device_cache_file(self) -> Path:
+        return Path(self.directory, "device_cache.json")
+
+
 class DatabaseAuth(BaseModel):
     type: str
-    credentials: dict[str, str]
+    # sqlite can do without, its database file has a default location
+    credentials: dict[str, str] = {}
+    # raw readings older than this are removed, the hourly and daily rollups are kept
+    retention_days: Optional[int] = None
+
+
+class HttpSettings(BaseModel):
+    """Settings of the HTTP transport shared by the authenticator and the thermostat API."""
+
+    http2: bool = False
+    timeout: float = 10.0
+    max_connections: int = 10
+    max_keepalive_connections: int = 5
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    max_backoff: float = 30.0
+    # client side token bucket matching the Smart Device Management API quota
+    requests_per_minute: float = 10.0
+    burst: int = 5
+    # base URL of the SDM API, e.g. http://127.0.0.1:8787/v1 to go through `nest serve`
+    sdm_api_url: Optional[str] = None
+    # records the raw requests and responses to rotating gzip segments, see `recording.py`
+    record_dir: Optional[Path] = None
+    record_segment_mb: float = 16.0
+    record_max_segments: int = 50
+    # serves the responses recorded in this directory instead of calling Google
+    replay_dir: Optional[Path] = None
+    # divides the recorded latencies, 0 replays without waiting
+    replay_speed: float = 1.0
 
 
 class PyNestConfig(BaseModel):
     nest_auth: NestAuth
     database: DatabaseAuth
+    http: HttpSettings = HttpSettings()
+    # the projects collected by `nest collect --all-accounts`
+    accounts: list[Account] = []
+
+    @root_validator(pre=True)
+    def default_to_first_account(cls, values: dict[str, Any]) -> dict[str, Any]:
+        # configs listing accounts don't need a top level nest_auth, single account commands use
+        # the first account
+        if not values.get("nest_auth") and values.get("accounts"):
+            first_account = values["accounts"][0]
+            values["nest_auth"] = (
+                first_account.nest_auth
+                if isinstance(first_account, Account)
+                else first_account.get("nest_auth")
+            )
+        return values
+
+    def for_account(self, account: Account) -> "PyNestConfig":
+        """The config the single account code paths expect, pointing at the account's project."""
+        return self.copy(update={"nest_auth": account.nest_auth, "accounts": []})
 
 
-config = PyNestConfig(**open_yaml(CONFIG_FILE))
+@lru_cache(maxsize=None)
+def get_config(path: Path = CONFIG_FILE) -> PyNestConfig:
+    """Parses and validates the config file the first time it is needed and caches the result."""
+    return PyNestConfig(**open_yaml(path))
@@ -1,9 +1,54 @@
+import os
+import threading
 from abc import ABC
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any
 
 import sqlalchemy.ext.declarative as dec
+from pydantic import BaseModel
+from sqlalchemy import Table, create_engine
+from sqlalchemy.engine import Engine
+
+if TYPE_CHECKING:
+    from py_nest_thermostat.connectors.schema import SchemaManager
 
 SQLAlchemyBase = dec.declarative_base()
 
+_engines: dict[tuple[int, str, str], Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def cached_engine(url: str, **engine_options: Any) -> Engine:
+    """
+    One engine per database URL and options, per process: connectors created over and over (e.g.
+    for every save) share its connection pool instead of opening new connections. Pools must not
+    cross a fork, hence the pid in the key.
+    """
+    key = (os.getpid(), url, repr(sorted(engine_options.items())))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = create_engine(url, **engine_options)
+        return engine
+
+
+class PoolSettings(BaseModel):
+    """
+    Connection pool of the server databases. Read from `database.credentials`, next to the
+    connection parameters.
+    """
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    # seconds after which a connection is replaced, before a server or proxy drops it for idling
+    pool_recycle: int = 1800
+    # checks connections before handing them out so that a restarted server costs no failed write
+    pool_pre_ping: bool = True
+
+    def engine_options(self) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in PoolSettings.__fields__}
+
 
 class BaseDbConnector(ABC):
     """
@@ -17,10 +62,53 @@ class BaseDbConnector(ABC):
         "Connection method implement in concrete classes."
         ...
 
+    def get_schema_manager(self) -> "SchemaManager":
+        "Returns the manager of the schema. Concretes return their database specific manager."
+        from py_nest_thermostat.connectors.schema import SchemaManager
+
+        return SchemaManager(self.engine, self.retention_days)  # type: ignore
+
     def create_models(self):
-        "Model creation method. Must be implemented in concretes."
-        ...
+        self.schema_manager = self.get_schema_manager()
+        self.schema_manager.create()
+
+    def migrate_models(self) -> int:
+        "Converts a device_stats table created by a previous version to the current schema."
+        self.schema_manager = self.get_schema_manager()
+        return self.schema_manager.migrate()
 
     def session_manager(self):
         "context manager to be implemented in concrete classes."
         ...
+
+    @property
+    def device_stats_table(self) -> Table:
+        from py_nest_thermostat.models import DeviceStats
+
+        return DeviceStats.__table__
+
+    def bulk_insert(self, rows: Sequence[dict[str, Any]]):
+        """
+        Inserts many device_stats rows, as built by `ThermostatStats.to_device_stats_row`, and
+        refreshes the rollups they belong to. Rows may be replayed (e.g. from the spool).
+        """
+        from py_nest_thermostat.metrics import DB_FLUSH_ROWS, time_phase
+
+        if not rows:
+            return
+        with time_phase("db_write"):
+            table_rows = self.schema_manager.normalise_rows(rows)
+            self.schema_manager.prepare_insert(table_rows)
+            self.insert_rows(table_rows)
+        with time_phase("db_rollups"):
+            self.schema_manager.after_insert(table_rows)
+        DB_FLUSH_ROWS.observe(len(rows))
+
+    def insert_rows(self, rows: Sequence[dict[str, Any]]):
+        """
+        Inserts normalised rows in a single transaction. Relies on the driver's `executemany`.
+        Concrete classes can override it with a faster, database specific, path. Implementations
+        should skip or overwrite rows that already exist so that replaying rows is harmless.
+        """
+        with self.engine.begin() as connection:  # type: ignore
+            connection.execute(self.device_stats_table.insert(), list(rows))
@@ -1,16 +1,59 @@
 import logging
+import random
+import time
+from collections.abc import Callable, Sequence
 from contextlib import contextmanager
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, TypeVar
 
-from pydantic import BaseModel
-from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker
 
-from py_nest_thermostat.config import PyNestConfig, config
-from py_nest_thermostat.connectors.base import BaseDbConnector, SQLAlchemyBase
+from py_nest_thermostat.config import PyNestConfig
+from py_nest_thermostat.connectors.base import BaseDbConnector, PoolSettings, cached_engine
 
+if TYPE_CHECKING:
+    from py_nest_thermostat.connectors.schema import SchemaManager
 
-class CockroachDbConnectionParams(BaseModel):
+T = TypeVar("T")
+
+# SQLSTATE of a transaction aborted because of a conflict with a concurrent one
+SERIALIZATION_FAILURE = "40001"
+MAX_RETRY_BACKOFF = 5.0
+
+
+def is_serialization_failure(error: DBAPIError) -> bool:
+    return getattr(error.orig, "pgcode", None) == SERIALIZATION_FAILURE
+
+
+def retry_on_serialization_failure(
+    transaction: Callable[[], T], max_retries: int = 5, backoff: float = 0.1
+) -> T:
+    """
+    Runs `transaction`, which must open and commit its own transaction, again when CockroachDB
+    aborts it with a retryable serialization error. Waits are exponential with full jitter so that
+    the conflicting writers don't collide again.
+    """
+    from py_nest_thermostat.metrics import DB_TRANSACTION_RETRIES
+
+    attempt = 0
+    while True:
+        try:
+            return transaction()
+        except DBAPIError as e:
+            attempt += 1
+            if not is_serialization_failure(e) or attempt > max_retries:
+                raise
+            delay = random.uniform(0, min(MAX_RETRY_BACKOFF, backoff * 2 ** (attempt - 1)))
+            logging.warning(
+                f"Transaction conflict, retrying in {delay:.2f}s ({attempt}/{max_retries})"
+            )
+            DB_TRANSACTION_RETRIES.inc()
+            time.sleep(delay)
+
+
+class CockroachDbConnectionParams(PoolSettings):
     password: str
     username: str
     port: str
@@ -18,9 +61,15 @@ class CockroachDbConnectionParams(BaseModel):
     host: str
     cluster_name: str
     ssl_cert_path: Path = Path("~/.postgresql/root.crt").expanduser().resolve()
+    # retries of a transaction aborted by a conflict (SQLSTATE 40001), and the first backoff
+    transaction_retries: int = 5
+    retry_backoff: float = 0.1
 
 
 class CockroachDatabaseConnector(BaseDbConnector):
+    # CockroachDB performs best with multi-row statements of a few hundred rows
+    UPSERT_BATCH_SIZE: int = 500
+
     def __init__(self, config: PyNestConfig):
         self.connection_params = CockroachDbConnectionParams(**config.database.credentials)
         self.connection_url: str = (
@@ -30,16 +79,21 @@ class CockroachDatabaseConnector(BaseDbConnector):
             f"sslmode=verify-full&sslrootcert={self.connection_params.ssl_cert_path}&"
             f"options=--cluster%3D{self.connection_params.cluster_name}"
         )
+        self.retention_days = config.database.retention_days
 
     def connect(self):
-        self.engine = create_engine(self.connection_url)
-        self.engine.connect()
+        self.engine = cached_engine(self.connection_url, **self.connection_params.engine_options())
         self.session_factory = sessionmaker(bind=self.engine)
 
-    def create_models(self):
-        import py_nest_thermostat.models  # noqa: F401
+    def get_schema_manager(self) -> "SchemaManager":
+        from py_nest_thermostat.connectors.schema import CockroachSchemaManager
 
-        SQLAlchemyBase.metadata.create_all(self.engine)
+        return CockroachSchemaManager(
+            self.engine,
+            self.retention_days,
+            transaction_retries=self.connection_params.transaction_retries,
+            retry_backoff=self.connection_params.retry_backoff,
+        )
 
     @contextmanager
     def session_manager(self):
@@ -54,5 +108,31 @@ class CockroachDatabaseConnector(BaseDbConnector):
             session.close()
             logging.debug("Closing database connection")
 
+    def insert_rows(self, rows: Sequence[dict[str, Any]]):
+        """
+        Writes the rows with batched multi-row UPSERTs
+        (`INSERT ... ON CONFLICT (device_id, recorded_at) DO UPDATE`). The transaction is retried
+        when it conflicts with a concurrent writer, upserts make that harmless.
+        """
+        table = self.device_stats_table
+
+        def upsert_rows():
+            with self.engine.begin() as connection:
+                for start in range(0, len(rows), self.UPSERT_BATCH_SIZE):
+                    end = start + self.UPSERT_BATCH_SIZE
+                    statement = insert(table).values(list(rows[start:end]))
+                    statement = statement.on_conflict_do_update(
+                        index_elements=[table.c.device_id, table.c.recorded_at],
+                        set_={
+                            column.name: statement.excluded[column.name]
+                            for column in table.columns
+                            if column.name not in ("id", "device_id", "recorded_at")
+                        },
+                    )
+                    connection.execute(statement)
 
-cockroach_connector = CockroachDatabaseConnector(config)
+        retry_on_serialization_failure(
+            upsert_rows,
+            max_retries=self.connection_params.transaction_retries,
+            backoff=self.connection_params.retry_backoff,
+        )
@@ -1,15 +1,20 @@
+import csv
+import io
 import logging
+from collections.abc import Sequence
 from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any
 
-from pydantic import BaseModel
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from py_nest_thermostat.config import PyNestConfig, config
-from py_nest_thermostat.connectors.base import BaseDbConnector, SQLAlchemyBase
+from py_nest_thermostat.config import PyNestConfig
+from py_nest_thermostat.connectors.base import BaseDbConnector, PoolSettings, cached_engine
 
+if TYPE_CHECKING:
+    from py_nest_thermostat.connectors.schema import SchemaManager
 
-class PostgresDbConnectionParams(BaseModel):
+
+class PostgresDbConnectionParams(PoolSettings):
     db_name: str = "py-nest-thermostat-report"
     password: str = "magical_password"
     username: str = "py-nest-thermostat"
@@ -24,16 +29,18 @@ class PostgresDatabaseConnector(BaseDbConnector):
             f"{self.connection_params.password}@localhost:5432/{self.connection_params.db_name}"
         )
         self.connection_string = db_url
+        self.retention_days = config.database.retention_days
 
     def connect(self):
-        self.engine = create_engine(self.connection_string)
-        self.engine.connect()
+        self.engine = cached_engine(
+            self.connection_string, **self.connection_params.engine_options()
+        )
         self.session_factory = sessionmaker(bind=self.engine)
 
-    def create_models(self):
-        import py_nest_thermostat.models  # noqa: F401
+    def get_schema_manager(self) -> "SchemaManager":
+        from py_nest_thermostat.connectors.schema import PostgresSchemaManager
 
-        SQLAlchemyBase.metadata.create_all(self.engine)
+        return PostgresSchemaManager(self.engine, self.retention_days)
 
     @contextmanager
     def session_manager(self):
@@ -45,7 +52,41 @@ class PostgresDatabaseConnector(BaseDbConnector):
             session.rollback()
             raise e
         finally:
+            session.close()
             logging.debug("Closing database connection")
 
+    def insert_rows(self, rows: Sequence[dict[str, Any]]):
+        """
+        Streams the rows into a temporary table with a single `COPY ... FROM STDIN` and moves them
+        into device_stats skipping readings that already exist, so that replaying rows is harmless.
+        """
+        table = self.device_stats_table
+        columns = [column.name for column in table.columns]
+        column_list = ", ".join(columns)
+        buffer = io.StringIO()
+        # None values are written as unquoted empty strings which COPY reads as NULL
+        csv.writer(buffer).writerows([[row.get(column) for column in columns] for row in rows])
+        buffer.seek(0)
 
-postgres_connector = PostgresDatabaseConnector(config)
+        raw_connection = self.engine.raw_connection()
+        try:
+            with raw_connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE {table.name}_staging "
+                    f"(LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                cursor.copy_expert(
+                    f"COPY {table.name}_staging ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+                cursor.execute(
+                    f"INSERT INTO {table.name} ({column_list}) "
+                    f"SELECT {column_list} FROM {table.name}_staging ON CONFLICT DO NOTHING"
+                )
+            raw_connection.commit()
+        except Exception as e:
+            logging.error("Rolling back bulk insert")
+            raw_connection.rollback()
+            raise e
+        finally:
+            raw_connection.close()
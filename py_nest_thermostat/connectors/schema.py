@@ -0,0 +1,462 @@
+import logging
+import re
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from datetime import datetime, timedelta
+from typing import Any, Optional, TypeVar
+
+from sqlalchemy import DateTime, Table, bindparam, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable
+
+from py_nest_thermostat.connectors.base import SQLAlchemyBase
+
+T = TypeVar("T")
+
+# column -> aggregate computing it from the raw readings of a bucket
+HOURLY_AGGREGATES: dict[str, str] = {
+    "samples": "count(*)",
+    "temperature_min": "min(temperature)",
+    "temperature_max": "max(temperature)",
+    "temperature_sum": "sum(temperature)",
+    "humidity_min": "min(humidity)",
+    "humidity_max": "max(humidity)",
+    "humidity_sum": "sum(humidity)",
+    "target_temperature_sum": "sum(target_temperature)",
+    "heating_samples": (
+        "sum(CASE WHEN mode IN ('HEAT', 'HEATCOOL') AND target_temperature > temperature "
+        "THEN 1 ELSE 0 END)"
+    ),
+    "above_target_samples": "sum(CASE WHEN temperature > target_temperature THEN 1 ELSE 0 END)",
+}
+# column -> aggregate computing it from the hourly rollups of a day
+DAILY_AGGREGATES: dict[str, str] = {
+    column: f"{aggregate[:3]}({column})" if aggregate[:3] in ("min", "max") else f"sum({column})"
+    for column, aggregate in HOURLY_AGGREGATES.items()
+}
+
+
+class SchemaError(Exception):
+    pass
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(moment: datetime) -> datetime:
+    return month_start(month_start(moment) + timedelta(days=32))
+
+
+def months_between(start: datetime, end: datetime) -> Iterator[datetime]:
+    """Yields the first day of every month from the month of `start` to the month of `end`."""
+    month = month_start(start)
+    while month <= end:
+        yield month
+        month = next_month(month)
+
+
+class SchemaManager:
+    """
+    Creates and maintains the device_stats schema: the `devices` dimension, the raw readings and
+    their hourly and daily rollups. The rollups are refreshed after every insert and are kept
+    when the retention policy deletes old raw readings.
+    Database specific managers add partitioning and their own retention strategy.
+    """
+
+    LEGACY_TABLE_NAME = "device_stats_legacy"
+    # how often a long running writer applies the retention policy
+    MAINTENANCE_INTERVAL = timedelta(hours=24)
+
+    def __init__(self, engine: Engine, retention_days: Optional[int] = None):
+        self.engine = engine
+        self.retention_days = retention_days
+        self.maintained_at: Optional[datetime] = None
+        self.device_ids: dict[str, int] = {}
+
+    @property
+    def tables(self) -> dict[str, Table]:
+        import py_nest_thermostat.models  # noqa: F401
+
+        return SQLAlchemyBase.metadata.tables
+
+    def has_legacy_table(self) -> bool:
+        """The original schema stored the device name on every row of device_stats."""
+        inspector = inspect(self.engine)
+        if not inspector.has_table("device_stats"):
+            return False
+        return "name" in {column["name"] for column in inspector.get_columns("device_stats")}
+
+    def create(self):
+        if self.has_legacy_table():
+            raise SchemaError(
+                "device_stats uses the previous schema. Run `nest migrate` to convert it."
+            )
+        self.create_tables()
+        self.maintain()
+
+    def create_tables(self):
+        SQLAlchemyBase.metadata.create_all(self.engine, tables=list(self.tables.values()))
+
+    def bucket_expression(self, unit: str, column: str) -> str:
+        return f"date_trunc('{unit}', {column})"
+
+    def resolve_device_ids(self, names: Iterable[str]) -> dict[str, int]:
+        """Returns the id of every device name, adding the devices we've never seen before."""
+        devices = self.tables["devices"]
+        missing = set(names) - self.device_ids.keys()
+        if missing:
+            with self.engine.begin() as connection:
+                self.device_ids.update(
+                    connection.execute(
+                        select(devices.c.name, devices.c.id).where(devices.c.name.in_(missing))
+                    ).all()
+                )
+            for name in missing - self.device_ids.keys():
+                try:
+                    with self.engine.begin() as connection:
+                        connection.execute(devices.insert().values(name=name))
+                except IntegrityError:
+                    logging.debug(f"{name} was added by another writer")
+            with self.engine.begin() as connection:
+                self.device_ids.update(
+                    connection.execute(
+                        select(devices.c.name, devices.c.id).where(devices.c.name.in_(missing))
+                    ).all()
+                )
+        return self.device_ids
+
+    def normalise_rows(self, rows: Sequence[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Replaces the device name of the rows built by the API layer with the device id."""
+        device_ids = self.resolve_device_ids({row["name"] for row in rows})
+        return [
+            {
+                "device_id": device_ids[row["name"]],
+                **{column: value for column, value in row.items() if column != "name"},
+            }
+            for row in rows
+        ]
+
+    def prepare_insert(self, rows: Sequence[dict[str, Any]]):
+        "Hook to get the database ready for the rows, e.g. by creating their partitions."
+        ...
+
+    def after_insert(self, rows: Sequence[dict[str, Any]]):
+        recorded_ats = [row["recorded_at"] for row in rows]
+        self.refresh_rollups(
+            min(recorded_ats), max(recorded_ats), {row["device_id"] for row in rows}
+        )
+        if self.maintained_at is None or (
+            datetime.utcnow() - self.maintained_at >= self.MAINTENANCE_INTERVAL
+        ):
+            self.maintain()
+
+    def refresh_rollup(
+        self,
+        connection: Connection,
+        rollup_table: str,
+        source_table: str,
+        aggregates: dict[str, str],
+        unit: str,
+        time_column: str,
+        start: datetime,
+        end: datetime,
+        device_ids: Optional[set[int]],
+    ):
+        columns = ", ".join(aggregates)
+        bucket = self.bucket_expression(unit, time_column)
+        device_filter = "AND device_id IN :device_ids" if device_ids else ""
+        statement = text(
+            f"INSERT INTO {rollup_table} (device_id, bucket, {columns}) "
+            f"SELECT device_id, {bucket}, {', '.join(aggregates.values())} FROM {source_table} "
+            f"WHERE {time_column} >= :start AND {time_column} < :end {device_filter} "
+            f"GROUP BY device_id, {bucket} "
+            "ON CONFLICT (device_id, bucket) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in aggregates)
+        ).bindparams(bindparam("start", type_=DateTime()), bindparam("end", type_=DateTime()))
+        parameters: dict[str, Any] = {"start": start, "end": end}
+        if device_ids:
+            statement = statement.bindparams(bindparam("device_ids", expanding=True))
+            parameters["device_ids"] = list(device_ids)
+        connection.execute(statement, parameters)
+
+    def refresh_rollups(
+        self, start: datetime, end: datetime, device_ids: Optional[set[int]] = None
+    ):
+        """
+        Recomputes the hourly and daily buckets overlapping [start, end] from scratch, which keeps
+        them right when readings are replayed or arrive late.
+        """
+        hour_start = start.replace(minute=0, second=0, microsecond=0)
+        hour_end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        day_start = hour_start.replace(hour=0)
+        day_end = end.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        with self.engine.begin() as connection:
+            self.refresh_rollup(
+                connection,
+                "device_stats_hourly",
+                "device_stats",
+                HOURLY_AGGREGATES,
+                "hour",
+                "recorded_at",
+                hour_start,
+                hour_end,
+                device_ids,
+            )
+            self.refresh_rollup(
+                connection,
+                "device_stats_daily",
+                "device_stats_hourly",
+                DAILY_AGGREGATES,
+                "day",
+                "bucket",
+                day_start,
+                day_end,
+                device_ids,
+            )
+
+    def retention_cutoff(self) -> Optional[datetime]:
+        if not self.retention_days:
+            return None
+        return datetime.utcnow() - timedelta(days=self.retention_days)
+
+    def maintain(self):
+        cutoff = self.retention_cutoff()
+        if cutoff:
+            logging.info(f"Removing raw readings recorded before {cutoff}")
+            self.apply_retention(cutoff)
+        self.maintained_at = datetime.utcnow()
+
+    def apply_retention(self, cutoff: datetime):
+        with self.engine.begin() as connection:
+            connection.execute(
+                text("DELETE FROM device_stats WHERE recorded_at < :cutoff").bindparams(
+                    bindparam("cutoff", type_=DateTime())
+                ),
+                {"cutoff": cutoff},
+            )
+
+    def rename_legacy_table(self, connection: Connection):
+        connection.execute(text(f"ALTER TABLE device_stats RENAME TO {self.LEGACY_TABLE_NAME}"))
+
+    def migrate(self) -> int:
+        """
+        Moves the readings of the previous device_stats table into the new schema. The old table
+        is renamed to device_stats_legacy and left in place, drop it once you're happy.
+        Returns the number of migrated readings.
+        """
+        if not self.has_legacy_table():
+            logging.info("device_stats already uses the current schema, nothing to migrate")
+            self.create_tables()
+            return 0
+        with self.engine.begin() as connection:
+            self.rename_legacy_table(connection)
+        self.create_tables()
+
+        legacy = self.LEGACY_TABLE_NAME
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"INSERT INTO devices (name) SELECT DISTINCT name FROM {legacy} "
+                    "WHERE name IS NOT NULL ON CONFLICT (name) DO NOTHING"
+                )
+            )
+            first_recorded_at, last_recorded_at = connection.execute(
+                text(f"SELECT min(recorded_at), max(recorded_at) FROM {legacy}")
+            ).one()
+        if first_recorded_at is None:
+            return 0
+
+        migrated = 0
+        # one month per transaction keeps transactions reasonably small on big tables
+        for month in months_between(first_recorded_at, last_recorded_at):
+            self.prepare_insert([{"recorded_at": month}])
+            with self.engine.begin() as connection:
+                result = connection.execute(
+                    text(
+                        "INSERT INTO device_stats "
+                        "(id, recorded_at, device_id, humidity, temperature, mode, "
+                        "target_temperature) "
+                        "SELECT legacy.id, legacy.recorded_at, devices.id, legacy.humidity, "
+                        "legacy.temperature, legacy.mode, legacy.target_temperature "
+                        f"FROM {legacy} AS legacy JOIN devices ON devices.name = legacy.name "
+                        "WHERE legacy.recorded_at >= :month_start "
+                        "AND legacy.recorded_at < :month_end "
+                        "ON CONFLICT DO NOTHING"
+                    ),
+                    {"month_start": month, "month_end": next_month(month)},
+                )
+                migrated += result.rowcount
+            logging.info(f"Migrated {migrated} readings up to {next_month(month):%Y-%m}")
+        self.refresh_rollups(first_recorded_at, last_recorded_at)
+        return migrated
+
+
+class PostgresSchemaManager(SchemaManager):
+    """
+    device_stats is range partitioned on recorded_at with one partition per month, created ahead
+    of time and on demand for older readings. Retention drops whole partitions, which is instant
+    and leaves no bloat behind, and a BRIN index keeps time range scans cheap.
+    """
+
+    PARTITION_NAME_PATTERN = re.compile(r"^device_stats_y(\d{4})m(\d{2})$")
+    PARTITIONS_AHEAD = 2
+
+    def __init__(self, engine: Engine, retention_days: Optional[int] = None):
+        super().__init__(engine, retention_days)
+        self.partitions: Optional[set[datetime]] = None
+
+    def create_tables(self):
+        tables = self.tables
+        device_stats = tables["device_stats"]
+        with self.engine.begin() as connection:
+            tables["devices"].create(connection, checkfirst=True)
+            if not inspect(connection).has_table("device_stats"):
+                create_table = str(CreateTable(device_stats).compile(dialect=self.engine.dialect))
+                connection.execute(text(f"{create_table.strip()} PARTITION BY RANGE (recorded_at)"))
+            for index in device_stats.indexes:
+                index.create(connection, checkfirst=True)
+            connection.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_device_stats_recorded_at_brin "
+                    "ON device_stats USING brin (recorded_at)"
+                )
+            )
+            tables["device_stats_hourly"].create(connection, checkfirst=True)
+            tables["device_stats_daily"].create(connection, checkfirst=True)
+
+    def partition_name(self, month: datetime) -> str:
+        return f"device_stats_y{month:%Y}m{month:%m}"
+
+    def existing_partitions(self) -> set[datetime]:
+        if self.partitions is None:
+            with self.engine.begin() as connection:
+                partition_names = connection.execute(
+                    text(
+                        "SELECT child.relname FROM pg_inherits "
+                        "JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent "
+                        "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+                        "WHERE parent.relname = 'device_stats'"
+                    )
+                ).scalars()
+                self.partitions = set()
+                for partition_name in partition_names:
+                    match = self.PARTITION_NAME_PATTERN.match(partition_name)
+                    if match:
+                        self.partitions.add(datetime(int(match[1]), int(match[2]), 1))
+        return self.partitions
+
+    def ensure_partitions(self, start: datetime, end: datetime):
+        partitions = self.existing_partitions()
+        for month in months_between(start, end):
+            if month in partitions:
+                continue
+            with self.engine.begin() as connection:
+                connection.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {self.partition_name(month)} "
+                        "PARTITION OF device_stats "
+                        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+                    )
+                )
+            logging.debug(f"Created partition {self.partition_name(month)}")
+            partitions.add(month)
+
+    def prepare_insert(self, rows: Sequence[dict[str, Any]]):
+        recorded_ats = [row["recorded_at"] for row in rows]
+        self.ensure_partitions(min(recorded_ats), max(recorded_ats))
+
+    def maintain(self):
+        now = datetime.utcnow()
+        self.ensure_partitions(now, now + timedelta(days=31 * self.PARTITIONS_AHEAD))
+        super().maintain()
+
+    def apply_retention(self, cutoff: datetime):
+        partitions = self.existing_partitions()
+        for month in sorted(partitions):
+            # only partitions that are entirely older than the cutoff are dropped
+            if next_month(month) > cutoff:
+                break
+            with self.engine.begin() as connection:
+                connection.execute(text(f"DROP TABLE IF EXISTS {self.partition_name(month)}"))
+            logging.info(f"Dropped partition {self.partition_name(month)}")
+            partitions.discard(month)
+
+    def rename_legacy_table(self, connection: Connection):
+        super().rename_legacy_table(connection)
+        # index names are schema wide in Postgres and the new table wants its primary key name back
+        connection.execute(
+            text(f"ALTER INDEX IF EXISTS device_stats_pkey RENAME TO {self.LEGACY_TABLE_NAME}_pkey")
+        )
+
+
+class CockroachSchemaManager(SchemaManager):
+    """
+    CockroachDB splits tables into ranges on its own so device_stats is not partitioned; the
+    (device_id, recorded_at) index serves time range queries. Retention deletes old readings in
+    small batches to stay clear of large transactions.
+    """
+
+    RETENTION_BATCH_SIZE = 10_000
+
+    def __init__(
+        self,
+        engine: Engine,
+        retention_days: Optional[int] = None,
+        transaction_retries: int = 5,
+        retry_backoff: float = 0.1,
+    ):
+        super().__init__(engine, retention_days)
+        self.transaction_retries = transaction_retries
+        self.retry_backoff = retry_backoff
+
+    def retry(self, transaction: Callable[[], T]) -> T:
+        """Runs the transaction again when it conflicts with a concurrent one (SQLSTATE 40001)."""
+        from py_nest_thermostat.connectors.cockroach_db import retry_on_serialization_failure
+
+        return retry_on_serialization_failure(
+            transaction, max_retries=self.transaction_retries, backoff=self.retry_backoff
+        )
+
+    def refresh_rollups(
+        self, start: datetime, end: datetime, device_ids: Optional[set[int]] = None
+    ):
+        # rollups are recomputed from scratch so running the refresh again is harmless
+        refresh_rollups = super().refresh_rollups
+        self.retry(lambda: refresh_rollups(start, end, device_ids))
+
+    def delete_expired_batch(self, cutoff: datetime) -> int:
+        with self.engine.begin() as connection:
+            return connection.execute(
+                text(
+                    "DELETE FROM device_stats WHERE recorded_at < :cutoff "
+                    f"LIMIT {self.RETENTION_BATCH_SIZE}"
+                ),
+                {"cutoff": cutoff},
+            ).rowcount
+
+    def apply_retention(self, cutoff: datetime):
+        while True:
+            deleted = self.retry(lambda: self.delete_expired_batch(cutoff))
+            if deleted < self.RETENTION_BATCH_SIZE:
+                return
+
+
+class SqliteSchemaManager(SchemaManager):
+    """
+    SQLite has no `date_trunc`: buckets are built with `strftime`, in the format SQLAlchemy stores
+    DateTime columns in, so that they compare and sort with the raw readings as plain strings.
+    """
+
+    # unit -> strftime format and modifiers truncating a timestamp to the start of its bucket
+    BUCKET_FORMATS: dict[str, tuple[str, str]] = {
+        "hour": ("%Y-%m-%d %H:00:00.000000", ""),
+        "day": ("%Y-%m-%d 00:00:00.000000", ""),
+        # weeks start on Monday like Postgres' date_trunc('week', ...)
+        "week": ("%Y-%m-%d 00:00:00.000000", ", '-6 days', 'weekday 1'"),
+        "month": ("%Y-%m-01 00:00:00.000000", ""),
+    }
+
+    def bucket_expression(self, unit: str, column: str) -> str:
+        bucket_format, modifiers = self.BUCKET_FORMATS[unit]
+        return f"strftime('{bucket_format}', {column}{modifiers})"
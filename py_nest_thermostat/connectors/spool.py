@@ -0,0 +1,136 @@
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from collections.abc import Callable, Iterable
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+from py_nest_thermostat.connectors.base import BaseDbConnector
+from py_nest_thermostat.connectors.writer import BufferedStatsWriter
+from py_nest_thermostat.metrics import QUEUE_DEPTH
+
+
+class StatsSpool:
+    """
+    Durable local spool for device_stats rows.
+
+    Rows are first committed to a SQLite database (in WAL mode) under `~/.py-nest-thermostat/` and a
+    background thread drains them to the configured database in large batches. Rows are only removed
+    from the spool once the database has committed them, so delivery is at-least-once and the
+    connectors' bulk inserts skip ids they already hold.
+    """
+
+    SPOOL_FILENAME = Path("~/.py-nest-thermostat/spool.sqlite3").expanduser()
+
+    def __init__(
+        self,
+        get_connector: Callable[[], BaseDbConnector],
+        path: Path = SPOOL_FILENAME,
+        batch_size: int = 500,
+        drain_interval: float = 300.0,
+    ):
+        # the connector is obtained lazily so that we can start spooling while the database is down
+        self.get_connector = get_connector
+        self.path = path
+        self.batch_size = batch_size
+        self.drain_interval = drain_interval
+        self.writer: Optional[BufferedStatsWriter] = None
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS spooled_rows "
+            "(seq INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, row TEXT NOT NULL)"
+        )
+        self.connection.commit()
+        self.lock = threading.Lock()
+
+        self.wake_up = threading.Event()
+        self.stopping = threading.Event()
+        self.drain_thread: Optional[threading.Thread] = None
+
+    @property
+    def pending(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT count(*) FROM spooled_rows").fetchone()[0]
+
+    @staticmethod
+    def serialise(row: dict[str, Any]) -> str:
+        return json.dumps(row, default=str)
+
+    @staticmethod
+    def deserialise(row: str) -> dict[str, Any]:
+        parsed_row = json.loads(row)
+        parsed_row["id"] = uuid.UUID(parsed_row["id"])
+        if parsed_row.get("recorded_at"):
+            parsed_row["recorded_at"] = datetime.fromisoformat(parsed_row["recorded_at"])
+        return parsed_row
+
+    def add(self, rows: Iterable[dict[str, Any]]):
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO spooled_rows (id, row) VALUES (?, ?)",
+                    [(str(row["id"]), self.serialise(row)) for row in rows],
+                )
+        pending = self.pending
+        QUEUE_DEPTH.set(pending, queue="spool")
+        if pending >= self.batch_size:
+            self.wake_up.set()
+
+    def drain(self) -> int:
+        """Pushes every spooled row to the database, batch by batch. Returns the number of rows sent."""
+        if self.writer is None:
+            self.writer = BufferedStatsWriter(self.get_connector(), max_batch_size=self.batch_size)
+        rows_sent = 0
+        while True:
+            with self.lock:
+                batch = self.connection.execute(
+                    "SELECT seq, row FROM spooled_rows ORDER BY seq LIMIT ?", (self.batch_size,)
+                ).fetchall()
+            if not batch:
+                return rows_sent
+            self.writer.write_batch([self.deserialise(row) for _, row in batch])
+            # only forget about the rows once the database holds them
+            with self.lock:
+                with self.connection:
+                    self.connection.execute(
+                        "DELETE FROM spooled_rows WHERE seq <= ?", (batch[-1][0],)
+                    )
+            rows_sent += len(batch)
+            QUEUE_DEPTH.set(self.pending, queue="spool")
+
+    def _drain_forever(self):
+        while not self.stopping.is_set():
+            try:
+                self.drain()
+            except Exception as e:
+                logging.warning(
+                    f"Could not drain the spool, {self.pending} rows are kept until next attempt. {e}"
+                )
+            self.wake_up.wait(self.drain_interval)
+            self.wake_up.clear()
+
+    def start(self):
+        self.drain_thread = threading.Thread(
+            target=self._drain_forever, name="stats-spool-drain", daemon=True
+        )
+        self.drain_thread.start()
+
+    def close(self):
+        self.stopping.set()
+        self.wake_up.set()
+        if self.drain_thread:
+            self.drain_thread.join()
+        try:
+            self.drain()
+        except Exception as e:
+            logging.warning(
+                f"Could not drain the spool, {self.pending} rows will be sent next time. {e}"
+            )
+        self.connection.close()
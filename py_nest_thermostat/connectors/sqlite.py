@@ -0,0 +1,83 @@
+import logging
+from collections.abc import Sequence
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from py_nest_thermostat.config import PyNestConfig
+from py_nest_thermostat.connectors.base import BaseDbConnector, cached_engine
+
+if TYPE_CHECKING:
+    from py_nest_thermostat.connectors.schema import SchemaManager
+
+
+class SqliteDbConnectionParams(BaseModel):
+    path: Path = Path("~/.py-nest-thermostat/device_stats.sqlite3")
+    # milliseconds a writer waits for another one to release the database
+    busy_timeout: int = 5000
+
+
+def set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # NORMAL is durable in WAL mode up to the last checkpoint, and much faster than FULL
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+class SqliteDatabaseConnector(BaseDbConnector):
+    """
+    Embedded database in a single file, for boxes that can't run a database service. The database
+    is in WAL mode so that `nest report` and `nest export` can read while the collector writes.
+    """
+
+    def __init__(self, config: PyNestConfig):
+        self.connection_params = SqliteDbConnectionParams(**config.database.credentials)
+        self.path = self.connection_params.path.expanduser()
+        self.connection_string = f"sqlite:///{self.path}"
+        self.retention_days = config.database.retention_days
+
+    def connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.engine = cached_engine(
+            self.connection_string,
+            # sqlite3's timeout is the busy timeout, in seconds
+            connect_args={"timeout": self.connection_params.busy_timeout / 1000},
+        )
+        # the engine is shared by the connectors of the process, it only needs the listener once
+        if not event.contains(self.engine, "connect", set_pragmas):
+            event.listen(self.engine, "connect", set_pragmas)
+        self.session_factory = sessionmaker(bind=self.engine)
+
+    def get_schema_manager(self) -> "SchemaManager":
+        from py_nest_thermostat.connectors.schema import SqliteSchemaManager
+
+        return SqliteSchemaManager(self.engine, self.retention_days)
+
+    @contextmanager
+    def session_manager(self):
+        session = self.session_factory()
+        try:
+            yield session
+        except Exception as e:
+            logging.error("Rolling back transaction")
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+            logging.debug("Closing database connection")
+
+    def insert_rows(self, rows: Sequence[dict[str, Any]]):
+        """
+        Writes all the rows in a single transaction, SQLite's cost is per commit rather than per
+        row. Readings that already exist are skipped (`INSERT OR IGNORE`).
+        """
+        with self.engine.begin() as connection:
+            connection.execute(
+                self.device_stats_table.insert().prefix_with("OR IGNORE"), list(rows)
+            )
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+from collections.abc import Iterable, Sequence
+from typing import Any, Optional
+
+from py_nest_thermostat.connectors.base import BaseDbConnector
+from py_nest_thermostat.metrics import QUEUE_DEPTH
+
+
+class BufferedStatsWriter:
+    """
+    Buffers device_stats rows and writes them with the connector's bulk insert once the buffer
+    holds `max_batch_size` rows or its oldest row is older than `max_batch_age` seconds. Safe to
+    share between threads, e.g. the accounts of a collector worker.
+    """
+
+    def __init__(
+        self,
+        connector: BaseDbConnector,
+        max_batch_size: int = 500,
+        max_batch_age: float = 300.0,
+    ):
+        self.connector = connector
+        self.max_batch_size = max_batch_size
+        self.max_batch_age = max_batch_age
+
+        # reentrant as `add` flushes while holding it
+        self.lock = threading.RLock()
+        self.buffer: list[dict[str, Any]] = []
+        self.oldest_row_added_at: Optional[float] = None
+
+        # throughput accounting
+        self.rows_written: int = 0
+        self.flushes: int = 0
+        self.seconds_flushing: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        """Rows written per second spent flushing, i.e. the throughput the database sustains."""
+        if not self.seconds_flushing:
+            return 0.0
+        return self.rows_written / self.seconds_flushing
+
+    @property
+    def is_due(self) -> bool:
+        if not self.buffer:
+            return False
+        if len(self.buffer) >= self.max_batch_size:
+            return True
+        assert self.oldest_row_added_at is not None, "oldest_row_added_at cannot be None"
+        return time.monotonic() - self.oldest_row_added_at >= self.max_batch_age
+
+    def add(self, rows: Iterable[dict[str, Any]]):
+        with self.lock:
+            for row in rows:
+                if not self.buffer:
+                    self.oldest_row_added_at = time.monotonic()
+                self.buffer.append(row)
+            QUEUE_DEPTH.set(len(self.buffer), queue="memory")
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        with self.lock:
+            if self.is_due:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.buffer:
+                return
+            # on failure the rows stay in the buffer so that the next flush can retry them
+            self.write_batch(self.buffer)
+            self.buffer = []
+            self.oldest_row_added_at = None
+            QUEUE_DEPTH.set(0, queue="memory")
+
+    def write_batch(self, batch: Sequence[dict[str, Any]]):
+        """Writes a batch straight to the database and accounts for it in the throughput stats."""
+        flush_started_at = time.monotonic()
+        self.connector.bulk_insert(batch)
+        flush_duration = time.monotonic() - flush_started_at
+
+        self.rows_written += len(batch)
+        self.flushes += 1
+        self.seconds_flushing += flush_duration
+        logging.info(
+            f"Flushed {len(batch)} rows in {flush_duration:.3f}s "
+            f"({len(batch) / max(flush_duration, 1e-9):.0f} rows/s, "
+            f"{self.rows_per_second:.0f} rows/s over {self.flushes} flushes)"
+        )
+
+    def close(self):
+        self.flush()
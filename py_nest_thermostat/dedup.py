@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from py_nest_thermostat.logger import log
+from py_nest_thermostat.metrics import READINGS
+from py_nest_thermostat.nest_api import AnyThermostatStats
+
+# digits the differences are rounded to, so that e.g. 20.2 - 20.1 counts as 0.1
+DIFFERENCE_DIGITS = 6
+
+
+def exceeds(difference: float, tolerance: float) -> bool:
+    """Whether a difference is a change: it is not nil, nor under the tolerance."""
+    difference = round(abs(difference), DIFFERENCE_DIGITS)
+    return difference > 0 and difference >= tolerance
+
+
+class ChangeDetector:
+    """
+    Decides which readings are worth writing. A reading is written when it differs from the last
+    written reading of the same device by at least the tolerances, when its mode, eco mode or
+    connectivity changed, or when nothing was written for that device for `heartbeat_interval`.
+    """
+
+    def __init__(
+        self,
+        heartbeat_interval: timedelta = timedelta(minutes=15),
+        temperature_tolerance: float = 0.1,
+        humidity_tolerance: float = 1.0,
+        target_temperature_tolerance: float = 0.0,
+    ):
+        self.heartbeat_interval = heartbeat_interval
+        self.temperature_tolerance = temperature_tolerance
+        self.humidity_tolerance = humidity_tolerance
+        self.target_temperature_tolerance = target_temperature_tolerance
+
+        self.last_written: dict[str, tuple[datetime, AnyThermostatStats]] = {}
+        self.written: int = 0
+        self.suppressed: int = 0
+
+    def has_changed(self, previous: AnyThermostatStats, current: AnyThermostatStats) -> bool:
+        return (
+            exceeds(current.temperature - previous.temperature, self.temperature_tolerance)
+            or exceeds(current.humidity - previous.humidity, self.humidity_tolerance)
+            or exceeds(
+                float(current.target_temperature) - float(previous.target_temperature),
+                self.target_temperature_tolerance,
+            )
+            or current.mode != previous.mode
+            or current.eco_mode != previous.eco_mode
+            or current.status != previous.status
+            or current.temperature_unit != previous.temperature_unit
+        )
+
+    def should_write(self, stats: AnyThermostatStats, recorded_at: datetime) -> bool:
+        device_key = stats.device_id or stats.device_name
+        last_written = self.last_written.get(device_key)
+        if last_written is not None:
+            last_written_at, last_written_stats = last_written
+            is_heartbeat_due = recorded_at - last_written_at >= self.heartbeat_interval
+            if not is_heartbeat_due and not self.has_changed(last_written_stats, stats):
+                self.suppressed += 1
+                READINGS.inc(result="suppressed")
+                log.debug(f"Suppressing unchanged reading of {stats.device_name}")
+                return False
+        self.last_written[device_key] = (recorded_at, stats)
+        self.written += 1
+        READINGS.inc(result="written")
+        return True
+
+    def filter(
+        self, device_stats: list[AnyThermostatStats], recorded_at: datetime
+    ) -> list[AnyThermostatStats]:
+        return [stats for stats in device_stats if self.should_write(stats, recorded_at)]
@@ -0,0 +1,88 @@
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel
+
+from py_nest_thermostat.logger import log
+
+
+class CachedDevice(BaseModel):
+    """The non volatile part of a device: what it is and where it lives. Traits are never cached."""
+
+    name: str
+    type: str
+    display_name: str
+
+    @property
+    def device_id(self) -> Optional[str]:
+        device_id_match = re.search(r"(?<=\/devices\/).*", self.name)
+        return device_id_match[0] if device_id_match else None
+
+
+class DeviceCacheContent(BaseModel):
+    project_id: str
+    cached_at: datetime
+    devices: list[CachedDevice]
+
+
+class DeviceCache:
+    """
+    On-disk cache of the devices metadata so that we don't have to list all the devices of the
+    project every time we want to talk to one of them. The content is kept in memory once read,
+    and the file is only read again when it expires.
+    """
+
+    DEVICE_CACHE_FILENAME = Path("~/.py-nest-thermostat/device_cache.json").expanduser()
+    DEFAULT_TTL = timedelta(hours=24)
+
+    def __init__(self, path: Path = DEVICE_CACHE_FILENAME, ttl: timedelta = DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.content: Optional[DeviceCacheContent] = None
+
+    def is_fresh(self, content: DeviceCacheContent) -> bool:
+        return datetime.utcnow() - content.cached_at <= self.ttl
+
+    def load(self) -> Optional[DeviceCacheContent]:
+        if self.content is not None and self.is_fresh(self.content):
+            return self.content
+        if not self.path.is_file():
+            return None
+        try:
+            with open(self.path) as f:
+                self.content = DeviceCacheContent(**json.load(f))
+        except (json.JSONDecodeError, ValueError) as e:
+            log.debug(f"Ignoring unreadable device cache: {e}")
+            return None
+        return self.content
+
+    def get(self, project_id: str) -> Optional[list[CachedDevice]]:
+        """Returns the cached devices of the project or None when they are missing or stale."""
+        content = self.load()
+        if content is None or content.project_id != project_id:
+            return None
+        if not self.is_fresh(content):
+            log.debug("The device cache has expired")
+            return None
+        return content.devices
+
+    def set(self, project_id: str, devices: list[CachedDevice]):
+        content = DeviceCacheContent(
+            project_id=project_id, cached_at=datetime.utcnow(), devices=devices
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename so that concurrent readers never see a half written file
+        temporary_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "w") as f:
+            f.write(content.json())
+        os.replace(temporary_path, self.path)
+        self.content = content
+
+    def invalidate(self):
+        log.debug("Invalidating the device cache")
+        self.content = None
+        self.path.unlink(missing_ok=True)
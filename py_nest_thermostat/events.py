@@ -0,0 +1,237 @@
+import json
+import os
+import socket
+import time
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional, Protocol, Union
+
+from pydantic import BaseModel
+
+from py_nest_thermostat.logger import log
+from py_nest_thermostat.nest_api import (
+    BaseNestThermostat,
+    Device,
+    DeviceList,
+    ThermostatStats,
+    build_thermostat_stats,
+)
+
+
+class ResourceUpdate(BaseModel):
+    name: str
+    traits: dict[str, Any] = {}
+
+
+class DeviceEvent(BaseModel):
+    """
+    A Smart Device Management event as published on Pub/Sub
+    (https://developers.google.com/nest/device-access/api/events). Only trait updates are used.
+    """
+
+    eventId: str
+    timestamp: datetime
+    resourceUpdate: Optional[ResourceUpdate] = None
+
+
+class EventSource(Protocol):
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        ...
+
+
+class DeviceStateStore:
+    """
+    Keeps the traits of every thermostat in memory, applies the deltas carried by the events and
+    tells whether the stats of a device actually changed. Events of other devices (cameras,
+    doorbells...) are ignored.
+    """
+
+    def __init__(self, device_list: DeviceList):
+        self.devices: dict[str, Device] = {
+            device.name: device
+            for device in device_list.devices
+            if device.type in BaseNestThermostat.SUPPORTED_DEVICE_TYPES
+        }
+        self.last_stats: dict[str, ThermostatStats] = {}
+        for device in self.devices.values():
+            try:
+                self.last_stats[device.name] = build_thermostat_stats(device)
+            except (ValueError, TypeError, IndexError) as e:
+                log.debug(f"Could not build the stats of {device.name}: {e}")
+
+        self.events_applied: int = 0
+        self.events_ignored: int = 0
+
+    def apply(self, event: DeviceEvent) -> Optional[ThermostatStats]:
+        """Returns the new stats of the device when the event changed them, None otherwise."""
+        update = event.resourceUpdate
+        if update is None or not update.traits:
+            self.events_ignored += 1
+            return None
+        device = self.devices.get(update.name)
+        if device is None:
+            log.debug(
+                f"Ignoring event {event.eventId} for unknown or unsupported device {update.name}"
+            )
+            self.events_ignored += 1
+            return None
+
+        for trait_name, trait_values in update.traits.items():
+            # events only carry the fields that changed so we merge them into what we know
+            if isinstance(trait_values, dict):
+                device.traits.setdefault(trait_name, {}).update(trait_values)
+            else:
+                device.traits[trait_name] = trait_values
+        self.events_applied += 1
+
+        try:
+            stats = build_thermostat_stats(device)
+        except (ValueError, TypeError, IndexError) as e:
+            log.debug(
+                f"Could not build the stats of {device.name} after event {event.eventId}: {e}"
+            )
+            return None
+        if self.last_stats.get(device.name) == stats:
+            return None
+        self.last_stats[device.name] = stats
+        return stats
+
+
+def parse_event(data: Union[str, bytes]) -> Optional[dict[str, Any]]:
+    """The event carried by a line or message, None (logged) when it is not a JSON object."""
+    try:
+        payload = json.loads(data)
+    except ValueError as e:
+        log.warning(f"Skipping an event that is not valid JSON: {e}")
+        return None
+    if not isinstance(payload, dict):
+        log.warning(f"Skipping an event that is not a JSON object: {type(payload).__name__}")
+        return None
+    return payload
+
+
+class FileEventSource:
+    """Reads events from a JSON lines file, and keeps following it when `follow` is set."""
+
+    def __init__(self, path: Path, follow: bool = True, poll_interval: float = 0.5):
+        self.path = path
+        self.follow = follow
+        self.poll_interval = poll_interval
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        with open(self.path) as f:
+            while True:
+                line = f.readline()
+                if not line:
+                    if not self.follow:
+                        return
+                    time.sleep(self.poll_interval)
+                    continue
+                payload = parse_event(line) if line.strip() else None
+                if payload is not None:
+                    yield payload
+
+
+class SocketEventSource:
+    """
+    Listens on a unix socket (a path) or a TCP `host:port` and reads JSON lines events from the
+    connections it accepts. Handy to push fake events while developing.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+
+    def _listen(self) -> socket.socket:
+        if ":" in self.address:
+            host, port = self.address.rsplit(":", 1)
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((host, int(port)))
+        else:
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(self.address)
+        server.listen()
+        return server
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        with self._listen() as server:
+            log.info(f"Listening for events on {self.address}")
+            while True:
+                connection, _ = server.accept()
+                with connection, connection.makefile("r") as stream:
+                    for line in stream:
+                        payload = parse_event(line) if line.strip() else None
+                        if payload is not None:
+                            yield payload
+
+
+class PubSubEventSource:
+    """
+    Pulls the events from the Pub/Sub subscription of the Device Access project. Requires the
+    `google-cloud-pubsub` package and Google application default credentials.
+    """
+
+    def __init__(self, subscription: str):
+        self.subscription = subscription
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        try:
+            from google.cloud import pubsub_v1
+        except ImportError:
+            raise ImportError(
+                "Consuming Pub/Sub events requires the `pubsub` extra: "
+                "pip install py-nest-thermostat[pubsub]"
+            )
+        with pubsub_v1.SubscriberClient() as subscriber:
+            while True:
+                response = subscriber.pull(
+                    request={"subscription": self.subscription, "max_messages": 100}
+                )
+                for received_message in response.received_messages:
+                    payload = parse_event(received_message.message.data)
+                    if payload is not None:
+                        yield payload
+                    # acknowledge once the event has been processed: at-least-once delivery, a
+                    # malformed one is acknowledged too or it would be delivered again forever
+                    subscriber.acknowledge(
+                        request={
+                            "subscription": self.subscription,
+                            "ack_ids": [received_message.ack_id],
+                        }
+                    )
+
+
+def event_source_from_uri(uri: str) -> EventSource:
+    """Builds an event source from `file:<path>`, `socket:<path or host:port>` or `pubsub:<subscription>`."""
+    kind, _, location = uri.partition(":")
+    if kind == "file":
+        return FileEventSource(Path(location).expanduser())
+    elif kind == "socket":
+        return SocketEventSource(location)
+    elif kind == "pubsub":
+        return PubSubEventSource(location)
+    else:
+        raise NotImplementedError(f"{kind} is not a supported event source")
+
+
+def ingest_events(
+    device_list: DeviceList, event_source: EventSource
+) -> Iterator[tuple[datetime, ThermostatStats]]:
+    """Yields the time and the new stats of a device every time an event changes its stats."""
+    state_store = DeviceStateStore(device_list)
+    for payload in event_source:
+        try:
+            event = DeviceEvent(**payload)
+        except ValueError as e:
+            log.warning(f"Skipping malformed event: {e}")
+            continue
+        stats = state_store.apply(event)
+        if stats:
+            # events carry an aware timestamp while the database stores naive UTC datetimes
+            recorded_at = event.timestamp
+            if recorded_at.tzinfo:
+                recorded_at = recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+            yield recorded_at, stats
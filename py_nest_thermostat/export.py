@@ -0,0 +1,210 @@
+"""
+Streaming export of the collected readings.
+
+Rows are read through a server side cursor in batches of `batch_size` and every batch is written
+out before the next one is fetched, so memory stays bounded no matter how much history there is.
+Parquet and Arrow IPC files get one row group (record batch) per batch.
+"""
+
+import csv
+import gzip
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Iterator, Sequence
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional
+
+from py_nest_thermostat.logger import log
+
+if TYPE_CHECKING:
+    from sqlalchemy.sql import Select
+
+    from py_nest_thermostat.connectors.base import BaseDbConnector
+
+FORMATS: tuple[str, ...] = ("parquet", "arrow", "csv")
+# suffix -> format, used when the format is not given explicitly
+FORMAT_SUFFIXES = {
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".gz": "csv",
+}
+EXPORT_COLUMNS: tuple[str, ...] = (
+    "device_name",
+    "recorded_at",
+    "humidity",
+    "temperature",
+    "mode",
+    "target_temperature",
+)
+
+
+def format_from_path(path: Path) -> str:
+    export_format = FORMAT_SUFFIXES.get(path.suffix.lower())
+    if export_format is None:
+        raise ValueError(
+            f"Cannot tell the export format from {path.name}, pass one of {', '.join(FORMATS)}"
+        )
+    return export_format
+
+
+def build_export_query(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    device_names: Sequence[str] = (),
+) -> "Select":
+    """The readings between `since` (included) and `until` (excluded), oldest first."""
+    from sqlalchemy import select
+
+    from py_nest_thermostat.models import DeviceDimension, DeviceStats
+
+    query = (
+        select(
+            DeviceDimension.name.label("device_name"),
+            DeviceStats.recorded_at,
+            DeviceStats.humidity,
+            DeviceStats.temperature,
+            DeviceStats.mode,
+            DeviceStats.target_temperature,
+        )
+        .join(DeviceDimension, DeviceStats.device_id == DeviceDimension.id)
+        .order_by(DeviceStats.recorded_at, DeviceStats.device_id)
+    )
+    # range conditions on recorded_at let Postgres prune the monthly partitions
+    if since is not None:
+        query = query.where(DeviceStats.recorded_at >= since)
+    if until is not None:
+        query = query.where(DeviceStats.recorded_at < until)
+    if device_names:
+        query = query.where(DeviceDimension.name.in_(device_names))
+    return query
+
+
+def iter_export_batches(
+    connector: "BaseDbConnector", query: "Select", batch_size: int
+) -> Iterator[list[tuple[Any, ...]]]:
+    """
+    Yields the rows of the query `batch_size` at a time. `stream_results` makes the driver use a
+    server side cursor (a named cursor with psycopg2) so only one batch is held in memory.
+    """
+    with connector.session_manager() as session:
+        result = session.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+        for partition in result.partitions(batch_size):
+            yield [tuple(row) for row in partition]
+
+
+class ExportWriter(ABC):
+    """Writes batches of rows to `path`, which only appears once the export is complete."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+    @abstractmethod
+    def write_batch(self, rows: Sequence[tuple[Any, ...]]):
+        "Writes a batch of rows. Implemented in concrete classes."
+        ...
+
+    def close(self):
+        ...
+
+    def __enter__(self) -> "ExportWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        if exc_type is None:
+            os.replace(self.temporary_path, self.path)
+        else:
+            self.temporary_path.unlink(missing_ok=True)
+
+
+class CsvExportWriter(ExportWriter):
+    """Gzip compressed CSV, with a header row."""
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.file = gzip.open(self.temporary_path, "wt", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write_batch(self, rows: Sequence[tuple[Any, ...]]):
+        self.writer.writerows(
+            (row[0], row[1].isoformat(), *row[2:]) for row in rows  # recorded_at as ISO 8601
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowExportWriter(ExportWriter):
+    """Parquet or Arrow IPC files, written with `pyarrow` (the `export` extra)."""
+
+    def __init__(self, path: Path, export_format: str):
+        super().__init__(path)
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(
+                f"Exporting to {export_format} requires the `export` extra: "
+                "pip install py-nest-thermostat[export]"
+            )
+        self.pa = pa
+        self.schema = pa.schema(
+            [
+                ("device_name", pa.string()),
+                ("recorded_at", pa.timestamp("us")),
+                ("humidity", pa.float64()),
+                ("temperature", pa.float64()),
+                ("mode", pa.string()),
+                ("target_temperature", pa.float64()),
+            ]
+        )
+        if export_format == "parquet":
+            import pyarrow.parquet as pq
+
+            self.writer = pq.ParquetWriter(str(self.temporary_path), self.schema)
+        else:
+            self.writer = pa.ipc.new_file(str(self.temporary_path), self.schema)
+
+    def write_batch(self, rows: Sequence[tuple[Any, ...]]):
+        columns = [
+            self.pa.array([row[index] for row in rows], type=field.type)
+            for index, field in enumerate(self.schema)
+        ]
+        # one batch is one row group, so readers can also go through the file batch by batch
+        self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def build_export_writer(path: Path, export_format: str) -> ExportWriter:
+    if export_format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if export_format == "csv":
+        return CsvExportWriter(path)
+    return ArrowExportWriter(path, export_format)
+
+
+def export_device_stats(
+    connector: "BaseDbConnector",
+    path: Path,
+    export_format: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    device_names: Sequence[str] = (),
+    batch_size: int = 10_000,
+) -> int:
+    """Streams the matching readings to `path` and returns how many were exported."""
+    export_format = export_format or format_from_path(path)
+    query = build_export_query(since, until, device_names)
+    exported = 0
+    with build_export_writer(path, export_format) as writer:
+        for rows in iter_export_batches(connector, query, batch_size):
+            writer.write_batch(rows)
+            exported += len(rows)
+            log.debug(f"Exported {exported} readings")
+    return exported
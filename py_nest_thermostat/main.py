@@ -1,17 +1,98 @@
 import logging
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from functools import lru_cache, wraps
+from typing import TYPE_CHECKING, Any, Optional, Union
 
 from cleo import Application, Command
 from rich.console import Console
 
 from py_nest_thermostat import __version__
-from py_nest_thermostat.auth import Authenticator
-from py_nest_thermostat.config import config
+from py_nest_thermostat.config import get_config
 from py_nest_thermostat.logger import log
-from py_nest_thermostat.nest_api import NestThermostat
+
+if TYPE_CHECKING:
+    import httpx
+
+    # commands import what they need when they run so that `nest temp` never pays for SQLAlchemy
+    from py_nest_thermostat.auth import Authenticator
+    from py_nest_thermostat.connectors.spool import StatsSpool
+    from py_nest_thermostat.connectors.writer import BufferedStatsWriter
+    from py_nest_thermostat.nest_api import BaseNestThermostat
+    from py_nest_thermostat.scheduler import PollPolicy, PollScheduler
 
 console = Console()
 
-AUTHENTICATOR = Authenticator(config)
+
+@lru_cache(maxsize=None)
+def get_http_client() -> "httpx.Client":
+    """The pooled client shared by the authenticator and the thermostat API."""
+    from py_nest_thermostat.transport import build_client
+
+    return build_client(get_config().http)
+
+
+@lru_cache(maxsize=None)
+def get_authenticator() -> "Authenticator":
+    from py_nest_thermostat.auth import Authenticator
+
+    return Authenticator(get_config(), client=get_http_client())
+
+
+def start_background_refresh():
+    """
+    Keeps the token fresh in the background so that requests never wait on a refresh. Requests
+    going through the proxy of `nest serve` need no token.
+    """
+    if not get_config().http.sdm_api_url:
+        get_authenticator().start_background_refresh()
+
+
+def build_stats_writer(
+    thermostat: "BaseNestThermostat",
+    batch_size: int = 500,
+    flush_every: float = 300.0,
+    use_spool: bool = True,
+) -> Union["BufferedStatsWriter", "StatsSpool"]:
+    from py_nest_thermostat.connectors.spool import StatsSpool
+    from py_nest_thermostat.connectors.writer import BufferedStatsWriter
+
+    if not use_spool:
+        return BufferedStatsWriter(
+            thermostat.get_database_connector(),
+            max_batch_size=batch_size,
+            max_batch_age=flush_every,
+        )
+    # readings hit the local spool first so that they survive database outages
+    spool = StatsSpool(
+        thermostat.get_database_connector, batch_size=batch_size, drain_interval=flush_every
+    )
+    spool.start()
+    return spool
+
+
+def profiled(handle: Callable[[Command], Any]) -> Callable[[Command], Any]:
+    """Prints the per phase timings once the command is done when `--profile` is passed."""
+
+    @wraps(handle)
+    def wrapper(command: Command):
+        try:
+            return handle(command)
+        finally:
+            if command.option("profile"):
+                from py_nest_thermostat.metrics import render_profile
+
+                render_profile()
+
+    return wrapper
+
+
+def serve_metrics_if_requested(command: Command):
+    if command.option("metrics-address"):
+        from py_nest_thermostat.metrics import serve_metrics
+
+        serve_metrics(command.option("metrics-address"))  # type: ignore
 
 
 class ListDevicesCommand(Command):
@@ -19,13 +100,20 @@ class ListDevicesCommand(Command):
     Lists the devices in the current home and allows to choose one, if more than one is availavle.
 
     devices
+        {--refresh : When passed, the device list is fetched from the Nest API instead of the local cache.}
+        {--profile : When passed, prints how long each phase of the command took.}
     """
 
+    @profiled
     def handle(self):
         if self.io.output.is_debug():
             log.setLevel(logging.DEBUG)
-        thermostat = NestThermostat(AUTHENTICATOR, config=config)
-        thermostat.get_devices()
+        from py_nest_thermostat.nest_api import NestThermostat
+
+        thermostat = NestThermostat(
+            get_authenticator(), config=get_config(), client=get_http_client()
+        )
+        thermostat.get_devices(refresh=self.option("refresh"))  # type: ignore
 
 
 class DevicesStatsCommand(Command):
@@ -35,12 +123,18 @@ class DevicesStatsCommand(Command):
     stats
         {--save-to-db : When passed, the stats will be added to the backend database.}
         {--no-print : When passed, the stats not be printed.}
+        {--profile : When passed, prints how long each phase of the command took.}
     """
 
+    @profiled
     def handle(self):
         if self.io.output.is_debug():
             log.setLevel(logging.DEBUG)
-        thermostat = NestThermostat(AUTHENTICATOR, config=config)
+        from py_nest_thermostat.nest_api import NestThermostat
+
+        thermostat = NestThermostat(
+            get_authenticator(), config=get_config(), client=get_http_client()
+        )
         thermostat.get_device_stats(
             no_print=self.option("no-print"), save_stats=self.option("save-to-db")  # type: ignore
         )
@@ -52,19 +146,534 @@ class SetTemperatureCommand(Command):
 
     temp
         {temperature : (float | int) Numeric value to which you want to heat or cool to.}
+        {--profile : When passed, prints how long each phase of the command took.}
     """
 
+    @profiled
     def handle(self):
         if self.io.output.is_debug():
             log.setLevel(logging.DEBUG)
-        thermostat = NestThermostat(AUTHENTICATOR, config=config)
+        from py_nest_thermostat.nest_api import NestThermostat
+
+        thermostat = NestThermostat(
+            get_authenticator(), config=get_config(), client=get_http_client()
+        )
         thermostat.set_target_temperature(self.argument("temperature"))  # type: ignore
 
 
+class SetTemperaturesCommand(Command):
+    """
+    Sets the target temperature of many devices at once, with concurrent requests.
+
+    temps
+        {targets* : <device>=<temperature> pairs, the device being its name, its id or "all".}
+        {--max-concurrency=5 : Maximum number of concurrent requests to the Nest API.}
+        {--profile : When passed, prints how long each phase of the command took.}
+    """
+
+    @profiled
+    def handle(self):
+        if self.io.output.is_debug():
+            log.setLevel(logging.DEBUG)
+        import asyncio
+
+        from py_nest_thermostat.setpoints import parse_targets, render_setpoint_results
+
+        targets = parse_targets(self.argument("targets"))  # type: ignore
+        results = asyncio.run(self.set_temperatures(targets))
+        render_setpoint_results(results)
+        if not all(result.success for result in results):
+            return 1
+
+    async def set_temperatures(self, targets: list[tuple[str, float]]):
+        from py_nest_thermostat.nest_api import AsyncNestThermostat
+        from py_nest_thermostat.setpoints import set_target_temperatures
+
+        thermostat = AsyncNestThermostat(
+            get_authenticator(),
+            config=get_config(),
+            max_concurrency=int(self.option("max-concurrency")),  # type: ignore
+        )
+        try:
+            return await set_target_temperatures(thermostat, targets)
+        finally:
+            await thermostat.aclose()
+
+
+class CollectCommand(Command):
+    """
+    Continuously collects the thermostat statistics and saves them to the backend database.
+
+    collect
+        {--i|interval=60 : Number of seconds between two polls.}
+        {--adaptive : When passed, polls devices heating toward their target faster and idle ones slower.}
+        {--min-interval=15 : With --adaptive, seconds between polls of a device far below its target.}
+        {--max-interval=300 : With --adaptive, seconds between polls of a device in eco mode, off or unchanged.}
+        {--print : When passed, the stats will also be printed at every poll.}
+        {--all-devices : When passed, collects the stats of every supported device instead of the first one.}
+        {--max-concurrency=5 : Maximum number of concurrent requests to the Nest API when using --all-devices.}
+        {--batch-size=500 : Number of buffered readings that triggers a write to the database.}
+        {--flush-every=300 : Maximum number of seconds a reading stays buffered before being written.}
+        {--no-spool : When passed, readings are buffered in memory instead of the local spool.}
+        {--heartbeat=15 : Minutes after which an unchanged reading is saved anyway. 0 saves every reading.}
+        {--temperature-tolerance=0.1 : Temperature difference under which a reading counts as unchanged.}
+        {--humidity-tolerance=1 : Humidity difference (%) under which a reading counts as unchanged.}
+        {--metrics-address= : When passed, serves Prometheus metrics on this [host]:port, e.g. :9100.}
+        {--all-accounts : When passed, collects every device of every account listed in the config.}
+        {--workers= : Number of worker processes the accounts are spread over, defaults to the CPU count.}
+    """
+
+    def handle(self):
+        if self.io.output.is_debug():
+            log.setLevel(logging.DEBUG)
+        serve_metrics_if_requested(self)
+        if self.option("all-accounts"):
+            return self.collect_all_accounts()
+        from py_nest_thermostat.dedup import ChangeDetector
+
+        interval = float(self.option("interval"))  # type: ignore
+        self.change_detector = ChangeDetector(
+            heartbeat_interval=timedelta(minutes=float(self.option("heartbeat"))),  # type: ignore
+            temperature_tolerance=float(self.option("temperature-tolerance")),  # type: ignore
+            humidity_tolerance=float(self.option("humidity-tolerance")),  # type: ignore
+        )
+        start_background_refresh()
+        try:
+            self.collect(interval)
+        finally:
+            get_authenticator().stop_background_refresh()
+            log.info(
+                f"Saved {self.change_detector.written} readings, "
+                f"suppressed {self.change_detector.suppressed} unchanged ones."
+            )
+
+    def collect_all_accounts(self):
+        import os
+
+        from py_nest_thermostat.sharding import (
+            CollectorSettings,
+            ShardedCollector,
+            authenticate_accounts,
+        )
+
+        config = get_config()
+        if not config.accounts:
+            log.error(
+                "--all-accounts needs the accounts to be listed under `accounts` in the config"
+            )
+            return 1
+        settings = CollectorSettings(
+            interval=float(self.option("interval")),  # type: ignore
+            max_concurrency=int(self.option("max-concurrency")),  # type: ignore
+            batch_size=int(self.option("batch-size")),  # type: ignore
+            flush_every=float(self.option("flush-every")),  # type: ignore
+            use_spool=not self.option("no-spool"),
+            heartbeat=timedelta(minutes=float(self.option("heartbeat"))),  # type: ignore
+            temperature_tolerance=float(self.option("temperature-tolerance")),  # type: ignore
+            humidity_tolerance=float(self.option("humidity-tolerance")),  # type: ignore
+            poll_policy=self.get_poll_policy() if self.option("adaptive") else None,
+        )
+        authenticate_accounts(config, config.accounts)
+        collector = ShardedCollector(
+            config, settings, workers=int(self.option("workers") or os.cpu_count() or 1)
+        )
+        log.info(
+            f"Collecting {len(config.accounts)} accounts with {len(collector.shards)} workers every "
+            f"{settings.interval} seconds. Press Ctrl+C to stop."
+        )
+        try:
+            collector.run()
+        except KeyboardInterrupt:
+            log.info("Stopping collection.")
+
+    def collect(self, interval: float):
+        if self.option("all-devices"):
+            import asyncio
+
+            try:
+                asyncio.run(self.collect_all_devices(interval))
+            except KeyboardInterrupt:
+                log.info("Stopping collection.")
+            return
+        # the thermostat instance, its http client and database engine live for the whole process
+        from py_nest_thermostat.nest_api import NestThermostat
+
+        thermostat = NestThermostat(
+            get_authenticator(), config=get_config(), client=get_http_client()
+        )
+        writer = self.get_writer(thermostat)
+        scheduler = self.get_poll_scheduler()
+        log.info(f"Collecting thermostat stats every {interval} seconds. Press Ctrl+C to stop.")
+        try:
+            while True:
+                poll_started_at = time.monotonic()
+                try:
+                    thermostat.get_device_stats(
+                        no_print=not self.option("print"),
+                        print_controlled_device_name=False,
+                    )
+                    assert thermostat.device_stats, "device_stats cannot be None"
+                    recorded_at = datetime.utcnow()
+                    writer.add(
+                        [
+                            stats.to_device_stats_row(recorded_at)
+                            for stats in self.change_detector.filter(
+                                [thermostat.device_stats], recorded_at
+                            )
+                        ]
+                    )
+                    if scheduler:
+                        scheduler.update([thermostat.device_stats])
+                except Exception as e:
+                    # a failed poll should not bring the collector down, we'll try again next time
+                    log.error(f"Could not collect thermostat stats: {e}")
+                    if scheduler:
+                        scheduler.failed()
+                time.sleep(self.poll_delay(scheduler, interval, poll_started_at))
+        except KeyboardInterrupt:
+            log.info("Stopping collection.")
+        finally:
+            writer.close()
+            thermostat.close()
+
+    def get_poll_policy(self) -> "PollPolicy":
+        from py_nest_thermostat.scheduler import PollPolicy
+
+        return PollPolicy(
+            interval=float(self.option("interval")),  # type: ignore
+            min_interval=float(self.option("min-interval")),  # type: ignore
+            max_interval=float(self.option("max-interval")),  # type: ignore
+        )
+
+    def get_poll_scheduler(self) -> Optional["PollScheduler"]:
+        if not self.option("adaptive"):
+            return None
+        from py_nest_thermostat.scheduler import PollScheduler
+
+        return PollScheduler(self.get_poll_policy(), get_config().http.requests_per_minute)
+
+    @staticmethod
+    def poll_delay(
+        scheduler: Optional["PollScheduler"], interval: float, poll_started_at: float
+    ) -> float:
+        if scheduler:
+            return scheduler.delay()
+        return max(0.0, interval - (time.monotonic() - poll_started_at))
+
+    def get_writer(
+        self, thermostat: "BaseNestThermostat"
+    ) -> Union["BufferedStatsWriter", "StatsSpool"]:
+        return build_stats_writer(
+            thermostat,
+            batch_size=int(self.option("batch-size")),  # type: ignore
+            flush_every=float(self.option("flush-every")),  # type: ignore
+            use_spool=not self.option("no-spool"),
+        )
+
+    async def collect_all_devices(self, interval: float):
+        import asyncio
+
+        from py_nest_thermostat.nest_api import AsyncNestThermostat
+
+        thermostat = AsyncNestThermostat(
+            get_authenticator(),
+            config=get_config(),
+            max_concurrency=int(self.option("max-concurrency")),  # type: ignore
+        )
+        writer = self.get_writer(thermostat)
+        scheduler = self.get_poll_scheduler()
+        log.info(f"Collecting stats of all devices every {interval} seconds. Press Ctrl+C to stop.")
+        try:
+            while True:
+                poll_started_at = time.monotonic()
+                try:
+                    device_stats = await thermostat.get_all_device_stats()
+                    if self.option("print"):
+                        for stats in device_stats:
+                            console.print(f"[bold]{stats.device_name}[/bold]")
+                            thermostat.print_device_stats(stats)
+                    recorded_at = datetime.utcnow()
+                    # the database layer is synchronous so we keep it off the event loop
+                    await asyncio.to_thread(
+                        writer.add,
+                        [
+                            stats.to_device_stats_row(recorded_at)
+                            for stats in self.change_detector.filter(device_stats, recorded_at)
+                        ],
+                    )
+                    if scheduler:
+                        scheduler.update(device_stats)
+                except Exception as e:
+                    log.error(f"Could not collect thermostat stats: {e}")
+                    if scheduler:
+                        scheduler.failed()
+                await asyncio.sleep(self.poll_delay(scheduler, interval, poll_started_at))
+        finally:
+            writer.close()
+            await thermostat.aclose()
+
+
+class WatchCommand(Command):
+    """
+    Shows a live dashboard of every thermostat, redrawn only when the readings change.
+
+    watch
+        {--i|interval=30 : Number of seconds between two polls.}
+        {--max-refresh-rate=4 : Maximum number of screen refreshes per second.}
+    """
+
+    def handle(self):
+        if self.io.output.is_debug():
+            log.setLevel(logging.DEBUG)
+        import asyncio
+
+        start_background_refresh()
+        try:
+            asyncio.run(
+                self.watch(
+                    float(self.option("interval")),  # type: ignore
+                    float(self.option("max-refresh-rate")),  # type: ignore
+                )
+            )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            get_authenticator().stop_background_refresh()
+
+    async def watch(self, interval: float, max_refresh_rate: float):
+        from py_nest_thermostat.nest_api import AsyncNestThermostat
+        from py_nest_thermostat.watch import watch
+
+        # one client and one token shared by every thermostat for the whole session
+        thermostat = AsyncNestThermostat(get_authenticator(), config=get_config())
+        try:
+            await watch(thermostat, interval, max_refresh_rate)
+        finally:
+            await thermostat.aclose()
+
+
+class ListenCommand(Command):
+    """
+    Ingests the trait events published by the Nest API and saves the stats whenever they change.
+
+    listen
+        {source : Where events come from: pubsub:<subscription>, file:<json lines file> or socket:<path or host:port>.}
+        {--print : When passed, the stats will be printed when they change.}
+        {--no-save : When passed, the stats will not be saved to the backend database.}
+        {--metrics-address= : When passed, serves Prometheus metrics on this [host]:port, e.g. :9100.}
+    """
+
+    def handle(self):
+        if self.io.output.is_debug():
+            log.setLevel(logging.DEBUG)
+        serve_metrics_if_requested(self)
+        from py_nest_thermostat.events import event_source_from_uri, ingest_events
+        from py_nest_thermostat.nest_api import NestThermostat
+
+        start_background_refresh()
+        thermostat = NestThermostat(
+            get_authenticator(), config=get_config(), client=get_http_client()
+        )
+        # events only carry what changed, so we start from the full state of every device
+        thermostat.get_devices(print_controlled_device_name=False, refresh=True)
+        assert thermostat.device_list, "device_list cannot be None"
+        writer = None if self.option("no-save") else build_stats_writer(thermostat)
+        event_source = event_source_from_uri(self.argument("source"))  # type: ignore
+        try:
+            for recorded_at, stats in ingest_events(thermostat.device_list, event_source):
+                if self.option("print"):
+                    console.print(f"[bold]{stats.device_name}[/bold] ({recorded_at})")
+                    thermostat.print_device_stats(stats)
+                if writer:
+                    writer.add([stats.to_device_stats_row(recorded_at)])
+        except KeyboardInterrupt:
+            log.info("Stopping event ingestion.")
+        finally:
+            if writer:
+                writer.close()
+            get_authenticator().stop_background_refresh()
+            thermostat.close()
+
+
+class ServeCommand(Command):
+    """
+    Serves the Nest API to local tools through a caching proxy, so that they share one poll and one token.
+
+    serve
+        {address? : host:port or unix socket path to listen on, defaults to 127.0.0.1:8787.}
+        {--ttl=30 : Number of seconds device states are served from the cache.}
+        {--metrics-address= : When passed, serves Prometheus metrics on this [host]:port, e.g. :9100.}
+    """
+
+    def handle(self):
+        if self.io.output.is_debug():
+            log.setLevel(logging.DEBUG)
+        serve_metrics_if_requested(self)
+        from py_nest_thermostat.proxy import DEFAULT_ADDRESS, SdmProxy, build_proxy_server
+
+        address = self.argument("address") or DEFAULT_ADDRESS
+        proxy = SdmProxy(
+            get_authenticator(),
+            get_http_client(),
+            ttl=float(self.option("ttl")),  # type: ignore
+        )
+        server = build_proxy_server(address, proxy, get_config().nest_auth.project_id)
+        get_authenticator().start_background_refresh()
+        log.info(f"Serving the Nest API on {address}. Press Ctrl+C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            log.info("Stopping the proxy.")
+        finally:
+            server.server_close()
+            get_authenticator().stop_background_refresh()
+
+
+class ReportCommand(Command):
+    """
+    Reports per device aggregates of the collected stats, computed by the database.
+
+    report
+        {--b|bucket=day : Size of the time buckets: hour, day, week or month.}
+        {--d|days=7 : Number of past days covered by the report.}
+        {--device= : When passed, only reports on the device with this name.}
+        {--raw : When passed, aggregates the raw readings instead of the hourly and daily rollups.}
+    """
+
+    def handle(self):
+        if self.io.output.is_debug():
+            log.setLevel(logging.DEBUG)
+        from py_nest_thermostat.nest_api import DatabaseFactory
+        from py_nest_thermostat.report import fetch_report, render_report
+
+        bucket = self.option("bucket")
+        database_connector = DatabaseFactory(get_config()).get_connector()
+        database_connector.connect()
+        # reports only read: the schema is neither created nor maintained (retention)
+        database_connector.schema_manager = database_connector.get_schema_manager()
+        report_rows = fetch_report(
+            database_connector,
+            bucket=bucket,  # type: ignore
+            since=datetime.utcnow() - timedelta(days=float(self.option("days"))),  # type: ignore
+            device_name=self.option("device"),  # type: ignore
+            from_raw=self.option("raw"),  # type: ignore
+        )
+        if not report_rows:
+            log.info("No stats were collected over that period.")
+            return
+        render_report(report_rows, bucket=bucket)  # type: ignore
+
+
+class ExportCommand(Command):
+    """
+    Streams the collected stats to a Parquet, Arrow IPC or gzip compressed CSV file.
+
+    export
+        {path : File to write. The format is told by its extension unless --format is passed.}
+        {--f|format= : Format of the file: parquet, arrow or csv.}
+        {--since= : When passed, only exports readings recorded since this ISO 8601 date or time.}
+        {--until= : When passed, only exports readings recorded before this ISO 8601 date or time.}
+        {--device=* : When passed, only exports the readings of the devices with these names.}
+        {--batch-size=10000 : Number of readings fetched and written at a time (one row group each).}
+    """
+
+    def handle(self):
+        if self.io.output.is_debug():
+            log.setLevel(logging.DEBUG)
+        from pathlib import Path
+
+        from py_nest_thermostat.export import export_device_stats
+        from py_nest_thermostat.nest_api import DatabaseFactory
+
+        since, until = (
+            datetime.fromisoformat(self.option(name)) if self.option(name) else None  # type: ignore
+            for name in ("since", "until")
+        )
+        database_connector = DatabaseFactory(get_config()).get_connector()
+        database_connector.connect()
+        path = Path(self.argument("path")).expanduser()  # type: ignore
+        exported = export_device_stats(
+            database_connector,
+            path,
+            export_format=self.option("format"),  # type: ignore
+            since=since,
+            until=until,
+            device_names=self.option("device"),  # type: ignore
+            batch_size=int(self.option("batch-size")),  # type: ignore
+        )
+        log.info(f"Exported {exported} readings to {path}.")
+
+
+class ImportCommand(Command):
+    """
+    Imports historical readings from CSV or JSON lines files (optionally gzip compressed).
+
+    import
+        {paths* : Files to import. CSV files need a header row, with the same columns as `nest export`.}
+        {--batch-size=5000 : Number of rows validated and written at a time.}
+        {--restart : When passed, files are imported from the start instead of their last checkpoint.}
+    """
+
+    def handle(self):
+        if self.io.output.is_debug():
+            log.setLevel(logging.DEBUG)
+        from pathlib import Path
+
+        from py_nest_thermostat.backfill import import_device_stats
+        from py_nest_thermostat.nest_api import DatabaseFactory
+
+        database_connector = DatabaseFactory(get_config()).get_connector()
+        database_connector.connect()
+        database_connector.create_models()
+        for path in self.argument("paths"):  # type: ignore
+            summary = import_device_stats(
+                database_connector,
+                Path(path).expanduser(),
+                batch_size=int(self.option("batch-size")),  # type: ignore
+                restart=self.option("restart"),  # type: ignore
+            )
+            log.info(
+                f"{path}: read {summary.read} rows in {summary.duration.total_seconds():.1f}s "
+                f"(resumed after {summary.resumed_from}), wrote {summary.written}, "
+                f"skipped {summary.invalid} invalid ones."
+            )
+
+
+class MigrateCommand(Command):
+    """
+    Converts the device_stats table created by a previous version to the current schema.
+
+    migrate
+    """
+
+    def handle(self):
+        if self.io.output.is_debug():
+            log.setLevel(logging.DEBUG)
+        from py_nest_thermostat.nest_api import DatabaseFactory
+
+        database_connector = DatabaseFactory(get_config()).get_connector()
+        database_connector.connect()
+        migrated = database_connector.migrate_models()
+        log.info(
+            f"Migrated {migrated} readings. The previous table was kept as device_stats_legacy."
+            if migrated
+            else "The database schema is up to date."
+        )
+
+
 application = Application(name="py-nest-thermostat", version=__version__)
 application.add(ListDevicesCommand())
 application.add(DevicesStatsCommand())
 application.add(SetTemperatureCommand())
+application.add(SetTemperaturesCommand())
+application.add(CollectCommand())
+application.add(ListenCommand())
+application.add(WatchCommand())
+application.add(ServeCommand())
+application.add(ReportCommand())
+application.add(ExportCommand())
+application.add(ImportCommand())
+application.add(MigrateCommand())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from py_nest_thermostat.logger import log
+
+# seconds, from a local cache hit to a slow retried call
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+ROWS_BUCKETS: tuple[float, ...] = (1, 10, 50, 100, 250, 500, 1000, 5000, 10000)
+
+LabelValues = tuple[str, ...]
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(label_names: tuple[str, ...], label_values: LabelValues, **extra: str) -> str:
+    labels = {**dict(zip(label_names, label_values)), **extra}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metric(ABC):
+    """
+    A metric of the Prometheus text format. We only need a handful of them so we don't pull
+    `prometheus_client` in for it.
+    """
+
+    TYPE = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.lock = threading.Lock()
+
+    def label_values(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"{self.name} expects the labels {self.label_names}, got {set(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    @abstractmethod
+    def sample_lines(self) -> Iterator[str]:
+        "Lines of the samples of the metric. Implemented in concrete classes."
+        ...
+
+    def exposition(self) -> str:
+        with self.lock:
+            lines = list(self.sample_lines())
+        return "\n".join(
+            [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}", *lines]
+        )
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        super().__init__(name, documentation, label_names)
+        self.values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def sample_lines(self) -> Iterator[str]:
+        for key, value in self.values.items():
+            yield f"{self.name}_total{format_labels(self.label_names, key)} {format_value(value)}"
+
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        super().__init__(name, documentation, label_names)
+        self.values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def sample_lines(self) -> Iterator[str]:
+        for key, value in self.values.items():
+            yield f"{self.name}{format_labels(self.label_names, key)} {format_value(value)}"
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = (*buckets, math.inf)
+        self.bucket_counts: dict[LabelValues, list[int]] = {}
+        self.sums: dict[LabelValues, float] = {}
+        self.counts: dict[LabelValues, int] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self.label_values(labels)
+        with self.lock:
+            bucket_counts = self.bucket_counts.setdefault(key, [0] * len(self.buckets))
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[index] += 1
+            self.sums[key] = self.sums.get(key, 0.0) + value
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def totals(self) -> dict[LabelValues, tuple[int, float]]:
+        """The number of observations and their sum, per label values."""
+        with self.lock:
+            return {key: (self.counts[key], self.sums[key]) for key in self.counts}
+
+    def sample_lines(self) -> Iterator[str]:
+        for key, bucket_counts in self.bucket_counts.items():
+            for upper_bound, count in zip(self.buckets, bucket_counts):
+                labels = format_labels(self.label_names, key, le=format_value(upper_bound))
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {format_value(self.sums[key])}"
+            yield f"{self.name}_count{labels} {self.counts[key]}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def exposition(self) -> str:
+        return "\n".join(metric.exposition() for metric in self.metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+PHASE_SECONDS: Histogram = registry.register(  # type: ignore
+    Histogram(
+        "nest_phase_duration_seconds",
+        "Time spent in each phase of a command or poll.",
+        label_names=("phase",),
+    )
+)
+API_ERRORS: Counter = registry.register(  # type: ignore
+    Counter(
+        "nest_api_errors",
+        "Failed calls to the Google APIs, retried ones included.",
+        label_names=("host", "status"),
+    )
+)
+TOKEN_REFRESHES: Counter = registry.register(  # type: ignore
+    Counter("nest_token_refreshes", "Access token requests.", label_names=("result",))
+)
+DB_FLUSH_ROWS: Histogram = registry.register(  # type: ignore
+    Histogram("nest_db_flush_rows", "Rows written per database flush.", buckets=ROWS_BUCKETS)
+)
+DB_TRANSACTION_RETRIES: Counter = registry.register(  # type: ignore
+    Counter(
+        "nest_db_transaction_retries",
+        "Database transactions retried after a serialization conflict.",
+    )
+)
+QUEUE_DEPTH: Gauge = registry.register(  # type: ignore
+    Gauge(
+        "nest_queue_depth",
+        "Readings waiting to be written to the database.",
+        label_names=("queue",),
+    )
+)
+READINGS: Counter = registry.register(  # type: ignore
+    Counter(
+        "nest_readings",
+        "Readings that passed the change detection (written) or were dropped as unchanged "
+        "(suppressed).",
+        label_names=("result",),
+    )
+)
+
+ACCOUNT_UP: Gauge = registry.register(  # type: ignore
+    Gauge(
+        "nest_account_up",
+        "Whether the last poll of the account succeeded, reported by the collector workers.",
+        label_names=("account", "worker"),
+    )
+)
+ACCOUNT_LAST_SUCCESS: Gauge = registry.register(  # type: ignore
+    Gauge(
+        "nest_account_last_success_timestamp_seconds",
+        "Unix time of the last successful poll of the account.",
+        label_names=("account",),
+    )
+)
+ACCOUNT_POLL_SECONDS: Gauge = registry.register(  # type: ignore
+    Gauge(
+        "nest_account_poll_duration_seconds",
+        "Duration of the last poll of the account.",
+        label_names=("account",),
+    )
+)
+
+PROXY_REQUESTS: Counter = registry.register(  # type: ignore
+    Counter(
+        "nest_proxy_requests",
+        "Requests served by `nest serve`: from the cache (hit), collapsed into another client's "
+        "upstream request (coalesced), fetched (miss) or forwarded commands.",
+        label_names=("result",),
+    )
+)
+
+
+def time_phase(phase: str):
+    """Times the block into the phase latency histogram, which also feeds `--profile`."""
+    return PHASE_SECONDS.time(phase=phase)
+
+
+def render_profile():
+    """Prints how long every phase took since the process started."""
+    from rich.console import Console
+    from rich.table import Table
+
+    totals = PHASE_SECONDS.totals()
+    overall = sum(phase_sum for _, phase_sum in totals.values()) or 1.0
+    table = Table(title="Time per phase")
+    table.add_column("phase")
+    table.add_column("calls", justify="right")
+    table.add_column("total (ms)", justify="right")
+    table.add_column("share", justify="right")
+    for (phase,), (count, phase_sum) in sorted(
+        totals.items(), key=lambda item: item[1][1], reverse=True
+    ):
+        table.add_row(phase, str(count), f"{phase_sum * 1000:.1f}", f"{phase_sum / overall:.0%}")
+    # phases can nest (e.g. a token refresh within a device listing) so shares are indicative
+    Console(stderr=True).print(table)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug(f"metrics endpoint: {format % args}")
+
+
+def serve_metrics(address: str) -> ThreadingHTTPServer:
+    """Serves the metrics on `host:port` (or `:port`) from a background thread."""
+    host, _, port = address.rpartition(":")
+    server = ThreadingHTTPServer((host or "0.0.0.0", int(port)), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    log.info(f"Serving Prometheus metrics on http://{host or '0.0.0.0'}:{port}/metrics")
+    return server
@@ -1,17 +1,83 @@
 import uuid
 
-from sqlalchemy import Column, DateTime, Float, String
+from sqlalchemy import CHAR, Column, DateTime, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.types import TypeDecorator
 
 from py_nest_thermostat.connectors.base import SQLAlchemyBase
 
+NATIVE_UUID_DIALECTS = ("postgresql", "cockroachdb")
+
+
+class GUID(TypeDecorator):
+    """
+    Native UUID column on Postgres and CockroachDB, 32 hexadecimal characters on the embedded
+    databases. Values are `uuid.UUID`s either way.
+    """
+
+    impl = CHAR(32)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name in NATIVE_UUID_DIALECTS:
+            return dialect.type_descriptor(UUID(as_uuid=True))
+        return dialect.type_descriptor(CHAR(32))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name in NATIVE_UUID_DIALECTS:
+            return value
+        return (value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))).hex
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        return uuid.UUID(value)
+
+
+class DeviceDimension(SQLAlchemyBase):  # type: ignore
+    __tablename__ = "devices"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
 
 class DeviceStats(SQLAlchemyBase):  # type: ignore
     __tablename__ = "device_stats"
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    name = Column(String)
-    recorded_at = Column(DateTime)
+    # recorded_at is part of the primary key so that the table can be partitioned on it
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    recorded_at = Column(DateTime, primary_key=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
     humidity = Column(Float)
     temperature = Column(Float)
     mode = Column(String)
     target_temperature = Column(Float)
+
+    __table_args__ = (
+        Index("ix_device_stats_device_id_recorded_at", "device_id", "recorded_at", unique=True),
+    )
+
+
+class RollupColumns:
+    """Aggregates kept per device and time bucket. Sums and counts so that means can be derived."""
+
+    device_id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    samples = Column(Integer, nullable=False)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    temperature_sum = Column(Float)
+    humidity_min = Column(Float)
+    humidity_max = Column(Float)
+    humidity_sum = Column(Float)
+    target_temperature_sum = Column(Float)
+    # samples during which the thermostat was heating towards a target above the ambient temperature
+    heating_samples = Column(Integer, nullable=False)
+    # samples during which the ambient temperature was above the target temperature
+    above_target_samples = Column(Integer, nullable=False)
+
+
+class DeviceStatsHourly(RollupColumns, SQLAlchemyBase):  # type: ignore
+    __tablename__ = "device_stats_hourly"
+
+
+class DeviceStatsDaily(RollupColumns, SQLAlchemyBase):  # type: ignore
+    __tablename__ = "device_stats_daily"
@@ -1,24 +1,30 @@
+import asyncio
 import json
-import re
 import uuid
 from datetime import datetime
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional, Union
 from collections.abc import Sequence
 
 import httpx
 from pydantic import BaseModel
-from rich.align import Align
-from rich.columns import Columns
 from rich.console import Console
-from rich.panel import Panel
 
 from py_nest_thermostat.auth import Authenticator
 from py_nest_thermostat.config import PyNestConfig
-from py_nest_thermostat.connectors.base import BaseDbConnector
-from py_nest_thermostat.connectors.cockroach_db import cockroach_connector
-from py_nest_thermostat.connectors.postgres import postgres_connector
+from py_nest_thermostat.device_cache import CachedDevice, DeviceCache
 from py_nest_thermostat.logger import log
-from py_nest_thermostat.models import DeviceStats
+from py_nest_thermostat.metrics import time_phase
+from py_nest_thermostat.traits import (
+    NO_ECO_MODE,
+    ThermostatRecord,
+    ThermostatTraits,
+    extract_thermostat_stats,
+)
+from py_nest_thermostat.transport import build_async_client, build_client
+
+if TYPE_CHECKING:
+    # the database layer pulls SQLAlchemy in, so it is only imported when a command needs it
+    from py_nest_thermostat.connectors.base import BaseDbConnector
 
 console = Console()
 
@@ -31,13 +37,22 @@ PURPLE = "#B179CC"
 
 class DatabaseFactory:
     def __init__(self, config: PyNestConfig):
+        self.config = config
         self.db_type = config.database.type
 
-    def get_connector(self) -> BaseDbConnector:
+    def get_connector(self) -> "BaseDbConnector":
         if self.db_type == "postgres":
-            return postgres_connector
+            from py_nest_thermostat.connectors.postgres import PostgresDatabaseConnector
+
+            return PostgresDatabaseConnector(self.config)
         elif self.db_type == "cockroach":
-            return cockroach_connector
+            from py_nest_thermostat.connectors.cockroach_db import CockroachDatabaseConnector
+
+            return CockroachDatabaseConnector(self.config)
+        elif self.db_type == "sqlite":
+            from py_nest_thermostat.connectors.sqlite import SqliteDatabaseConnector
+
+            return SqliteDatabaseConnector(self.config)
         else:
             raise NotImplementedError(f"{self.db_type} is not a supported database type")
 
@@ -47,25 +62,28 @@ class ParentRelation(BaseModel):
     displayName: str
 
 
-# TODO: Is there a way I could do a model also for the thermostat traits?
-# I should but the traits name have dots so we'll have to find a way to set up aliases or something like that.
-# this doc page contains a JSON (https://developers.google.com/nest/device-access/api/thermostat#json)
-# which I could probably make pydantic parse and build a model for.
 class Device(BaseModel):
     name: str
     type: str
     assignee: str
+    # kept as sent by the API: events merge their partial updates into it
     traits: dict[str, Any]
     parentRelations: list[ParentRelation]
 
+    @property
+    def thermostat_traits(self) -> ThermostatTraits:
+        return ThermostatTraits.parse_obj(self.traits)
+
 
 class DeviceList(BaseModel):
     devices: Sequence[Device]
 
 
 class ThermostatStats(BaseModel):
+    device_id: Optional[str] = None
     device_name: str
-    status: str
+    # devices may not report their connectivity, like in `ThermostatRecord`
+    status: Optional[str] = None
     humidity: float
     temperature: float
     temperature_unit: str
@@ -73,62 +91,236 @@ class ThermostatStats(BaseModel):
     target_temperature: str
     eco_mode: str
 
+    def to_device_stats_row(self, recorded_at: datetime) -> dict[str, Any]:
+        """Maps the stats onto a row of the `device_stats` table."""
+        return {
+            "id": uuid.uuid1(),
+            "name": self.device_name,
+            "recorded_at": recorded_at,
+            "humidity": self.humidity,
+            "temperature": self.temperature,
+            "mode": self.mode,
+            "target_temperature": float(self.target_temperature),
+        }
+
 
-class NestThermostat:
+# the validated stats, or the compact ones built by the fast extraction path
+AnyThermostatStats = Union[ThermostatStats, ThermostatRecord]
+
+
+def build_thermostat_stats(device: Device) -> ThermostatStats:
+    traits = device.thermostat_traits
+    return ThermostatStats(
+        device_id=device.name,
+        device_name=device.parentRelations[0].displayName,
+        status=traits.connectivity.status,
+        humidity=round(traits.humidity.ambientHumidityPercent),
+        temperature=round(traits.ambient_temperature, 1),
+        temperature_unit=traits.temperature_unit,
+        mode=traits.thermostat_mode.mode or "NA",
+        target_temperature=round(traits.target_temperature, 1),
+        eco_mode=traits.thermostat_eco.mode or NO_ECO_MODE,
+    )
+
+
+def device_stats_panel_contents(device_stats: AnyThermostatStats) -> dict[str, str]:
+    """The title and the rich markup of every panel showing the stats, in display order."""
+    temp_colour = (
+        TEAL if float(device_stats.temperature) < float(device_stats.target_temperature) else TEAL
+    )
+    target_temp_colour = (
+        RED if float(device_stats.target_temperature) > float(device_stats.temperature) else TEAL
+    )
+    mode_colour = RED if device_stats.mode == "HEAT" else TEAL
+    eco_mode_colour = GREEN if device_stats.eco_mode != "OFF" else YELLOW
+    temp_symbol = "°C" if device_stats.temperature_unit.lower() == "celsius" else "°F"
+    return {
+        "Temperature": (
+            f"[bold][{temp_colour}]{device_stats.temperature}[/{temp_colour}][/bold] {temp_symbol}"
+        ),
+        "Humidity": f"[bold][{TEAL}]{device_stats.humidity}[/{TEAL}][/bold] %",
+        "Mode": f"[bold][{mode_colour}]{device_stats.mode}[/{mode_colour}][/bold]",
+        "Eco Mode": (
+            f"[bold][{eco_mode_colour}]{device_stats.eco_mode}[/{eco_mode_colour}][/bold]"
+        ),
+        "Target Temperature": (
+            f"[bold][{target_temp_colour}]{float(device_stats.target_temperature)}"
+            f"[/{target_temp_colour}][/bold] {temp_symbol}"
+        ),
+    }
+
+
+class BaseNestThermostat:
     # TODO: remove BASE_NEST_API_URL and update downstream query urls
     BASE_NEST_API_URL: str = "https://smartdevicemanagement.googleapis.com/v1/enterprises/"
     SUPPORTED_DEVICE_TYPES: set[str] = {"sdm.devices.types.THERMOSTAT"}
     SDM_API: str = "https://smartdevicemanagement.googleapis.com/v1"
 
-    def __init__(self, authenticator: Authenticator, config: PyNestConfig):
+    def __init__(
+        self,
+        authenticator: Authenticator,
+        config: PyNestConfig,
+        device_cache: Optional[DeviceCache] = None,
+    ):
         self.authenticator = authenticator
         self.config = config
+        self.device_cache = device_cache or DeviceCache()
+        # requests to the local caching proxy of `nest serve` carry no token, the proxy has its own
+        self.needs_token = not config.http.sdm_api_url
+        if config.http.sdm_api_url:
+            self.SDM_API = config.http.sdm_api_url.rstrip("/")
+            self.BASE_NEST_API_URL = f"{self.SDM_API}/enterprises/"
 
         # made available by methods
-        self.device_list: Optional[DeviceList]
-        self.device_type: Optional[str]
-        self.thermostat_id: Optional[str]
-        self.thermostat_display_name: Optional[str]
-
+        self.device_list: Optional[DeviceList] = None
+        self.device_stats: Optional[ThermostatStats] = None
+        self.database_connector: Optional["BaseDbConnector"] = None
+
+        if self.needs_token:
+            self.authenticator.get_token()
+            assert (
+                self.authenticator.access_token_json
+            ), "The access token json was not correctly accessed"
+
+    @property
+    def headers(self) -> dict[str, str]:
+        if not self.needs_token:
+            return {"Content-Type": "application/json"}
+        # makes sure the token gets refreshed when the instance outlives it (e.g. `nest collect`)
         self.authenticator.get_token()
         assert (
             self.authenticator.access_token_json
         ), "The access token json was not correctly accessed"
-        self.headers = {
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.authenticator.access_token_json.access_token}",
         }
 
-    def get_devices(self, print_controlled_device_name: bool = True):
-        device_url = f"{self.BASE_NEST_API_URL}{self.config.nest_auth.project_id}/devices"
+    @property
+    def devices_url(self) -> str:
+        return f"{self.BASE_NEST_API_URL}{self.config.nest_auth.project_id}/devices"
 
-        devices_response = httpx.get(device_url, headers=self.headers)
+    def cache_device_list(self, device_list: DeviceList) -> list[CachedDevice]:
+        cached_devices = [
+            CachedDevice(
+                name=device.name,
+                type=device.type,
+                display_name=device.parentRelations[0].displayName,
+            )
+            for device in device_list.devices
+        ]
+        self.device_cache.set(self.config.nest_auth.project_id, cached_devices)
+        return cached_devices
+
+    def get_database_connector(self) -> "BaseDbConnector":
+        # connect and create the models only once so that repeated saves reuse the same engine
+        if self.database_connector is None:
+            database_connector = DatabaseFactory(self.config).get_connector()
+            with time_phase("db_connect"):
+                database_connector.connect()
+            with time_phase("db_create_models"):
+                database_connector.create_models()
+            self.database_connector = database_connector
+        return self.database_connector
+
+    def save_records_to_db(self, device_stats: Sequence[AnyThermostatStats]):
+        recorded_at = datetime.utcnow()
+        database_connector = self.get_database_connector()
+        log.info(f"Saving thremostat stats to database: {self.config.database.type}.")
+        database_connector.bulk_insert(
+            [stats.to_device_stats_row(recorded_at) for stats in device_stats]
+        )
+
+    def print_device_stats(self, device_stats: Optional[AnyThermostatStats] = None):
+        with time_phase("render"):
+            self.render_device_stats(device_stats or self.device_stats)
+
+    def render_device_stats(self, device_stats: Optional[AnyThermostatStats]):
+        from rich.align import Align
+        from rich.columns import Columns
+        from rich.panel import Panel
+
+        assert device_stats, "device_stats cannot be None"
+        panels = [
+            Panel(Align.center(content), title=f"[{PURPLE}]{title}")
+            for title, content in device_stats_panel_contents(device_stats).items()
+        ]
+        console.print(Columns(panels))
+
+
+class NestThermostat(BaseNestThermostat):
+    def __init__(
+        self,
+        authenticator: Authenticator,
+        config: PyNestConfig,
+        client: Optional[httpx.Client] = None,
+        device_cache: Optional[DeviceCache] = None,
+    ):
+        super().__init__(authenticator, config, device_cache)
+        # a single client keeps the connection to the SDM API alive between calls
+        self.client = client or build_client(config.http)
+
+        # made available by methods
+        self.device_type: Optional[str]
+        self.thermostat_id: Optional[str]
+        self.thermostat_display_name: Optional[str]
 
-        if devices_response.status_code == 200:
-            self.device_list = DeviceList(**devices_response.json())
+    def close(self):
+        self.client.close()
 
-            # TODO: we need to allow users to choose their device as there may be more than one
-            self.device_type = self.device_list.devices[0].type
-            if {self.device_type}.issubset(self.SUPPORTED_DEVICE_TYPES):
-                device_id_match = re.search(r"(?<=\/devices\/).*", self.device_list.devices[0].name)
-                if device_id_match:
-                    self.thermostat_id = device_id_match[0]
-                self.thermostat_display_name = (
-                    self.device_list.devices[0].parentRelations[0].displayName
+    def get_devices(self, print_controlled_device_name: bool = True, refresh: bool = False):
+        """
+        Resolves the thermostat we talk to. The devices metadata comes from the device cache when it
+        is fresh, otherwise all the devices are listed (and cached) which also gives us their traits.
+        """
+        cached_devices = (
+            None if refresh else self.device_cache.get(self.config.nest_auth.project_id)
+        )
+        if cached_devices:
+            log.debug("Using the cached device list")
+            # the traits of a previous listing would be stale by now
+            self.device_list = None
+        else:
+            headers = self.headers
+            with time_phase("list_devices"):
+                devices_response = self.client.get(self.devices_url, headers=headers)
+            if devices_response.status_code != 200:
+                raise httpx.RequestError(
+                    f"Request failed: {devices_response.status_code=}, {devices_response.text=}"
                 )
-                if print_controlled_device_name:
-                    console.print(
-                        f"You're currently controlling the [{YELLOW}]{self.thermostat_display_name}[/{YELLOW}] "
-                        "thermostat."
-                    )
-            else:
-                log.error(
-                    f"Unsupported Device Type: {self.device_type}. Supported types: {self.SUPPORTED_DEVICE_TYPES}"
+            with time_phase("parse"):
+                self.device_list = DeviceList(**devices_response.json())
+            cached_devices = self.cache_device_list(self.device_list)
+
+        # TODO: we need to allow users to choose their device as there may be more than one
+        self.device_type = cached_devices[0].type
+        if {self.device_type}.issubset(self.SUPPORTED_DEVICE_TYPES):
+            self.thermostat_id = cached_devices[0].device_id
+            self.thermostat_display_name = cached_devices[0].display_name
+            if print_controlled_device_name:
+                console.print(
+                    f"You're currently controlling the [{YELLOW}]{self.thermostat_display_name}[/{YELLOW}] "
+                    "thermostat."
                 )
         else:
+            log.error(
+                f"Unsupported Device Type: {self.device_type}. Supported types: {self.SUPPORTED_DEVICE_TYPES}"
+            )
+
+    def get_device(self, device_id: str) -> Device:
+        """Fetches a single device, which is all we need to refresh its traits."""
+        headers = self.headers
+        with time_phase("get_device"):
+            device_response = self.client.get(f"{self.devices_url}/{device_id}", headers=headers)
+        if device_response.status_code == 404:
+            # the device is gone, the cached metadata can't be trusted anymore
+            self.device_cache.invalidate()
+        if device_response.status_code != 200:
             raise httpx.RequestError(
-                f"Request failed: {devices_response.status_code=}, {devices_response.text=}"
+                f"Request failed: {device_response.status_code=}, {device_response.text=}"
             )
+        with time_phase("parse"):
+            return Device(**device_response.json())
 
     def get_device_stats(
         self,
@@ -136,135 +328,30 @@ class NestThermostat:
         save_stats: bool = False,
         print_controlled_device_name: bool = True,
     ):
-        # TODO: think about replacing the key access by gets when there is a chance that the attribute it not present.
         self.get_devices(print_controlled_device_name)
-        assert self.device_list, "device_list cannot be None"
-        self.active_device: Optional[Device] = self.device_list.devices[0]
+        if self.device_list:
+            # the devices were just listed so their traits are fresh
+            self.active_device: Optional[Device] = self.device_list.devices[0]
+        else:
+            assert self.thermostat_id, "thermostat_id cannot be None"
+            self.active_device = self.get_device(self.thermostat_id)
         assert self.active_device, "Could not find any devices"
 
-        # we need to get the unit because it will help us use approproate scale specific keys
-        temperature_unit = self.active_device.traits.get("sdm.devices.traits.Settings", {}).get(
-            "temperatureScale", "no scale retrieved"
-        )
-        temperature_unit = temperature_unit.title()
-        is_in_eco_mode = self.active_device.traits.get("sdm.devices.traits.ThermostatEco", {}).get(
-            "mode", False
-        )
-
-        # perform some eco mode related remappings
-        if is_in_eco_mode == "MANUAL_ECO":
-            target_temperature = self.active_device.traits.get(
-                "sdm.devices.traits.ThermostatEco", {}
-            ).get(f"heat{temperature_unit}", 0)
-        else:
-            target_temperature = self.active_device.traits.get(
-                "sdm.devices.traits.ThermostatTemperatureSetpoint", {}
-            ).get(f"heat{temperature_unit}", 0)
-
-        # build device stats object
-        self.device_stats = ThermostatStats(
-            device_id=self.active_device.name,
-            device_name=self.active_device.parentRelations[0].displayName,
-            status=self.active_device.traits.get("sdm.devices.traits.Connectivity", {}).get(
-                "status"
-            ),
-            humidity=round(
-                float(
-                    self.active_device.traits.get("sdm.devices.traits.Humidity", {}).get(
-                        "ambientHumidityPercent", 0
-                    ),
-                ),
-            ),
-            temperature=round(
-                self.active_device.traits.get("sdm.devices.traits.Temperature", {}).get(
-                    f"ambientTemperature{temperature_unit}", 0
-                ),
-                1,
-            ),
-            temperature_unit=temperature_unit,
-            mode=self.active_device.traits.get("sdm.devices.traits.ThermostatMode", {}).get(
-                "mode", "NA"
-            ),
-            target_temperature=round(target_temperature, 1),
-            eco_mode=self.active_device.traits.get("sdm.devices.traits.ThermostatEco", {}).get(
-                "mode", "no eco mode info found"
-            ),
-        )
+        with time_phase("parse"):
+            self.device_stats = build_thermostat_stats(self.active_device)
         if not no_print:
             self.print_device_stats()
         if save_stats:
             self.save_record_to_db()
 
     def save_record_to_db(self):
-        id = uuid.uuid1()
         if isinstance(self.device_stats, ThermostatStats):
-            device_stats = DeviceStats(
-                id=id,
-                name=self.thermostat_display_name,
-                recorded_at=datetime.utcnow(),
-                humidity=self.device_stats.humidity,
-                temperature=self.device_stats.temperature,
-                mode=self.device_stats.mode,
-                target_temperature=self.device_stats.target_temperature,
-            )
-            database_connector = DatabaseFactory(self.config).get_connector()
-            database_connector.connect()
-            database_connector.create_models()
-            with database_connector.session_manager() as session:  # type: ignore
-                log.info(f"Saving thremostat stats to database: {self.config.database.type}.")
-                session.add(device_stats)
-                session.commit()
+            self.save_records_to_db([self.device_stats])
         else:
             raise AttributeError(
                 "device_stats is None or not a valid object of type ThermostatStats. Skipping database update"
             )
 
-    def print_device_stats(self):
-        temp_colour = (
-            TEAL
-            if float(self.device_stats.temperature) < float(self.device_stats.target_temperature)
-            else TEAL
-        )
-        target_temp_colour = (
-            RED
-            if float(self.device_stats.target_temperature) > float(self.device_stats.temperature)
-            else TEAL
-        )
-        mode_colour = RED if self.device_stats.mode == "HEAT" else TEAL
-        eco_mode_colour = GREEN if self.device_stats.eco_mode != "OFF" else YELLOW
-        temp_symbol = "°C" if self.device_stats.temperature_unit.lower() == "celsius" else "°F"
-        panels = [
-            Panel(
-                Align.center(
-                    f"[bold][{temp_colour}]{self.device_stats.temperature}[/{temp_colour}][/bold] {temp_symbol}"
-                ),
-                title=f"[{PURPLE}]Temperature",
-            ),
-            Panel(
-                Align.center(f"[bold][{TEAL}]{self.device_stats.humidity}[/{TEAL}][/bold] %"),
-                title=f"[{PURPLE}]Humidity",
-            ),
-            Panel(
-                Align.center(
-                    f"[bold][{mode_colour}]{self.device_stats.mode}[/{mode_colour}][/bold]"
-                ),
-                title=f"[{PURPLE}]Mode",
-            ),
-            Panel(
-                Align.center(
-                    f"[bold][{eco_mode_colour}]{self.device_stats.eco_mode}[/{eco_mode_colour}][/bold]"
-                ),
-                title=f"[{PURPLE}]Eco Mode",
-            ),
-            Panel(
-                Align.center(
-                    f"[bold][{target_temp_colour}]{float(self.device_stats.target_temperature)}[/{target_temp_colour}][/bold] {temp_symbol}"  # noqa: E501
-                ),
-                title=f"[{PURPLE}]Target Temperature",
-            ),
-        ]
-        console.print(Columns(panels))
-
     def set_target_temperature(self, temperature: float):
         self.get_devices()
 
@@ -276,18 +363,129 @@ class NestThermostat:
             # TODO/FIXME: would `heatCelsius` field work if the devise is in F?
             "params": {"heatCelsius": temperature},
         }
-        response = httpx.post(
-            command_url,
-            headers=self.headers,
-            data=json.dumps(request_body),  # type: ignore
-        )
+        headers = self.headers
+        with time_phase("set_temperature"):
+            response = self.client.post(
+                command_url,
+                headers=headers,
+                data=json.dumps(request_body),  # type: ignore
+            )
 
         if response.status_code == 200:
             console.print(
                 f"{self.thermostat_display_name} successfully set to [bold][{GREEN}]{temperature}[/{GREEN}][/bold]"
             )
         else:
-            httpx.RequestError(f"Request failed: {response.status_code=}, {response.text=}")
+            raise httpx.RequestError(f"Request failed: {response.status_code=}, {response.text=}")
 
         # display info pannel after success
         self.get_device_stats(no_print=False, print_controlled_device_name=False)
+
+
+class AsyncNestThermostat(BaseNestThermostat):
+    """
+    Asyncio flavour of the thermostat API which deals with every supported device of the DeviceList.
+    """
+
+    def __init__(
+        self,
+        authenticator: Authenticator,
+        config: PyNestConfig,
+        client: Optional[httpx.AsyncClient] = None,
+        max_concurrency: int = 5,
+        device_cache: Optional[DeviceCache] = None,
+    ):
+        super().__init__(authenticator, config, device_cache)
+        self.client = client or build_async_client(config.http)
+        self.max_concurrency = max_concurrency
+        # created lazily so that it binds to the running event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _request(
+        self, method: str, url: str, phase: str, body: Optional[dict[str, Any]] = None
+    ) -> dict[str, Any]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            headers = self.headers
+            with time_phase(phase):
+                response = await self.client.request(method, url, headers=headers, json=body)
+        if response.status_code != 200:
+            raise httpx.RequestError(f"Request failed: {response.status_code=}, {response.text=}")
+        return response.json()
+
+    async def _get(self, url: str, phase: str) -> dict[str, Any]:
+        return await self._request("GET", url, phase)
+
+    def is_supported(self, device: Device) -> bool:
+        if device.type in self.SUPPORTED_DEVICE_TYPES:
+            return True
+        log.debug(f"Skipping unsupported device type: {device.type} ({device.name})")
+        return False
+
+    async def get_devices(self) -> DeviceList:
+        device_list_payload = await self._get(self.devices_url, "list_devices")
+        with time_phase("parse"):
+            self.device_list = DeviceList(**device_list_payload)
+        self.cache_device_list(self.device_list)
+        return self.device_list
+
+    async def get_device(self, device_name: str) -> Device:
+        """Fetches a single device from its full resource name (`enterprises/.../devices/...`)."""
+        device_payload = await self._get(f"{self.SDM_API}/{device_name}", "get_device")
+        with time_phase("parse"):
+            return Device(**device_payload)
+
+    async def get_cached_devices(self) -> list[CachedDevice]:
+        """The devices metadata, from the device cache when it is fresh."""
+        cached_devices = self.device_cache.get(self.config.nest_auth.project_id)
+        if cached_devices:
+            return cached_devices
+        return self.cache_device_list(await self.get_devices())
+
+    async def set_target_temperature(self, device_name: str, temperature: float):
+        """Sends the `SetHeat` command to a device, from its full resource name."""
+        request_body = {
+            "command": "sdm.devices.commands.ThermostatTemperatureSetpoint.SetHeat",
+            # TODO/FIXME: would `heatCelsius` field work if the devise is in F?
+            "params": {"heatCelsius": float(temperature)},
+        }
+        await self._request(
+            "POST", f"{self.SDM_API}/{device_name}:executeCommand", "set_temperature", request_body
+        )
+
+    async def get_all_device_stats(self) -> list[ThermostatRecord]:
+        """
+        Builds stats for every supported device. The devices list payload already carries the traits
+        of every device so a single request is enough, no matter how many thermostats there are.
+        This runs on every poll so the payload is read by the fast extraction path, and only
+        validated when the device cache needs a refresh.
+        """
+        device_list_payload = await self._get(self.devices_url, "list_devices")
+        with time_phase("parse"):
+            device_stats = extract_thermostat_stats(
+                device_list_payload, self.SUPPORTED_DEVICE_TYPES
+            )
+        if self.device_cache.get(self.config.nest_auth.project_id) is None:
+            self.device_list = DeviceList(**device_list_payload)
+            self.cache_device_list(self.device_list)
+        return device_stats
+
+    async def get_device_stats(self, device_names: Sequence[str]) -> list[ThermostatStats]:
+        """
+        Fetches the given devices concurrently (capped by `max_concurrency`) and builds their stats.
+        Useful when only some of the devices need to be refreshed.
+        """
+        devices: list[Union[Device, BaseException]] = await asyncio.gather(
+            *(self.get_device(device_name) for device_name in device_names), return_exceptions=True
+        )
+        device_stats = []
+        for device_name, device in zip(device_names, devices):
+            if isinstance(device, BaseException):
+                log.error(f"Could not fetch device {device_name}: {device}")
+            elif self.is_supported(device):
+                device_stats.append(build_thermostat_stats(device))
+        return device_stats
@@ -0,0 +1,284 @@
+"""
+Local read-through cache of the Smart Device Management API, served by `nest serve`.
+
+The proxy answers on the same paths as the SDM API (`/v1/enterprises/<project>/devices...`) so any
+tool can use it by swapping the base URL, e.g. with `http.sdm_api_url` in `config.yaml`. Reads are
+served from a cache with a freshness TTL, and concurrent reads of a stale entry are collapsed into a
+single upstream request whose response every waiting client gets. Single devices are served from
+the cached device list whenever it is fresh. Commands are forwarded through the proxy's own
+authenticated client and drop the cached state of the project they change.
+"""
+
+import json
+import os
+import re
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional, Union
+
+import httpx
+
+from py_nest_thermostat.auth import Authenticator, AuthRequestError
+from py_nest_thermostat.logger import log
+from py_nest_thermostat.metrics import PROXY_REQUESTS, time_phase
+
+DEFAULT_ADDRESS = "127.0.0.1:8787"
+API_PREFIX = "/v1/"
+DEVICE_PATH = re.compile(r"^/v1/enterprises/(?P<project>[^/]+)/devices/(?P<device>[^/:]+)$")
+# headers of the upstream response passed on to the clients
+FORWARDED_HEADERS = ("Content-Type",)
+
+
+class CachedResponse:
+    def __init__(self, status_code: int, body: bytes, headers: dict[str, str]):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers
+        self.fetched_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class SingleFlightCache:
+    """
+    Successful responses, kept for `ttl` seconds. Callers asking for a key that is being fetched
+    wait for that fetch instead of starting their own.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: dict[str, CachedResponse] = {}
+        self.in_flight: dict[str, "Future[CachedResponse]"] = {}
+
+    def fresh(self, key: str) -> Optional[CachedResponse]:
+        with self.lock:
+            entry = self.entries.get(key)
+        return entry if entry is not None and entry.age < self.ttl else None
+
+    def get(self, key: str, fetch: Callable[[], CachedResponse]) -> tuple[CachedResponse, str]:
+        """The response for `key` and where it came from: `hit`, `coalesced` or `miss`."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.age < self.ttl:
+                return entry, "hit"
+            future = self.in_flight.get(key)
+            is_leader = future is None
+            if future is None:
+                future = self.in_flight[key] = Future()
+        if not is_leader:
+            return future.result(), "coalesced"
+        try:
+            response = fetch()
+        except BaseException as e:
+            with self.lock:
+                self.in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self.lock:
+            # stored and retired at once, so that later callers find either the entry or the fetch
+            if response.status_code == 200:
+                self.entries[key] = response
+            self.in_flight.pop(key, None)
+        future.set_result(response)
+        return response, "miss"
+
+    def invalidate(self, prefix: str):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+
+class SdmProxy:
+    """Forwards requests to the SDM API with a shared client and token, caching the reads."""
+
+    def __init__(
+        self,
+        authenticator: Authenticator,
+        client: httpx.Client,
+        ttl: float = 30.0,
+        upstream_url: str = "https://smartdevicemanagement.googleapis.com",
+    ):
+        self.authenticator = authenticator
+        self.client = client
+        self.cache = SingleFlightCache(ttl)
+        self.upstream_url = upstream_url.rstrip("/")
+        self.upstream_requests = 0
+        self.counter_lock = threading.Lock()
+
+    @property
+    def headers(self) -> dict[str, str]:
+        self.authenticator.get_token()
+        assert (
+            self.authenticator.access_token_json
+        ), "The access token json was not correctly accessed"
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.authenticator.access_token_json.access_token}",
+        }
+
+    def forward(self, method: str, path: str, body: Optional[bytes] = None) -> CachedResponse:
+        with self.counter_lock:
+            self.upstream_requests += 1
+        headers = self.headers
+        with time_phase(f"proxy_{method.lower()}"):
+            response = self.client.request(
+                method, f"{self.upstream_url}{path}", headers=headers, content=body
+            )
+        return CachedResponse(
+            response.status_code,
+            response.content,
+            {
+                name: response.headers[name]
+                for name in FORWARDED_HEADERS
+                if name in response.headers
+            },
+        )
+
+    def device_from_list(self, path: str) -> Optional[CachedResponse]:
+        """The device, taken out of the fresh device list of its project if there is one."""
+        match = DEVICE_PATH.match(path)
+        if match is None:
+            return None
+        device_list = self.cache.fresh(f"/v1/enterprises/{match['project']}/devices")
+        if device_list is None:
+            return None
+        device_name = path.removeprefix(API_PREFIX)
+        for device in device_list.json().get("devices", ()):
+            if device.get("name") == device_name:
+                return CachedResponse(200, json.dumps(device).encode(), device_list.headers)
+        return None
+
+    def get(self, path: str) -> CachedResponse:
+        device = self.device_from_list(path)
+        if device is not None:
+            PROXY_REQUESTS.inc(result="hit")
+            return device
+        response, result = self.cache.get(path, lambda: self.forward("GET", path))
+        PROXY_REQUESTS.inc(result=result)
+        return response
+
+    def post(self, path: str, body: bytes) -> CachedResponse:
+        PROXY_REQUESTS.inc(result="forwarded")
+        response = self.forward("POST", path, body)
+        # the command changed the state of a device, the cached readings of its project are stale
+        project_path = "/".join(path.split("/", 4)[:4]) + "/"
+        self.cache.invalidate(project_path)
+        return response
+
+    def thermostat_stats(self, project_id: str) -> list[dict[str, Any]]:
+        """`ThermostatStats` of every supported device of the project, from the device list."""
+        from py_nest_thermostat.nest_api import (
+            BaseNestThermostat,
+            DeviceList,
+            build_thermostat_stats,
+        )
+
+        device_list = DeviceList(**self.get(f"/v1/enterprises/{project_id}/devices").json())
+        return [
+            build_thermostat_stats(device).dict()
+            for device in device_list.devices
+            if device.type in BaseNestThermostat.SUPPORTED_DEVICE_TYPES
+        ]
+
+    def health(self) -> dict[str, Any]:
+        return {
+            "status": "ok",
+            "ttl": self.cache.ttl,
+            "cached_entries": len(self.cache.entries),
+            "upstream_requests": self.upstream_requests,
+            "token_expires_at": str(self.authenticator.token_expires_at),
+        }
+
+
+class ProxyRequestHandler(BaseHTTPRequestHandler):
+    proxy: SdmProxy
+    project_id: str
+
+    def send_body(self, status_code: int, body: bytes, headers: dict[str, str]):
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, payload: Any, status_code: int = 200):
+        self.send_body(
+            status_code, json.dumps(payload).encode(), {"Content-Type": "application/json"}
+        )
+
+    def send_upstream_error(self, error: Exception):
+        log.error(f"Upstream request failed: {error}")
+        self.send_json({"error": {"code": 502, "message": str(error)}}, status_code=502)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        try:
+            if path == "/health":
+                self.send_json(self.proxy.health())
+            elif path == "/stats":
+                self.send_json(self.proxy.thermostat_stats(self.project_id))
+            elif path.startswith(API_PREFIX):
+                response = self.proxy.get(self.path)
+                self.send_body(response.status_code, response.body, response.headers)
+            else:
+                self.send_error(404)
+        except (httpx.HTTPError, AuthRequestError, ValueError) as e:
+            self.send_upstream_error(e)
+
+    def do_POST(self):
+        if not self.path.startswith(API_PREFIX):
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            response = self.proxy.post(self.path, body)
+        except (httpx.HTTPError, AuthRequestError) as e:
+            self.send_upstream_error(e)
+            return
+        self.send_body(response.status_code, response.body, response.headers)
+
+    def address_string(self) -> str:
+        # clients of a unix socket have no address
+        return self.client_address[0] if self.client_address else "unix socket"
+
+    def log_message(self, format, *args):
+        log.debug(f"proxy: {format % args}")
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    def server_bind(self):
+        # BaseHTTPServer expects a host and port, which unix sockets don't have
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def build_proxy_server(
+    address: str, proxy: SdmProxy, project_id: str
+) -> Union[ThreadingHTTPServer, ThreadingUnixHTTPServer]:
+    """Binds the proxy to a TCP `host:port`, or to a unix socket when the address is a path."""
+    handler = type(
+        "BoundProxyRequestHandler",
+        (ProxyRequestHandler,),
+        {"proxy": proxy, "project_id": project_id},
+    )
+    server: Union[ThreadingHTTPServer, ThreadingUnixHTTPServer]
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
+    else:
+        if os.path.exists(address):
+            os.unlink(address)
+        server = ThreadingUnixHTTPServer(address, handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,335 @@
+"""
+Recording and replay of the HTTP traffic with Google.
+
+With `http.record_dir` set, every request sent by the authenticator and the thermostat API, and the
+raw response it got, is appended to gzip compressed JSON lines segments. Segments are rotated once
+they hold `record_segment_mb` of JSON and only the last `record_max_segments` are kept. Tokens and
+client secrets are redacted before anything is written.
+
+With `http.replay_dir` set, the recorded responses are served instead of calling Google, in the
+order they were recorded for every method and path, and with their recorded latency divided by
+`replay_speed`. `paced` replays the recorded timeline itself, e.g. to push the `/devices` payloads
+of a day through the parsing, change detection and database layers in minutes.
+"""
+
+import asyncio
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+from pydantic import BaseModel
+
+from py_nest_thermostat.config import HttpSettings
+from py_nest_thermostat.logger import log
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+REDACTED = "REDACTED"
+# request parameters and JSON fields holding credentials
+SECRET_FIELDS = {"access_token", "refresh_token", "client_secret", "code"}
+# headers that are secret, or that describe the encoding of a body we store decoded
+DROPPED_HEADERS = {
+    "authorization",
+    "cookie",
+    "set-cookie",
+    "content-encoding",
+    "content-length",
+    "transfer-encoding",
+    "connection",
+}
+# seconds between two flushes of the current segment, so a crash loses at most this much
+FLUSH_INTERVAL = 1.0
+
+
+class Exchange(BaseModel):
+    """A request and the response it got, as recorded."""
+
+    # unix time the request was sent at
+    started_at: float
+    # seconds until the response was received
+    duration: float
+    method: str
+    url: str
+    request_headers: dict[str, str] = {}
+    request_body: str = ""
+    status_code: int
+    response_headers: dict[str, str] = {}
+    response_body: str = ""
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return exchange_key(self.method, self.url)
+
+
+def exchange_key(method: str, url: str) -> tuple[str, str]:
+    # queries are left out: the only ones we send are the redacted credentials of token requests
+    return method.upper(), urlsplit(url).path
+
+
+def redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [
+        (name, REDACTED if name in SECRET_FIELDS else value)
+        for name, value in parse_qsl(parts.query)
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def redact_body(body: bytes) -> str:
+    text = body.decode("utf-8", errors="replace")
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return text
+    if isinstance(payload, dict) and SECRET_FIELDS.intersection(payload):
+        return json.dumps(
+            {key: REDACTED if key in SECRET_FIELDS else value for key, value in payload.items()}
+        )
+    return text
+
+
+def kept_headers(headers: httpx.Headers) -> dict[str, str]:
+    return {name: value for name, value in headers.items() if name.lower() not in DROPPED_HEADERS}
+
+
+def build_exchange(
+    request: httpx.Request, response: httpx.Response, started_at: float, duration: float
+) -> Exchange:
+    try:
+        request_body = redact_body(request.content)
+    except httpx.RequestNotRead:
+        request_body = ""
+    return Exchange(
+        started_at=started_at,
+        duration=duration,
+        method=request.method,
+        url=redact_url(str(request.url)),
+        request_headers=kept_headers(request.headers),
+        request_body=request_body,
+        status_code=response.status_code,
+        response_headers=kept_headers(response.headers),
+        response_body=redact_body(response.content),
+    )
+
+
+class SegmentRecorder:
+    """
+    Appends exchanges to the current segment of `directory`. Every process writes segments of its
+    own, named after the time they were started at so that their names sort chronologically.
+    """
+
+    def __init__(self, directory: Path, max_segment_bytes: int, max_segments: int):
+        self.directory = directory.expanduser()
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        self.file: Optional[IO[str]] = None
+        self.segment_bytes = 0
+        self.flushed_at = 0.0
+
+    def segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+
+    def rotate(self):
+        if self.file is not None:
+            self.file.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = self.segments()
+        # room is made for the segment we are about to start
+        for segment in segments[: max(0, len(segments) - self.max_segments + 1)]:
+            segment.unlink(missing_ok=True)
+        path = Path(
+            self.directory, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}{SEGMENT_SUFFIX}"
+        )
+        log.debug(f"Recording HTTP exchanges to {path}")
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.segment_bytes = 0
+
+    def record(self, exchange: Exchange):
+        line = exchange.json() + "\n"
+        with self.lock:
+            if self.file is None or self.segment_bytes >= self.max_segment_bytes:
+                self.rotate()
+            assert self.file is not None, "rotate always opens a segment"
+            self.file.write(line)
+            self.segment_bytes += len(line)
+            if time.monotonic() - self.flushed_at >= FLUSH_INTERVAL:
+                self.file.flush()
+                self.flushed_at = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+@lru_cache(maxsize=None)
+def get_recorder(directory: Path, max_segment_bytes: int, max_segments: int) -> SegmentRecorder:
+    """The recorder of the process, shared by all its clients."""
+    recorder = SegmentRecorder(directory, max_segment_bytes, max_segments)
+    # closing writes the gzip trailer of the last segment
+    atexit.register(recorder.close)
+    return recorder
+
+
+def recorder_from_settings(settings: HttpSettings) -> SegmentRecorder:
+    assert settings.record_dir, "record_dir cannot be None"
+    return get_recorder(
+        settings.record_dir,
+        int(settings.record_segment_mb * 1024 * 1024),
+        settings.record_max_segments,
+    )
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Records the exchanges of the wrapped (network) transport, retried attempts included."""
+
+    def __init__(self, transport: httpx.BaseTransport, recorder: SegmentRecorder):
+        self.transport = transport
+        self.recorder = recorder
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started_at, started = time.time(), time.monotonic()
+        response = self.transport.handle_request(request)
+        response.read()
+        self.recorder.record(
+            build_exchange(request, response, started_at, time.monotonic() - started)
+        )
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    """Asyncio flavour of `RecordingTransport`."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, recorder: SegmentRecorder):
+        self.transport = transport
+        self.recorder = recorder
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started_at, started = time.time(), time.monotonic()
+        response = await self.transport.handle_async_request(request)
+        await response.aread()
+        self.recorder.record(
+            build_exchange(request, response, started_at, time.monotonic() - started)
+        )
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def iter_exchanges(directory: Path) -> Iterator[Exchange]:
+    """The exchanges of every segment of `directory`, oldest segment first."""
+    for segment in sorted(directory.expanduser().glob(f"*{SEGMENT_SUFFIX}")):
+        with gzip.open(segment, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        yield Exchange(**json.loads(line))
+            except (EOFError, ValueError) as e:
+                # the segment of a process that died is cut short, what was flushed is still good
+                log.warning(f"{segment.name} is truncated, replaying what precedes: {e}")
+
+
+def paced(exchanges: Iterable[Exchange], speed: float = 1.0) -> Iterator[Exchange]:
+    """
+    Yields the exchanges at the pace they were recorded at, `speed` times faster. A speed of 0
+    yields them as fast as they are consumed.
+    """
+    first_started_at: Optional[float] = None
+    replay_started = time.monotonic()
+    for exchange in exchanges:
+        if first_started_at is None:
+            first_started_at = exchange.started_at
+        if speed:
+            due_in = (exchange.started_at - first_started_at) / speed
+            time.sleep(max(0.0, due_in - (time.monotonic() - replay_started)))
+        yield exchange
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Serves recorded responses. Every method and path gets its responses in the order they were
+    recorded in, starting over once they are all used when `loop` is set. Requests that were never
+    recorded get a 404.
+    """
+
+    def __init__(self, exchanges: Iterable[Exchange], speed: float = 1.0, loop: bool = True):
+        self.speed = speed
+        self.loop = loop
+        self.recorded: dict[tuple[str, str], list[Exchange]] = {}
+        for exchange in exchanges:
+            self.recorded.setdefault(exchange.key, []).append(exchange)
+        self.queues = {key: deque(exchanges) for key, exchanges in self.recorded.items()}
+        self.lock = threading.Lock()
+
+    def next_exchange(self, request: httpx.Request) -> Optional[Exchange]:
+        key = exchange_key(request.method, str(request.url))
+        with self.lock:
+            queue = self.queues.get(key)
+            if queue is None:
+                return None
+            if not queue:
+                if not self.loop:
+                    return None
+                queue.extend(self.recorded[key])
+            return queue.popleft()
+
+    def delay(self, exchange: Optional[Exchange]) -> float:
+        return exchange.duration / self.speed if exchange and self.speed else 0.0
+
+    @staticmethod
+    def build_response(request: httpx.Request, exchange: Optional[Exchange]) -> httpx.Response:
+        if exchange is None:
+            log.warning(f"No recorded response for {request.method} {request.url.path}")
+            return httpx.Response(404, json={"error": {"code": 404, "message": "not recorded"}})
+        return httpx.Response(
+            exchange.status_code,
+            headers=exchange.response_headers,
+            content=exchange.response_body.encode("utf-8"),
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        exchange = self.next_exchange(request)
+        time.sleep(self.delay(exchange))
+        return self.build_response(request, exchange)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        exchange = self.next_exchange(request)
+        await asyncio.sleep(self.delay(exchange))
+        return self.build_response(request, exchange)
+
+
+@lru_cache(maxsize=None)
+def get_replay_transport(directory: Path, speed: float) -> ReplayTransport:
+    """
+    The replay of the process, shared by all its clients so that the authenticator and the
+    thermostat API go through the recording together.
+    """
+    transport = ReplayTransport(iter_exchanges(directory), speed=speed)
+    log.info(
+        f"Replaying {sum(map(len, transport.recorded.values()))} recorded exchanges "
+        f"from {directory} at {speed}x"
+    )
+    return transport
+
+
+def replay_transport_from_settings(settings: HttpSettings) -> ReplayTransport:
+    assert settings.replay_dir, "replay_dir cannot be None"
+    return get_replay_transport(settings.replay_dir, settings.replay_speed)
@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Optional
+
+from pydantic import BaseModel
+from rich.console import Console
+
+if TYPE_CHECKING:
+    from py_nest_thermostat.connectors.base import BaseDbConnector
+
+console = Console()
+
+BUCKETS: tuple[str, ...] = ("hour", "day", "week", "month")
+
+# the raw readings, shaped like a rollup of a single reading so that one query serves both
+RAW_READINGS_AS_ROLLUP = (
+    "SELECT device_id, recorded_at AS bucket, 1 AS samples, "
+    "temperature AS temperature_min, temperature AS temperature_max, "
+    "temperature AS temperature_sum, humidity AS humidity_min, humidity AS humidity_max, "
+    "humidity AS humidity_sum, "
+    "CASE WHEN mode IN ('HEAT', 'HEATCOOL') AND target_temperature > temperature "
+    "THEN 1 ELSE 0 END AS heating_samples, "
+    "CASE WHEN temperature > target_temperature THEN 1 ELSE 0 END AS above_target_samples "
+    "FROM device_stats"
+)
+
+
+def bucket_start(moment: datetime, bucket: str) -> datetime:
+    """Start of the bucket holding `moment`, with weeks starting on Monday like the databases'."""
+    start = moment.replace(minute=0, second=0, microsecond=0)
+    if bucket == "hour":
+        return start
+    start = start.replace(hour=0)
+    if bucket == "week":
+        return start - timedelta(days=start.weekday())
+    if bucket == "month":
+        return start.replace(day=1)
+    return start
+
+
+class ReportRow(BaseModel):
+    device_name: str
+    bucket: datetime
+    samples: int
+    temperature_min: Optional[float]
+    temperature_mean: Optional[float]
+    temperature_max: Optional[float]
+    humidity_min: Optional[float]
+    humidity_mean: Optional[float]
+    humidity_max: Optional[float]
+    # share of the readings during which the thermostat was heating
+    heating_duty_cycle: float
+    # share of the readings during which the ambient temperature was above the target
+    time_above_target: float
+
+
+def build_report_query(
+    connector: "BaseDbConnector",
+    bucket: str = "day",
+    since: Optional[datetime] = None,
+    device_name: Optional[str] = None,
+    from_raw: bool = False,
+) -> tuple[str, dict[str, Any]]:
+    """
+    Builds the query aggregating the readings per device and bucket. Hourly buckets are computed
+    from the hourly rollup and the others from the daily one, unless `from_raw` is set.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    if from_raw:
+        source = f"({RAW_READINGS_AS_ROLLUP}) AS readings"
+    elif bucket == "hour":
+        source = "device_stats_hourly AS readings"
+    else:
+        source = "device_stats_daily AS readings"
+    bucket_expression = connector.schema_manager.bucket_expression(bucket, "readings.bucket")
+
+    filters = []
+    parameters: dict[str, Any] = {}
+    if since:
+        # start on a bucket boundary so that the first bucket is complete, whatever the source
+        since = bucket_start(since, bucket)
+        filters.append("readings.bucket >= :since")
+        parameters["since"] = since
+    if device_name:
+        filters.append("devices.name = :device_name")
+        parameters["device_name"] = device_name
+    where_clause = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+    query = (
+        f"SELECT devices.name AS device_name, {bucket_expression} AS bucket, "
+        "sum(readings.samples) AS samples, "
+        "min(readings.temperature_min) AS temperature_min, "
+        "sum(readings.temperature_sum) / sum(readings.samples) AS temperature_mean, "
+        "max(readings.temperature_max) AS temperature_max, "
+        "min(readings.humidity_min) AS humidity_min, "
+        "sum(readings.humidity_sum) / sum(readings.samples) AS humidity_mean, "
+        "max(readings.humidity_max) AS humidity_max, "
+        "sum(readings.heating_samples) * 1.0 / sum(readings.samples) AS heating_duty_cycle, "
+        "sum(readings.above_target_samples) * 1.0 / sum(readings.samples) AS time_above_target "
+        f"FROM {source} JOIN devices ON devices.id = readings.device_id "
+        f"{where_clause} "
+        f"GROUP BY devices.name, {bucket_expression} "
+        f"ORDER BY devices.name, {bucket_expression}"
+    )
+    return query, parameters
+
+
+def fetch_report(
+    connector: "BaseDbConnector",
+    bucket: str = "day",
+    since: Optional[datetime] = None,
+    device_name: Optional[str] = None,
+    from_raw: bool = False,
+) -> list[ReportRow]:
+    """Runs the aggregation in the database, only the aggregated rows are transferred."""
+    from sqlalchemy import DateTime, bindparam, text
+
+    query, parameters = build_report_query(connector, bucket, since, device_name, from_raw)
+    statement = text(query)
+    if "since" in parameters:
+        # typed so that it is bound in the format the database stores timestamps in
+        statement = statement.bindparams(bindparam("since", type_=DateTime()))
+    with connector.engine.connect() as connection:  # type: ignore
+        return [ReportRow(**row) for row in connection.execute(statement, parameters).mappings()]
+
+
+def format_range(minimum: Optional[float], mean: Optional[float], maximum: Optional[float]) -> str:
+    if mean is None:
+        return "-"
+    return f"{minimum:.1f} / [bold]{mean:.1f}[/bold] / {maximum:.1f}"
+
+
+def render_report(report_rows: list[ReportRow], bucket: str = "day"):
+    from rich.table import Table
+
+    from py_nest_thermostat.nest_api import PURPLE, RED, TEAL, YELLOW
+
+    date_format = "%Y-%m-%d %H:00" if bucket == "hour" else "%Y-%m-%d"
+    table = Table(title=f"Thermostat report per {bucket}", header_style=f"bold {PURPLE}")
+    table.add_column("Device")
+    table.add_column(bucket.title())
+    table.add_column("Readings", justify="right")
+    table.add_column("Temperature (min / mean / max)", justify="right", style=TEAL)
+    table.add_column("Humidity % (min / mean / max)", justify="right", style=YELLOW)
+    table.add_column("Heating duty cycle", justify="right", style=RED)
+    table.add_column("Time above target", justify="right")
+    for row in report_rows:
+        table.add_row(
+            row.device_name,
+            row.bucket.strftime(date_format),
+            str(row.samples),
+            format_range(row.temperature_min, row.temperature_mean, row.temperature_max),
+            format_range(row.humidity_min, row.humidity_mean, row.humidity_max),
+            f"{row.heating_duty_cycle:.0%}",
+            f"{row.time_above_target:.0%}",
+        )
+    console.print(table)
@@ -0,0 +1,141 @@
+"""
+Adaptive polling of the thermostats.
+
+Every device gets its own poll interval, derived from its last reading: devices heating toward a
+target they are far from are polled faster, idle ones (in eco mode, off, or not changing) slower.
+A poll happens when the first device is due. The `/devices` call of a poll refreshes every device
+of the account at once, so the request rate is the one of the most active device. The intervals
+are jittered so that devices and accounts drift apart instead of polling in lockstep, and polls
+are spaced so that the collector stays within a share of the API rate limit.
+"""
+
+import random
+import time
+from collections.abc import Sequence
+from typing import Optional
+
+from pydantic import BaseModel
+
+from py_nest_thermostat.logger import log
+from py_nest_thermostat.nest_api import AnyThermostatStats
+from py_nest_thermostat.traits import NO_ECO_MODE
+
+# modes in which the thermostat heats toward `target_temperature`
+HEATING_MODES = {"HEAT", "HEATCOOL"}
+# eco modes that mean eco is off
+ECO_OFF_MODES = {"OFF", NO_ECO_MODE}
+# share of the rate limit the polls may use, the rest is left to commands and retries
+RATE_BUDGET_SHARE = 0.8
+
+
+class PollPolicy(BaseModel):
+    """How the poll interval of a device follows its state, all durations in seconds."""
+
+    # devices that are neither converging toward their target nor idle
+    interval: float = 60.0
+    # devices far below their target, while heating
+    min_interval: float = 15.0
+    # devices in eco mode or off, and the cap of the backoff of unchanged devices
+    max_interval: float = 300.0
+    # degrees between the temperature and the target at which a device is polled at min_interval
+    full_speed_gap: float = 2.0
+    # the interval grows by this factor with every poll that brings nothing new
+    unchanged_backoff: float = 1.5
+    # intervals are spread uniformly by +/- this fraction
+    jitter: float = 0.1
+
+    def interval_for(self, stats: AnyThermostatStats, unchanged_polls: int = 0) -> float:
+        if stats.eco_mode not in ECO_OFF_MODES or stats.mode not in HEATING_MODES:
+            return self.max_interval
+        gap = float(stats.target_temperature) - stats.temperature
+        if gap > 0:
+            # linear from `interval` right at the target to `min_interval` at `full_speed_gap`
+            speed = min(1.0, gap / self.full_speed_gap)
+            return self.interval - speed * (self.interval - self.min_interval)
+        return min(self.max_interval, self.interval * self.unchanged_backoff**unchanged_polls)
+
+
+class DeviceSchedule:
+    def __init__(self, stats: AnyThermostatStats):
+        self.stats = stats
+        self.unchanged_polls = 0
+        self.interval = 0.0
+        self.next_poll_at = 0.0
+
+
+def has_state_changed(previous: AnyThermostatStats, current: AnyThermostatStats) -> bool:
+    return (
+        current.temperature != previous.temperature
+        or current.humidity != previous.humidity
+        or float(current.target_temperature) != float(previous.target_temperature)
+        or current.mode != previous.mode
+        or current.eco_mode != previous.eco_mode
+    )
+
+
+class PollScheduler:
+    """
+    Tracks when every device is next due. `update` is fed the readings of every poll and `delay`
+    tells how long to wait before the next one.
+    """
+
+    def __init__(
+        self,
+        policy: PollPolicy,
+        requests_per_minute: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        self.policy = policy
+        # minimum number of seconds between two polls, from the rate budget
+        self.min_spacing = (
+            60.0 / (requests_per_minute * RATE_BUDGET_SHARE) if requests_per_minute else 0.0
+        )
+        self.random = random.Random(seed)
+        self.devices: dict[str, DeviceSchedule] = {}
+        self.last_poll_at: Optional[float] = None
+
+    def jittered(self, interval: float) -> float:
+        return interval * self.random.uniform(1 - self.policy.jitter, 1 + self.policy.jitter)
+
+    def update(self, device_stats: Sequence[AnyThermostatStats], now: Optional[float] = None):
+        """Reschedules every device that was just read, devices that are gone are forgotten."""
+        now = time.monotonic() if now is None else now
+        self.last_poll_at = now
+        previous_devices, self.devices = self.devices, {}
+        for stats in device_stats:
+            device_key = stats.device_id or stats.device_name
+            schedule = previous_devices.get(device_key)
+            if schedule is None:
+                schedule = DeviceSchedule(stats)
+            elif has_state_changed(schedule.stats, stats):
+                schedule.unchanged_polls = 0
+            else:
+                schedule.unchanged_polls += 1
+            schedule.stats = stats
+            schedule.interval = self.policy.interval_for(stats, schedule.unchanged_polls)
+            schedule.next_poll_at = now + self.jittered(schedule.interval)
+            self.devices[device_key] = schedule
+            log.debug(f"Next poll of {stats.device_name} in {schedule.interval:.0f}s")
+
+    def failed(self, now: Optional[float] = None):
+        """A failed poll is retried after the base interval rather than right away."""
+        now = time.monotonic() if now is None else now
+        self.last_poll_at = now
+        for schedule in self.devices.values():
+            schedule.next_poll_at = max(
+                schedule.next_poll_at, now + self.jittered(self.policy.interval)
+            )
+
+    def next_poll_at(self) -> float:
+        if self.last_poll_at is None:
+            return 0.0
+        if not self.devices:
+            next_poll_at = self.last_poll_at + self.jittered(self.policy.interval)
+        else:
+            next_poll_at = min(schedule.next_poll_at for schedule in self.devices.values())
+        return max(next_poll_at, self.last_poll_at + self.min_spacing)
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """Seconds until the next poll is due."""
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.next_poll_at() - now)
@@ -0,0 +1,210 @@
+"""
+Setpoint changes across many thermostats.
+
+`SetpointCoalescer` debounces the changes made to each device: requests made within `debounce`
+seconds of each other end up in a single `SetHeat` command carrying the last temperature asked
+for. Commands to different devices go out concurrently, capped by the `max_concurrency` of the
+thermostat API and by the rate limiter of its transport.
+"""
+
+import asyncio
+import time
+from collections.abc import Iterable, Sequence
+from typing import TYPE_CHECKING, Optional
+
+from pydantic import BaseModel
+from rich.console import Console
+
+from py_nest_thermostat.logger import log
+
+if TYPE_CHECKING:
+    from py_nest_thermostat.device_cache import CachedDevice
+    from py_nest_thermostat.nest_api import AsyncNestThermostat
+
+console = Console()
+
+ALL_DEVICES = "all"
+
+
+class SetpointResult(BaseModel):
+    device_name: str
+    display_name: str
+    temperature: float
+    # number of requests the command stands for, more than one when changes were coalesced
+    requests: int
+    success: bool
+    error: Optional[str] = None
+    # seconds taken by the command itself, debouncing excluded
+    duration: float
+
+
+class PendingSetpoint:
+    def __init__(self, display_name: str, temperature: float, future: "asyncio.Future"):
+        self.display_name = display_name
+        self.temperature = temperature
+        self.future = future
+        self.requests = 1
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class SetpointCoalescer:
+    """
+    Debounces setpoint changes per device so that rapid successive changes cost a single API call.
+    Every request of a coalesced batch resolves to the result of that call.
+    """
+
+    def __init__(self, thermostat: "AsyncNestThermostat", debounce: float = 1.0):
+        self.thermostat = thermostat
+        self.debounce = debounce
+        self.pending: dict[str, PendingSetpoint] = {}
+        self.in_flight: set[asyncio.Task] = set()
+        # commands to the same device are sent one after the other so the last one always wins
+        self.device_locks: dict[str, asyncio.Lock] = {}
+
+    def request(
+        self, device_name: str, temperature: float, display_name: Optional[str] = None
+    ) -> "asyncio.Future[SetpointResult]":
+        """Schedules a setpoint change, replacing the one still waiting for the same device."""
+        loop = asyncio.get_running_loop()
+        pending = self.pending.get(device_name)
+        if pending is None:
+            pending = PendingSetpoint(
+                display_name or device_name, temperature, loop.create_future()
+            )
+            self.pending[device_name] = pending
+        else:
+            log.debug(
+                f"Coalescing setpoint {pending.temperature} -> {temperature} of {device_name}"
+            )
+            pending.temperature = temperature
+            pending.requests += 1
+            assert pending.timer, "pending setpoints always have a timer"
+            pending.timer.cancel()
+        pending.timer = loop.call_later(self.debounce, self.send, device_name)
+        return pending.future
+
+    async def set(
+        self, device_name: str, temperature: float, display_name: Optional[str] = None
+    ) -> SetpointResult:
+        # shielded: a caller giving up must not cancel the command of the other requests
+        return await asyncio.shield(self.request(device_name, temperature, display_name))
+
+    def send(self, device_name: str):
+        pending = self.pending.pop(device_name, None)
+        if pending is None:
+            return
+        if pending.timer:
+            pending.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self.send_command(device_name, pending))
+        self.in_flight.add(task)
+        task.add_done_callback(self.in_flight.discard)
+
+    async def send_command(self, device_name: str, pending: PendingSetpoint):
+        lock = self.device_locks.setdefault(device_name, asyncio.Lock())
+        async with lock:
+            started_at = time.monotonic()
+            error = None
+            try:
+                await self.thermostat.set_target_temperature(device_name, pending.temperature)
+            except Exception as e:
+                log.error(f"Could not set the temperature of {pending.display_name}: {e}")
+                error = str(e)
+            result = SetpointResult(
+                device_name=device_name,
+                display_name=pending.display_name,
+                temperature=pending.temperature,
+                requests=pending.requests,
+                success=error is None,
+                error=error,
+                duration=time.monotonic() - started_at,
+            )
+        if not pending.future.done():
+            pending.future.set_result(result)
+
+    async def flush(self):
+        """Sends every pending change right away and waits for all the commands to complete."""
+        for device_name in list(self.pending):
+            self.send(device_name)
+        if self.in_flight:
+            await asyncio.wait(set(self.in_flight))
+
+
+def parse_targets(targets: Iterable[str]) -> list[tuple[str, float]]:
+    """
+    Parses `<device>=<temperature>` pairs, where the device is its display name, its id or `all`.
+    A bare temperature applies to every device.
+    """
+    parsed_targets = []
+    for target in targets:
+        device, separator, temperature = target.rpartition("=")
+        try:
+            parsed_targets.append(((device if separator else ALL_DEVICES), float(temperature)))
+        except ValueError:
+            raise ValueError(f"Invalid target {target!r}, expected <device>=<temperature>")
+    return parsed_targets
+
+
+def resolve_targets(
+    targets: Sequence[tuple[str, float]],
+    devices: Sequence["CachedDevice"],
+    supported_device_types: Iterable[str],
+) -> list[tuple["CachedDevice", float]]:
+    """Maps the targets onto the supported devices they name, keeping the order of the targets."""
+    supported_devices = [device for device in devices if device.type in supported_device_types]
+    resolved_targets: list[tuple["CachedDevice", float]] = []
+    for device_key, temperature in targets:
+        if device_key.lower() == ALL_DEVICES:
+            matching_devices = supported_devices
+        else:
+            matching_devices = [
+                device
+                for device in supported_devices
+                if device_key in (device.display_name, device.device_id, device.name)
+            ]
+            if not matching_devices:
+                raise ValueError(f"No supported device is named {device_key!r}")
+        resolved_targets.extend((device, temperature) for device in matching_devices)
+    return resolved_targets
+
+
+async def set_target_temperatures(
+    thermostat: "AsyncNestThermostat",
+    targets: Sequence[tuple[str, float]],
+    debounce: float = 0.0,
+) -> list[SetpointResult]:
+    """
+    Sets the temperature of every targeted device, with one command per device: when a device is
+    targeted more than once, the last temperature wins.
+    """
+    devices = await thermostat.get_cached_devices()
+    coalescer = SetpointCoalescer(thermostat, debounce=debounce)
+    futures = {
+        device.name: coalescer.request(device.name, temperature, device.display_name)
+        for device, temperature in resolve_targets(
+            targets, devices, thermostat.SUPPORTED_DEVICE_TYPES
+        )
+    }
+    await coalescer.flush()
+    return [future.result() for future in futures.values()]
+
+
+def render_setpoint_results(results: Sequence[SetpointResult]):
+    from rich.table import Table
+
+    from py_nest_thermostat.nest_api import GREEN, PURPLE, RED
+
+    table = Table(title=f"[{PURPLE}]Target temperatures")
+    table.add_column("device")
+    table.add_column("target", justify="right")
+    table.add_column("requests", justify="right")
+    table.add_column("result")
+    table.add_column("duration (ms)", justify="right")
+    for result in results:
+        table.add_row(
+            result.display_name,
+            f"{result.temperature:.1f}",
+            str(result.requests),
+            f"[{GREEN}]set[/{GREEN}]" if result.success else f"[{RED}]{result.error}[/{RED}]",
+            f"{result.duration * 1000:.0f}",
+        )
+    console.print(table)
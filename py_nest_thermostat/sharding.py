@@ -0,0 +1,448 @@
+"""
+Collection of many accounts (Device Access projects) sharded across worker processes.
+
+Accounts are spread round-robin over the workers. Every account is polled by its own asyncio task,
+with its own token, HTTP client, rate limiter and device cache, so a slow or failing tenant only
+delays itself. Every worker has its own database connector and writer (or spool), and reports the
+health of its accounts to the parent process after every poll. The parent restarts workers that
+die and turns the health reports into metrics.
+"""
+
+import asyncio
+import multiprocessing
+import queue
+import signal
+import time
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Literal, Optional, Union
+
+from pydantic import BaseModel
+
+from py_nest_thermostat.config import Account, PyNestConfig
+from py_nest_thermostat.logger import log
+from py_nest_thermostat.metrics import (
+    ACCOUNT_LAST_SUCCESS,
+    ACCOUNT_POLL_SECONDS,
+    ACCOUNT_UP,
+    READINGS,
+)
+from py_nest_thermostat.scheduler import PollPolicy, PollScheduler
+
+if TYPE_CHECKING:
+    from multiprocessing.context import SpawnProcess
+    from multiprocessing.synchronize import Event
+
+    from py_nest_thermostat.connectors.base import BaseDbConnector
+    from py_nest_thermostat.connectors.spool import StatsSpool
+    from py_nest_thermostat.connectors.writer import BufferedStatsWriter
+
+# workers start from a fresh interpreter, forking a process that holds threads and pools is unsafe
+START_METHOD: Literal["spawn"] = "spawn"
+# seconds between two checks of the workers by the parent
+SUPERVISION_INTERVAL = 1.0
+# an account that has not reported for this many intervals is considered down
+STALE_AFTER_INTERVALS = 3
+# seconds before restarting a dead worker, doubled with every death in a row, e.g. while the
+# database is down, and reset once a worker stayed up for the maximum
+MIN_RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 300.0
+
+
+class CollectorSettings(BaseModel):
+    """The options of `nest collect`, handed over to the workers."""
+
+    interval: float = 60.0
+    max_concurrency: int = 5
+    batch_size: int = 500
+    flush_every: float = 300.0
+    use_spool: bool = True
+    heartbeat: timedelta = timedelta(minutes=15)
+    temperature_tolerance: float = 0.1
+    humidity_tolerance: float = 1.0
+    # polls adapt to the state of the devices when set, see `py_nest_thermostat.scheduler`
+    poll_policy: Optional[PollPolicy] = None
+
+
+class AccountHealth(BaseModel):
+    """Outcome of the last poll of an account, sent by the workers after every poll."""
+
+    account: str
+    worker: int
+    pid: int
+    polled_at: datetime
+    ok: bool
+    devices: int = 0
+    # readings that passed the change detection and were handed to the writer
+    readings: int = 0
+    # readings dropped by the change detection as unchanged
+    suppressed: int = 0
+    poll_seconds: float = 0.0
+    consecutive_failures: int = 0
+    error: Optional[str] = None
+
+
+def shard_accounts(accounts: Sequence[Account], workers: int) -> list[list[Account]]:
+    """Spreads the accounts round-robin over at most `workers` shards, none of them empty."""
+    workers = max(1, min(workers, len(accounts)))
+    return [list(accounts[worker::workers]) for worker in range(workers)]
+
+
+def authenticate_accounts(config: PyNestConfig, accounts: Sequence[Account]):
+    """
+    Makes sure every account holds a token before the workers start: the first authentication of
+    an account needs the terminal, which the workers don't have.
+    """
+    from py_nest_thermostat.auth import Authenticator
+
+    if config.http.sdm_api_url:
+        # requests go through the proxy of `nest serve`, which holds the token
+        return
+    for account in accounts:
+        log.info(f"Checking the token of account {account.name}")
+        Authenticator(config.for_account(account), token_file=account.token_file).get_token()
+
+
+class AccountCollector:
+    """Polls the devices of a single account and hands the changed readings to the writer."""
+
+    def __init__(
+        self,
+        account: Account,
+        config: PyNestConfig,
+        settings: CollectorSettings,
+        worker: int,
+        writer: Union["BufferedStatsWriter", "StatsSpool"],
+        health_queue: "multiprocessing.Queue[AccountHealth]",
+    ):
+        from py_nest_thermostat.auth import Authenticator
+        from py_nest_thermostat.dedup import ChangeDetector
+        from py_nest_thermostat.device_cache import DeviceCache
+        from py_nest_thermostat.nest_api import AsyncNestThermostat
+
+        self.account = account
+        self.settings = settings
+        self.worker = worker
+        self.writer = writer
+        self.health_queue = health_queue
+        account_config = config.for_account(account)
+        self.authenticator = Authenticator(account_config, token_file=account.token_file)
+        self.thermostat = AsyncNestThermostat(
+            self.authenticator,
+            config=account_config,
+            max_concurrency=settings.max_concurrency,
+            device_cache=DeviceCache(account.device_cache_file),
+        )
+        if self.thermostat.needs_token:
+            # refreshed in a thread of its own, a slow OAuth endpoint would otherwise block the
+            # event loop and with it every account of the worker
+            self.authenticator.start_background_refresh()
+        self.change_detector = ChangeDetector(
+            heartbeat_interval=settings.heartbeat,
+            temperature_tolerance=settings.temperature_tolerance,
+            humidity_tolerance=settings.humidity_tolerance,
+        )
+        self.consecutive_failures = 0
+        self.scheduler: Optional[PollScheduler] = None
+        if settings.poll_policy:
+            # every account has a rate limit of its own, and a random generator of its own so that
+            # the jitter spreads the accounts apart
+            self.scheduler = PollScheduler(settings.poll_policy, config.http.requests_per_minute)
+
+    def to_rows(self, device_stats: list[Any], recorded_at: datetime) -> list[dict[str, Any]]:
+        rows = []
+        for stats in self.change_detector.filter(device_stats, recorded_at):
+            row = stats.to_device_stats_row(recorded_at)
+            # display names are only unique within an account, e.g. every tenant has a "Hallway"
+            row["name"] = f"{self.account.name}/{row['name']}"
+            rows.append(row)
+        return rows
+
+    async def poll(self) -> AccountHealth:
+        started_at = time.monotonic()
+        health = AccountHealth(
+            account=self.account.name,
+            worker=self.worker,
+            pid=multiprocessing.current_process().pid,
+            polled_at=datetime.utcnow(),
+            ok=False,
+        )
+        suppressed_before = self.change_detector.suppressed
+        try:
+            # a poll that outlives the interval is given up, the next one starts on time
+            device_stats = await asyncio.wait_for(
+                self.thermostat.get_all_device_stats(), timeout=self.settings.interval
+            )
+            rows = self.to_rows(device_stats, datetime.utcnow())
+            # the database layer is synchronous so we keep it off the event loop
+            await asyncio.to_thread(self.writer.add, rows)
+        except Exception as e:
+            self.consecutive_failures += 1
+            log.error(f"Could not collect the stats of account {self.account.name}: {e!r}")
+            health.error = repr(e)
+            if self.scheduler:
+                self.scheduler.failed()
+        else:
+            if self.scheduler:
+                self.scheduler.update(device_stats)
+            self.consecutive_failures = 0
+            health.ok = True
+            health.devices = len(device_stats)
+            health.readings = len(rows)
+            health.suppressed = self.change_detector.suppressed - suppressed_before
+        health.consecutive_failures = self.consecutive_failures
+        health.poll_seconds = time.monotonic() - started_at
+        return health
+
+    async def run(self, stopping: asyncio.Event, start_delay: float = 0.0):
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=start_delay)
+            return
+        except asyncio.TimeoutError:
+            pass
+        while not stopping.is_set():
+            poll_started_at = time.monotonic()
+            self.health_queue.put(await self.poll())
+            if self.scheduler:
+                delay = self.scheduler.delay()
+            else:
+                delay = max(0.0, self.settings.interval - (time.monotonic() - poll_started_at))
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def aclose(self):
+        self.authenticator.stop_background_refresh()
+        await self.thermostat.aclose()
+        self.authenticator.client.close()
+
+
+def build_worker_writer(
+    config: PyNestConfig, settings: CollectorSettings, worker: int
+) -> Union["BufferedStatsWriter", "StatsSpool"]:
+    """The writer shared by the accounts of a worker, with a spool file of its own."""
+    from py_nest_thermostat.connectors.spool import StatsSpool
+    from py_nest_thermostat.connectors.writer import BufferedStatsWriter
+    from py_nest_thermostat.nest_api import DatabaseFactory
+
+    connectors: list["BaseDbConnector"] = []
+
+    def get_connector() -> "BaseDbConnector":
+        if not connectors:
+            connector = DatabaseFactory(config).get_connector()
+            connector.connect()
+            connector.create_models()
+            connectors.append(connector)
+        return connectors[0]
+
+    if not settings.use_spool:
+        return BufferedStatsWriter(
+            get_connector(),
+            max_batch_size=settings.batch_size,
+            max_batch_age=settings.flush_every,
+        )
+    spool = StatsSpool(
+        get_connector,
+        path=StatsSpool.SPOOL_FILENAME.with_name(f"spool-worker-{worker}.sqlite3"),
+        batch_size=settings.batch_size,
+        drain_interval=settings.flush_every,
+    )
+    spool.start()
+    return spool
+
+
+async def collect_shard(
+    worker: int,
+    config: PyNestConfig,
+    accounts: Sequence[Account],
+    settings: CollectorSettings,
+    health_queue: "multiprocessing.Queue[AccountHealth]",
+    stop: "Event",
+):
+    writer = build_worker_writer(config, settings, worker)
+    stopping = asyncio.Event()
+    collectors = []
+    try:
+        for account in accounts:
+            try:
+                collectors.append(
+                    AccountCollector(account, config, settings, worker, writer, health_queue)
+                )
+            except Exception as e:
+                # e.g. an account whose token can't be refreshed, the others are still collected
+                log.error(f"Could not start collecting account {account.name}: {e!r}")
+                health_queue.put(
+                    AccountHealth(
+                        account=account.name,
+                        worker=worker,
+                        pid=multiprocessing.current_process().pid,
+                        polled_at=datetime.utcnow(),
+                        ok=False,
+                        consecutive_failures=1,
+                        error=repr(e),
+                    )
+                )
+        # starts are staggered over the interval so the accounts don't all poll at the same time
+        tasks = [
+            asyncio.create_task(
+                collector.run(stopping, start_delay=settings.interval * index / len(collectors))
+            )
+            for index, collector in enumerate(collectors)
+        ]
+        while not stop.is_set():
+            await asyncio.sleep(SUPERVISION_INTERVAL)
+        stopping.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        for collector in collectors:
+            await collector.aclose()
+        await asyncio.to_thread(writer.close)
+
+
+def run_worker(
+    worker: int,
+    config: PyNestConfig,
+    accounts: Sequence[Account],
+    settings: CollectorSettings,
+    health_queue: "multiprocessing.Queue[AccountHealth]",
+    stop: "Event",
+):
+    # Ctrl+C reaches the whole process group, the parent decides when the workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    log.info(f"Worker {worker} collecting {', '.join(account.name for account in accounts)}")
+    asyncio.run(collect_shard(worker, config, accounts, settings, health_queue, stop))
+
+
+class ShardedCollector:
+    """Starts one worker process per shard of accounts, supervises them and collects their health."""
+
+    def __init__(self, config: PyNestConfig, settings: CollectorSettings, workers: int):
+        self.config = config
+        self.settings = settings
+        self.shards = shard_accounts(config.accounts, workers)
+        self.context = multiprocessing.get_context(START_METHOD)
+        self.health_queue: "multiprocessing.Queue[AccountHealth]" = self.context.Queue()
+        self.stop = self.context.Event()
+        self.processes: dict[int, "SpawnProcess"] = {}
+        self.started_at: dict[int, float] = {}
+        self.deaths_in_a_row: dict[int, int] = {}
+        self.restart_at: dict[int, float] = {}
+        self.health: dict[str, AccountHealth] = {}
+        self.restarts = 0
+
+    def start_worker(self, worker: int):
+        process = self.context.Process(
+            target=run_worker,
+            args=(
+                worker,
+                self.config,
+                self.shards[worker],
+                self.settings,
+                self.health_queue,
+                self.stop,
+            ),
+            name=f"nest-collector-{worker}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[worker] = process
+        self.started_at[worker] = time.monotonic()
+        self.restart_at.pop(worker, None)
+
+    def record_health(self, health: AccountHealth):
+        self.health[health.account] = health
+        ACCOUNT_UP.set(float(health.ok), account=health.account, worker=str(health.worker))
+        ACCOUNT_POLL_SECONDS.set(health.poll_seconds, account=health.account)
+        if health.ok:
+            # the workers count their readings in registries of their own, which nobody serves
+            READINGS.inc(health.readings, result="written")
+            READINGS.inc(health.suppressed, result="suppressed")
+            ACCOUNT_LAST_SUCCESS.set(
+                (health.polled_at - datetime(1970, 1, 1)).total_seconds(), account=health.account
+            )
+        elif health.consecutive_failures in (1, 10, 100):
+            log.warning(
+                f"Account {health.account} failed {health.consecutive_failures} polls in a row"
+            )
+
+    def drain_health_queue(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                health = self.health_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return
+            self.record_health(health)
+
+    def restart_dead_workers(self):
+        now = time.monotonic()
+        for worker, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            if worker not in self.restart_at:
+                if now - self.started_at[worker] >= MAX_RESTART_DELAY:
+                    self.deaths_in_a_row[worker] = 0
+                deaths = self.deaths_in_a_row[worker] = self.deaths_in_a_row.get(worker, 0) + 1
+                delay = min(MAX_RESTART_DELAY, MIN_RESTART_DELAY * 2 ** (deaths - 1))
+                self.restart_at[worker] = now + delay
+                log.error(
+                    f"Worker {worker} (pid {process.pid}) exited with {process.exitcode}, "
+                    f"restarting in {delay:.0f}s"
+                )
+            if now >= self.restart_at[worker]:
+                self.restarts += 1
+                self.start_worker(worker)
+
+    def stale_accounts(self) -> list[str]:
+        # adaptive polls of idle devices are up to `max_interval` apart
+        interval = max(
+            self.settings.interval,
+            self.settings.poll_policy.max_interval if self.settings.poll_policy else 0.0,
+        )
+        stale_before = datetime.utcnow() - timedelta(seconds=interval * STALE_AFTER_INTERVALS)
+        return [
+            account
+            for account, health in self.health.items()
+            if health.ok and health.polled_at < stale_before
+        ]
+
+    def log_summary(self):
+        healthy = sum(health.ok for health in self.health.values())
+        readings = sum(health.readings for health in self.health.values())
+        suppressed = sum(health.suppressed for health in self.health.values())
+        log.info(
+            f"{healthy}/{len(self.config.accounts)} accounts healthy across {len(self.shards)} "
+            f"workers, {readings} readings written and {suppressed} unchanged ones suppressed in "
+            f"the last polls, {self.restarts} worker restarts."
+        )
+        for account in self.stale_accounts():
+            log.warning(f"Account {account} has not reported for {STALE_AFTER_INTERVALS} intervals")
+            health = self.health[account]
+            ACCOUNT_UP.set(0.0, account=account, worker=str(health.worker))
+
+    def run(self, duration: Optional[float] = None):
+        """Collects until interrupted, or for `duration` seconds."""
+        for worker in range(len(self.shards)):
+            self.start_worker(worker)
+        started_at = last_summary_at = time.monotonic()
+        try:
+            while duration is None or time.monotonic() - started_at < duration:
+                self.drain_health_queue(SUPERVISION_INTERVAL)
+                self.restart_dead_workers()
+                if time.monotonic() - last_summary_at >= self.settings.interval:
+                    self.log_summary()
+                    last_summary_at = time.monotonic()
+        finally:
+            self.shutdown()
+
+    def shutdown(self, timeout: float = 30.0):
+        self.stop.set()
+        deadline = time.monotonic() + timeout
+        for process in self.processes.values():
+            # the workers flush their writers on their way out
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                log.warning(f"Worker {process.name} did not stop in time, terminating it")
+                process.terminate()
+        self.drain_health_queue(0.0)
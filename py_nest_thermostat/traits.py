@@ -0,0 +1,210 @@
+"""
+Models of the thermostat traits (https://developers.google.com/nest/device-access/api/thermostat).
+
+`ThermostatTraits` is the validated model, its fields are aliased to the dotted trait names. The
+collector does not need validation on every poll though, so `extract_thermostat_stats` walks a
+`/devices` payload directly into compact `ThermostatRecord`s.
+"""
+
+import uuid
+from collections.abc import Collection, Iterable
+from datetime import datetime
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field
+
+SETTINGS = "sdm.devices.traits.Settings"
+CONNECTIVITY = "sdm.devices.traits.Connectivity"
+HUMIDITY = "sdm.devices.traits.Humidity"
+TEMPERATURE = "sdm.devices.traits.Temperature"
+THERMOSTAT_MODE = "sdm.devices.traits.ThermostatMode"
+THERMOSTAT_ECO = "sdm.devices.traits.ThermostatEco"
+THERMOSTAT_HVAC = "sdm.devices.traits.ThermostatHvac"
+TEMPERATURE_SETPOINT = "sdm.devices.traits.ThermostatTemperatureSetpoint"
+
+NO_SCALE = "no scale retrieved"
+NO_ECO_MODE = "no eco mode info found"
+
+
+class Trait(BaseModel):
+    class Config:
+        allow_population_by_field_name = True
+        # traits we don't model (and fields Google adds later) must not break parsing
+        extra = "ignore"
+
+
+class SettingsTrait(Trait):
+    temperatureScale: str = NO_SCALE
+
+
+class ConnectivityTrait(Trait):
+    status: Optional[str] = None
+
+
+class HumidityTrait(Trait):
+    ambientHumidityPercent: float = 0
+
+
+class TemperatureTrait(Trait):
+    ambientTemperatureCelsius: Optional[float] = None
+    ambientTemperatureFahrenheit: Optional[float] = None
+
+
+class ThermostatModeTrait(Trait):
+    mode: Optional[str] = None
+    availableModes: list[str] = []
+
+
+class ThermostatEcoTrait(Trait):
+    mode: Optional[str] = None
+    availableModes: list[str] = []
+    heatCelsius: Optional[float] = None
+    heatFahrenheit: Optional[float] = None
+    coolCelsius: Optional[float] = None
+
+
+class ThermostatHvacTrait(Trait):
+    status: Optional[str] = None
+
+
+class TemperatureSetpointTrait(Trait):
+    heatCelsius: Optional[float] = None
+    heatFahrenheit: Optional[float] = None
+    coolCelsius: Optional[float] = None
+
+
+class ThermostatTraits(Trait):
+    settings: SettingsTrait = Field(SettingsTrait(), alias=SETTINGS)
+    connectivity: ConnectivityTrait = Field(ConnectivityTrait(), alias=CONNECTIVITY)
+    humidity: HumidityTrait = Field(HumidityTrait(), alias=HUMIDITY)
+    temperature: TemperatureTrait = Field(TemperatureTrait(), alias=TEMPERATURE)
+    thermostat_mode: ThermostatModeTrait = Field(ThermostatModeTrait(), alias=THERMOSTAT_MODE)
+    thermostat_eco: ThermostatEcoTrait = Field(ThermostatEcoTrait(), alias=THERMOSTAT_ECO)
+    thermostat_hvac: ThermostatHvacTrait = Field(ThermostatHvacTrait(), alias=THERMOSTAT_HVAC)
+    temperature_setpoint: TemperatureSetpointTrait = Field(
+        TemperatureSetpointTrait(), alias=TEMPERATURE_SETPOINT
+    )
+
+    @property
+    def temperature_unit(self) -> str:
+        """`Celsius` or `Fahrenheit`, the suffix of the unit specific fields."""
+        return self.settings.temperatureScale.title()
+
+    @property
+    def is_in_manual_eco(self) -> bool:
+        return self.thermostat_eco.mode == "MANUAL_ECO"
+
+    @property
+    def ambient_temperature(self) -> float:
+        return getattr(self.temperature, f"ambientTemperature{self.temperature_unit}", None) or 0
+
+    @property
+    def target_temperature(self) -> float:
+        # in eco mode the thermostat heats to the eco setpoint, not to the regular one
+        setpoint = self.thermostat_eco if self.is_in_manual_eco else self.temperature_setpoint
+        return getattr(setpoint, f"heat{self.temperature_unit}", None) or 0
+
+
+class ThermostatRecord:
+    """
+    Compact, non validated, equivalent of `ThermostatStats` built by the fast extraction path.
+    `target_temperature` is kept as a float.
+    """
+
+    __slots__ = (
+        "device_id",
+        "device_name",
+        "status",
+        "humidity",
+        "temperature",
+        "temperature_unit",
+        "mode",
+        "target_temperature",
+        "eco_mode",
+    )
+
+    def __init__(
+        self,
+        device_id: Optional[str],
+        device_name: str,
+        status: Optional[str],
+        humidity: float,
+        temperature: float,
+        temperature_unit: str,
+        mode: str,
+        target_temperature: float,
+        eco_mode: str,
+    ):
+        self.device_id = device_id
+        self.device_name = device_name
+        self.status = status
+        self.humidity = humidity
+        self.temperature = temperature
+        self.temperature_unit = temperature_unit
+        self.mode = mode
+        self.target_temperature = target_temperature
+        self.eco_mode = eco_mode
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"ThermostatRecord({fields})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ThermostatRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def to_device_stats_row(self, recorded_at: datetime) -> dict[str, Any]:
+        """Maps the stats onto a row of the `device_stats` table."""
+        return {
+            "id": uuid.uuid1(),
+            "name": self.device_name,
+            "recorded_at": recorded_at,
+            "humidity": self.humidity,
+            "temperature": self.temperature,
+            "mode": self.mode,
+            "target_temperature": self.target_temperature,
+        }
+
+
+EMPTY: dict[str, Any] = {}
+# unit -> key, so that we don't build the keys with f-strings for every device
+AMBIENT_TEMPERATURE_KEYS = {
+    "Celsius": "ambientTemperatureCelsius",
+    "Fahrenheit": "ambientTemperatureFahrenheit",
+}
+HEAT_SETPOINT_KEYS = {"Celsius": "heatCelsius", "Fahrenheit": "heatFahrenheit"}
+
+
+def extract_thermostat_record(device: dict[str, Any]) -> ThermostatRecord:
+    """Same result as `build_thermostat_stats`, read straight from a device of the payload."""
+    traits = device.get("traits", EMPTY)
+    temperature_unit = traits.get(SETTINGS, EMPTY).get("temperatureScale", NO_SCALE).title()
+    eco = traits.get(THERMOSTAT_ECO, EMPTY)
+    eco_mode = eco.get("mode", False)
+    setpoint = eco if eco_mode == "MANUAL_ECO" else traits.get(TEMPERATURE_SETPOINT, EMPTY)
+    heat_setpoint_key = HEAT_SETPOINT_KEYS.get(temperature_unit)
+    ambient_temperature_key = AMBIENT_TEMPERATURE_KEYS.get(temperature_unit)
+    return ThermostatRecord(
+        device_id=device["name"],
+        device_name=device["parentRelations"][0]["displayName"],
+        status=traits.get(CONNECTIVITY, EMPTY).get("status"),
+        humidity=round(float(traits.get(HUMIDITY, EMPTY).get("ambientHumidityPercent", 0))),
+        temperature=round(traits.get(TEMPERATURE, EMPTY).get(ambient_temperature_key, 0), 1),
+        temperature_unit=temperature_unit,
+        mode=traits.get(THERMOSTAT_MODE, EMPTY).get("mode", "NA"),
+        target_temperature=round(float(setpoint.get(heat_setpoint_key, 0)), 1),
+        eco_mode=eco_mode or NO_ECO_MODE,
+    )
+
+
+def extract_thermostat_stats(
+    device_list_payload: dict[str, Any], supported_device_types: Collection[str]
+) -> list[ThermostatRecord]:
+    """Builds the records of every supported device of a `/devices` payload, skipping validation."""
+    devices: Iterable[dict[str, Any]] = device_list_payload.get("devices", ())
+    return [
+        extract_thermostat_record(device)
+        for device in devices
+        if device.get("type") in supported_device_types
+    ]
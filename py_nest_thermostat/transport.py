@@ -0,0 +1,226 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+from py_nest_thermostat.config import HttpSettings
+from py_nest_thermostat.logger import log
+from py_nest_thermostat.metrics import API_ERRORS
+
+RETRYABLE_STATUS_CODES: set[int] = {429, 500, 502, 503, 504}
+# only the Smart Device Management API is subject to the project quota, not the OAuth endpoint
+RATE_LIMITED_HOSTS: set[str] = {"smartdevicemanagement.googleapis.com"}
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `reserve` takes a token and says how long to wait before using it."""
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second
+            )
+            self.updated_at = now
+            # tokens can go negative, which queues callers one after the other
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate_per_second
+
+
+def rate_limiter_from_settings(settings: HttpSettings) -> TokenBucket:
+    return TokenBucket(settings.requests_per_minute / 60, settings.burst)
+
+
+def retry_delay(settings: HttpSettings, attempt: int, response: Optional[httpx.Response]) -> float:
+    """Exponential backoff with full jitter, unless the server tells us how long to wait."""
+    if response is not None and "Retry-After" in response.headers:
+        retry_after = response.headers["Retry-After"]
+        try:
+            return min(settings.max_backoff, float(retry_after))
+        except ValueError:
+            try:
+                return min(
+                    settings.max_backoff,
+                    max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()),
+                )
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(settings.max_backoff, settings.backoff_factor * 2**attempt))
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Wraps a transport with client side rate limiting and retries on throttling and server errors."""
+
+    def __init__(
+        self,
+        transport: httpx.BaseTransport,
+        settings: HttpSettings,
+        rate_limiter: Optional[TokenBucket] = None,
+    ):
+        self.transport = transport
+        self.settings = settings
+        self.rate_limiter = rate_limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(self.settings.max_retries + 1):
+            is_last_attempt = attempt == self.settings.max_retries
+            if self.rate_limiter and request.url.host in RATE_LIMITED_HOSTS:
+                time.sleep(self.rate_limiter.reserve())
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError as e:
+                API_ERRORS.inc(host=request.url.host, status="transport_error")
+                if is_last_attempt:
+                    raise
+                delay = retry_delay(self.settings, attempt, None)
+                log.debug(f"{request.method} {request.url} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                if response.status_code >= 400:
+                    API_ERRORS.inc(host=request.url.host, status=str(response.status_code))
+                if response.status_code not in RETRYABLE_STATUS_CODES or is_last_attempt:
+                    return response
+                response.read()
+                response.close()
+                delay = retry_delay(self.settings, attempt, response)
+                log.debug(
+                    f"{request.method} {request.url} returned {response.status_code}, "
+                    f"retrying in {delay:.1f}s"
+                )
+            time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """Asyncio flavour of `RetryTransport`."""
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        settings: HttpSettings,
+        rate_limiter: Optional[TokenBucket] = None,
+    ):
+        self.transport = transport
+        self.settings = settings
+        self.rate_limiter = rate_limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(self.settings.max_retries + 1):
+            is_last_attempt = attempt == self.settings.max_retries
+            if self.rate_limiter and request.url.host in RATE_LIMITED_HOSTS:
+                await asyncio.sleep(self.rate_limiter.reserve())
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                API_ERRORS.inc(host=request.url.host, status="transport_error")
+                if is_last_attempt:
+                    raise
+                delay = retry_delay(self.settings, attempt, None)
+                log.debug(f"{request.method} {request.url} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                if response.status_code >= 400:
+                    API_ERRORS.inc(host=request.url.host, status=str(response.status_code))
+                if response.status_code not in RETRYABLE_STATUS_CODES or is_last_attempt:
+                    return response
+                await response.aread()
+                await response.aclose()
+                delay = retry_delay(self.settings, attempt, response)
+                log.debug(
+                    f"{request.method} {request.url} returned {response.status_code}, "
+                    f"retrying in {delay:.1f}s"
+                )
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def _http2_available(settings: HttpSettings) -> bool:
+    if not settings.http2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        log.warning("http2 is enabled but the `h2` package is missing, falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def _limits(settings: HttpSettings) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.max_connections,
+        max_keepalive_connections=settings.max_keepalive_connections,
+    )
+
+
+def _rate_limiter(
+    settings: HttpSettings, rate_limiter: Optional[TokenBucket]
+) -> Optional[TokenBucket]:
+    # replayed responses don't count against any quota
+    if settings.replay_dir:
+        return None
+    return rate_limiter or rate_limiter_from_settings(settings)
+
+
+def build_client(
+    settings: HttpSettings,
+    rate_limiter: Optional[TokenBucket] = None,
+    transport: Optional[httpx.BaseTransport] = None,
+) -> httpx.Client:
+    """
+    Builds the pooled client used to talk to Google. `transport` replaces the network transport
+    (e.g. with a `httpx.MockTransport`) while keeping the retry and rate limiting behaviour.
+    """
+    if transport is None and settings.replay_dir:
+        from py_nest_thermostat.recording import replay_transport_from_settings
+
+        transport = replay_transport_from_settings(settings)
+    transport = transport or httpx.HTTPTransport(
+        http2=_http2_available(settings), limits=_limits(settings)
+    )
+    if settings.record_dir:
+        from py_nest_thermostat.recording import RecordingTransport, recorder_from_settings
+
+        transport = RecordingTransport(transport, recorder_from_settings(settings))
+    return httpx.Client(
+        transport=RetryTransport(transport, settings, _rate_limiter(settings, rate_limiter)),
+        timeout=settings.timeout,
+    )
+
+
+def build_async_client(
+    settings: HttpSettings,
+    rate_limiter: Optional[TokenBucket] = None,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> httpx.AsyncClient:
+    if transport is None and settings.replay_dir:
+        from py_nest_thermostat.recording import replay_transport_from_settings
+
+        transport = replay_transport_from_settings(settings)
+    transport = transport or httpx.AsyncHTTPTransport(
+        http2=_http2_available(settings), limits=_limits(settings)
+    )
+    if settings.record_dir:
+        from py_nest_thermostat.recording import AsyncRecordingTransport, recorder_from_settings
+
+        transport = AsyncRecordingTransport(transport, recorder_from_settings(settings))
+    return httpx.AsyncClient(
+        transport=AsyncRetryTransport(transport, settings, _rate_limiter(settings, rate_limiter)),
+        timeout=settings.timeout,
+    )
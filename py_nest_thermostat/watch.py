@@ -0,0 +1,111 @@
+import asyncio
+import time
+from collections.abc import Sequence
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
+
+from rich.align import Align
+from rich.columns import Columns
+from rich.console import Group, RenderableType
+from rich.live import Live
+from rich.panel import Panel
+from rich.text import Text
+
+from py_nest_thermostat.logger import log
+from py_nest_thermostat.nest_api import (
+    PURPLE,
+    RED,
+    YELLOW,
+    AnyThermostatStats,
+    console,
+    device_stats_panel_contents,
+)
+
+if TYPE_CHECKING:
+    from py_nest_thermostat.nest_api import AsyncNestThermostat
+
+
+class Dashboard:
+    """
+    The renderable shown by `nest watch`. Panels are cached with the markup they display and only
+    rebuilt when it changes, and `update` tells whether anything changed at all so that the screen
+    is only redrawn when there is something new to show.
+    """
+
+    def __init__(self):
+        self.panels: dict[tuple[str, str], tuple[str, Panel]] = {}
+        self.device_renderables: dict[str, RenderableType] = {}
+        self.status: Optional[Text] = None
+        # the status shows an error, to be replaced at the next successful poll
+        self.error_shown = False
+        self.renderable: RenderableType = Text("Waiting for the first readings...")
+
+    def device_panels(
+        self, device_key: str, device_stats: AnyThermostatStats
+    ) -> Optional[list[Panel]]:
+        """Returns the panels of the device, or None when none of them changed."""
+        has_changed = False
+        panels = []
+        for title, content in device_stats_panel_contents(device_stats).items():
+            cached = self.panels.get((device_key, title))
+            if cached is None or cached[0] != content:
+                cached = (content, Panel(Align.center(content), title=f"[{PURPLE}]{title}"))
+                self.panels[(device_key, title)] = cached
+                has_changed = True
+            panels.append(cached[1])
+        return panels if has_changed else None
+
+    def update(self, device_stats: Sequence[AnyThermostatStats]) -> bool:
+        has_changed = False
+        for stats in device_stats:
+            device_key = stats.device_id or stats.device_name
+            panels = self.device_panels(device_key, stats)
+            if panels is not None:
+                self.device_renderables[device_key] = Group(
+                    Text(stats.device_name, style=f"bold {YELLOW}"), Columns(panels)
+                )
+                has_changed = True
+        if has_changed:
+            self.set_status(Text(f"Last change at {datetime.now():%H:%M:%S}", style="dim"))
+        elif self.error_shown:
+            self.set_status(Text(f"Readings unchanged at {datetime.now():%H:%M:%S}", style="dim"))
+            has_changed = True
+        return has_changed
+
+    def set_status(self, status: Text, is_error: bool = False):
+        self.status = status
+        self.error_shown = is_error
+        self.renderable = Group(*self.device_renderables.values(), status)
+
+    def set_error(self, error: Exception) -> bool:
+        status = Text(f"Could not refresh the readings: {error}", style=RED)
+        if self.error_shown and self.status is not None and self.status.plain == status.plain:
+            return False
+        self.set_status(status, is_error=True)
+        return True
+
+
+async def watch(thermostat: "AsyncNestThermostat", interval: float, max_refresh_rate: float):
+    """
+    Polls every thermostat with a single request per interval and redraws the dashboard when
+    something changed, at most `max_refresh_rate` times per second.
+    """
+    dashboard = Dashboard()
+    min_refresh_interval = 1 / max_refresh_rate
+    last_refresh_at = 0.0
+    # no auto refresh: nothing is drawn while the readings don't change
+    with Live(dashboard.renderable, console=console, auto_refresh=False) as live:
+        while True:
+            poll_started_at = time.monotonic()
+            try:
+                has_changed = dashboard.update(await thermostat.get_all_device_stats())
+            except Exception as e:
+                log.debug(f"Could not refresh the readings: {e}")
+                has_changed = dashboard.set_error(e)
+            if has_changed:
+                await asyncio.sleep(
+                    max(0.0, last_refresh_at + min_refresh_interval - time.monotonic())
+                )
+                live.update(dashboard.renderable, refresh=True)
+                last_refresh_at = time.monotonic()
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - poll_started_at)))